@@ -102,11 +102,49 @@ else:
 
 if START_LOW_MEM:
     SEARCH_TIMER_SPEED = 800
+    # Max. number of open read sessions in the db_session pool.
+    DB_SESSION_POOL_SIZE = 2
+    # Number of threads handling requests in the API server, and the number
+    # of accepted requests waiting for a free thread.
+    API_SERVER_WORKERS = 4
+    API_SERVER_QUEUE_SIZE = 16
+    # Number of rendered DPD entries kept in memory.
+    DPD_RENDER_CACHE_SIZE = 200
+    # Number of rendered sutta bodies kept in memory.
+    SUTTA_RENDER_CACHE_SIZE = 20
+    # Number of Pali suttas kept as segments for the line by line view.
+    PALI_SEGMENTS_CACHE_SIZE = 10
+    # Number of link previews kept in memory, and the number of sutta links
+    # of an opened page which are rendered before they are hovered.
+    PREVIEW_CACHE_SIZE = 20
+    PREVIEW_PREFETCH_LINKS = 5
+    # SQLite page cache in KiB and memory-mapped I/O size in bytes, per attached database.
+    DB_CACHE_SIZE_KB = {'appdata': 8*1024, 'userdata': 2*1024, 'dpd': 8*1024}
+    DB_MMAP_SIZE = {'appdata': 256*1024*1024, 'userdata': 16*1024*1024, 'dpd': 256*1024*1024}
 else:
     SEARCH_TIMER_SPEED = 400
+    DB_SESSION_POOL_SIZE = 8
+    API_SERVER_WORKERS = 16
+    API_SERVER_QUEUE_SIZE = 64
+    DPD_RENDER_CACHE_SIZE = 2000
+    SUTTA_RENDER_CACHE_SIZE = 200
+    PALI_SEGMENTS_CACHE_SIZE = 50
+    PREVIEW_CACHE_SIZE = 200
+    PREVIEW_PREFETCH_LINKS = 20
+    DB_CACHE_SIZE_KB = {'appdata': 64*1024, 'userdata': 16*1024, 'dpd': 64*1024}
+    DB_MMAP_SIZE = {'appdata': 2*1024*1024*1024, 'userdata': 64*1024*1024, 'dpd': 2*1024*1024*1024}
 
 INDEX_WRITER_MEMORY_MB = 512
 
+# Search cursors of the API are removed after this many seconds without use.
+SEARCH_CURSOR_TTL = 10*60
+# Max. number of search cursors kept, the least recently used are removed first.
+SEARCH_CURSORS_MAX = 32
+# Max. number of results in one page of a search cursor.
+SEARCH_CURSOR_LIMIT_MAX = 500
+# Max. number of unique words in one /words_batch.json request.
+WORDS_BATCH_MAX = 10000
+
 #s = os.getenv('USE_TEST_DATA')
 #if s is not None and s.lower() == 'true':
 #    ASSETS_DIR = TEST_ASSETS_DIR
@@ -118,6 +156,7 @@ ASSETS_DIR = SIMSAPA_DIR.joinpath('assets')
 INDEX_DIR = ASSETS_DIR.joinpath('index')
 SUTTAS_INDEX_DIR = INDEX_DIR.joinpath('suttas')
 DICT_WORDS_INDEX_DIR = INDEX_DIR.joinpath('dict_words')
+SUTTA_SEGMENTS_INDEX_DIR = INDEX_DIR.joinpath('sutta_segments')
 
 GRAPHS_DIR = ASSETS_DIR.joinpath('graphs')
 
@@ -126,6 +165,18 @@ USER_DB_PATH = ASSETS_DIR.joinpath('userdata.sqlite3')
 
 DPD_DB_PATH = ASSETS_DIR.joinpath('dpd.sqlite3')
 
+# Rendered DPD entries, see dpd_render_cache.py
+DPD_RENDER_CACHE_PATH = ASSETS_DIR.joinpath('dpd_render_cache.sqlite3')
+# Rendered sutta bodies, see sutta_render_cache.py. None to keep them only in memory.
+SUTTA_RENDER_CACHE_PATH: Optional[Path] = ASSETS_DIR.joinpath('sutta_render_cache.sqlite3')
+
+# Version of the derived tables and indexes which migrate_appdata() adds to the
+# downloaded appdata.sqlite3, stored as PRAGMA user_version.
+APPDATA_MIGRATIONS_VERSION = 6
+# Same for the indexes which migrate_userdata() and migrate_dpd_indexes() add.
+USERDATA_MIGRATIONS_VERSION = 5
+DPD_MIGRATIONS_VERSION = 3
+
 COURSES_DIR = ASSETS_DIR.joinpath('courses')
 
 EBOOK_UNZIP_DIR = ASSETS_DIR.joinpath('ebook_unzip')
@@ -207,6 +258,12 @@ if b is None:
 else:
     SUTTAS_CSS = b.decode("utf-8")
 
+b = pkgutil.get_data(__name__, str(PACKAGE_ASSETS_RSC_DIR.joinpath('css/dictionary.css')))
+if b is None:
+    DICTIONARY_CSS = ""
+else:
+    DICTIONARY_CSS = b.decode("utf-8")
+
 b = pkgutil.get_data(__name__, str(PACKAGE_ASSETS_RSC_DIR.joinpath('js/suttas.js')))
 if b is None:
     SUTTAS_JS = ""
@@ -0,0 +1,32 @@
+"""Indexes on the lowercase uids, for case-insensitive uid prefix ranges
+
+Revision ID: 4f1d2b8e6a93
+Revises: 7c52d0e9a1b4
+Create Date: 2026-10-19 18:42:37.508114
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '4f1d2b8e6a93'
+down_revision = '7c52d0e9a1b4'
+branch_labels = None
+depends_on = None
+
+
+# The indexes may already exist, if migrate_userdata() has added them.
+INDEXES = [
+    ('ix_suttas_uid_stem_lower', 'suttas', ['lower(uid_stem)']),
+    ('ix_dict_words_uid_lower', 'dict_words', ['lower(uid)']),
+]
+
+
+def upgrade():
+    for (name, table, columns) in INDEXES:
+        op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)});")
+
+
+def downgrade():
+    for (name, _, _) in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name};")
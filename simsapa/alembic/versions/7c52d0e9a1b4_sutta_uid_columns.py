@@ -0,0 +1,48 @@
+"""Sutta uid_stem and uid-derived column indexes
+
+Revision ID: 7c52d0e9a1b4
+Revises: e3a9c41f7d20
+Create Date: 2026-10-19 12:21:05.614902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c52d0e9a1b4'
+down_revision = 'e3a9c41f7d20'
+branch_labels = None
+depends_on = None
+
+
+# The column and indexes may already exist, if migrate_appdata() or
+# migrate_userdata() has added them.
+INDEXES = [
+    ('ix_suttas_uid_stem', 'suttas', ['uid_stem']),
+    ('ix_suttas_sutta_ref', 'suttas', ['sutta_ref']),
+    ('ix_suttas_language', 'suttas', ['language']),
+    ('ix_suttas_source_uid', 'suttas', ['source_uid']),
+    ('ix_dict_words_source_uid', 'dict_words', ['source_uid']),
+]
+
+
+def upgrade():
+    conn = op.get_bind()
+    columns = [r[1] for r in conn.execute(sa.text("PRAGMA table_info(suttas);")).fetchall()]
+    if 'uid_stem' not in columns:
+        op.add_column('suttas', sa.Column('uid_stem', sa.String(), nullable=True))
+
+    # dn1/pli/ms -> dn1
+    op.execute("UPDATE suttas SET uid_stem = lower(CASE WHEN instr(uid, '/') > 0 THEN substr(uid, 1, instr(uid, '/') - 1) ELSE uid END);")
+
+    for (name, table, columns) in INDEXES:
+        op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)});")
+
+
+def downgrade():
+    for (name, _, _) in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name};")
+
+    with op.batch_alter_table('suttas') as batch_op:
+        batch_op.drop_column('uid_stem')
@@ -0,0 +1,33 @@
+"""The sutta_segments table of the merged bilara segments
+
+Revision ID: 9d4a6e2c7b15
+Revises: 4f1d2b8e6a93
+Create Date: 2026-10-19 21:07:52.183460
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '9d4a6e2c7b15'
+down_revision = '4f1d2b8e6a93'
+branch_labels = None
+depends_on = None
+
+
+# The table may already exist, if migrate_userdata() has added it. The rows
+# are filled by migrate_userdata(), see db_helpers.create_sutta_segments().
+def upgrade():
+    op.execute("""
+    CREATE TABLE IF NOT EXISTS sutta_segments (
+        sutta_id INTEGER NOT NULL PRIMARY KEY REFERENCES suttas (id) ON DELETE CASCADE,
+        data BLOB NOT NULL
+    );
+    """)
+
+    # Rows of deleted suttas.
+    op.execute("DELETE FROM sutta_segments WHERE sutta_id NOT IN (SELECT id FROM suttas);")
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS sutta_segments;")
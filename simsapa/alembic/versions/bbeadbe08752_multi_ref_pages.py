@@ -0,0 +1,39 @@
+"""MultiRef pages table
+
+Revision ID: bbeadbe08752
+Revises: 5aaa36ccfa37
+Create Date: 2026-10-19 10:12:41.503318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'bbeadbe08752'
+down_revision = '5aaa36ccfa37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'multi_ref_pages',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('multi_ref_id', sa.Integer(), nullable=False),
+        sa.Column('collection', sa.String(), nullable=False),
+        sa.Column('volume', sa.Integer(), nullable=False),
+        sa.Column('page_start', sa.Integer(), nullable=False),
+        sa.Column('page_end', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['multi_ref_id'], ['multi_refs.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+    op.create_index('ix_multi_ref_pages_collection_volume_page',
+                    'multi_ref_pages',
+                    ['collection', 'volume', 'page_start'])
+
+
+def downgrade():
+    op.drop_index('ix_multi_ref_pages_collection_volume_page', table_name='multi_ref_pages')
+    op.drop_table('multi_ref_pages')
@@ -0,0 +1,36 @@
+"""Lookup indexes
+
+Revision ID: e3a9c41f7d20
+Revises: bbeadbe08752
+Create Date: 2026-10-19 11:04:18.227310
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3a9c41f7d20'
+down_revision = 'bbeadbe08752'
+branch_labels = None
+depends_on = None
+
+
+# The indexes may already exist, if migrate_appdata() or migrate_userdata()
+# has added them.
+INDEXES = [
+    ('ix_links_from', 'links', ['from_table', 'from_id']),
+    ('ix_links_to', 'links', ['to_table', 'to_id']),
+    ('ix_memo_associations_associated', 'memo_associations', ['associated_table', 'associated_id']),
+    ('ix_bookmarks_sutta_uid', 'bookmarks', ['sutta_uid']),
+    ('ix_dict_words_word', 'dict_words', ['word']),
+]
+
+
+def upgrade():
+    for (name, table, columns) in INDEXES:
+        op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)});")
+
+
+def downgrade():
+    for (name, _, _) in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name};")
@@ -1,30 +1,39 @@
 from pathlib import Path
-import queue, json, os
-from typing import Callable, Dict, List, Optional
+import queue, json, os, threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, List, Optional
 from flask import Flask, jsonify, send_from_directory, abort, request
 from flask.wrappers import Response
 from flask_cors import CORS
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
 import logging
 
-from simsapa import PACKAGE_ASSETS_DIR, SERVER_QUEUE, ApiAction, ApiMessage, DbSchemaName
+from simsapa import API_SERVER_QUEUE_SIZE, API_SERVER_WORKERS, PACKAGE_ASSETS_DIR, SEARCH_CURSOR_LIMIT_MAX, SERVER_QUEUE, WORDS_BATCH_MAX, ApiAction, ApiMessage, DbSchemaName
 from simsapa import logger, ApiSearchResult
-from simsapa.app.completion_lists import get_and_save_completions
-from simsapa.app.db_session import get_db_engine_connection_session
+from simsapa.app.completion_lists import get_flat_completion_list
+from simsapa.app.db_session import db_read_session
 
-from simsapa.app.search.helpers import get_dict_word_languages, get_dict_word_source_filter_labels, get_sutta_languages
+from simsapa.app.helpers import remove_punct
+from simsapa.app.page_assets import PAGE_ASSETS
+from simsapa.app.search.helpers import DPD_BATCH_SIZE, dpd_lookup_batch, get_dict_word_languages, get_dict_word_source_filter_labels, get_sutta_languages
+from simsapa.app.search.api_queries import ApiSearchQueries, SearchCursor
+from simsapa.app.search.tantivy_index import TantivySearchIndexes
+from simsapa.app.search.union_queries import union_rows
 
-from simsapa.app.types import GraphRequest, LookupPanelParams, SearchArea, SearchMode, SearchParams, SuttaPanelParams, SuttaStudyParams, UBookmark, USutta, UDictWord
+from simsapa.app.types import DpdFilters, GraphRequest, LookupPanelParams, SearchArea, SearchMode, SearchParams, SuttaPanelParams, SuttaStudyParams, USutta, UDictWord
 
-from sqlalchemy import and_, or_
+from sqlalchemy import or_
+from sqlalchemy.engine import Row
+from sqlalchemy.orm.session import Session
 
 from simsapa.app.db import appdata_models as Am
 from simsapa.app.db import userdata_models as Um
 
 from simsapa.app.db import dpd_models as Dpd
-from simsapa.dpd_db.tools.pali_sort_key import pali_sort_key
 
 app = Flask(__name__)
-app.config['ENV'] = 'development'
+app.config['ENV'] = 'production'
 cors = CORS(app)
 logging.getLogger("werkzeug").disabled = True
 
@@ -40,6 +49,9 @@ class AppCallbacks:
     run_dictionary_search: Callable[[LookupPanelParams], None]
     run_suttas_fulltext_search: Callable[[str, SearchParams, int], ApiSearchResult]
     run_dict_combined_search: Callable[[str, SearchParams, int], ApiSearchResult]
+    get_search_indexes: Optional[Callable[[], Optional[TantivySearchIndexes]]] = None
+    # True when serving without the GUI, see start_headless_server().
+    headless = False
 
     def __init__(self):
         pass
@@ -47,6 +59,101 @@ class AppCallbacks:
 global app_callbacks
 app_callbacks = AppCallbacks()
 
+# Routes which pass on an action to the GUI windows.
+GUI_ROUTES = set([
+    'route_queues',
+    'route_lookup_window_query_get',
+    'route_lookup_window_query_post',
+    'route_sutta_study_lookup_get',
+    'route_sutta_study_lookup_post',
+    'route_sutta_search_post',
+    'route_sutta_study_post',
+    'route_dictionary_search_post',
+    'route_suttas',
+    'route_words',
+    'route_open_window',
+])
+
+# The GUI's search callbacks share the app's search query workers, one search
+# at a time. The other routes use their own pooled sessions and don't wait for
+# it. In headless mode each search runs its own query tasks.
+_search_lock = threading.Lock()
+
+def _search_guard():
+    return nullcontext() if app_callbacks.headless else _search_lock
+
+def _run_suttas_fulltext_search(query_text: str, params: SearchParams, page_num: int) -> ApiSearchResult:
+    with _search_guard():
+        return app_callbacks.run_suttas_fulltext_search(query_text, params, page_num)
+
+def _run_dict_combined_search(query_text: str, params: SearchParams, page_num: int) -> ApiSearchResult:
+    with _search_guard():
+        return app_callbacks.run_dict_combined_search(query_text, params, page_num)
+
+global api_queries
+api_queries: Optional[ApiSearchQueries] = None
+_api_queries_lock = threading.Lock()
+
+def _get_api_queries() -> Optional[ApiSearchQueries]:
+    """The search queries of the cursor routes, once the search indexes are loaded."""
+    global api_queries
+    with _api_queries_lock:
+        if api_queries is None and app_callbacks.get_search_indexes is not None:
+            search_indexes = app_callbacks.get_search_indexes()
+            if search_indexes is not None:
+                api_queries = ApiSearchQueries(search_indexes)
+
+        return api_queries
+
+class ClosingRequestHandler(WSGIRequestHandler):
+    """
+    Answers with HTTP/1.0, so that the connection is closed after the response.
+    A kept-alive idle connection would hold a worker thread of the pool.
+    """
+    protocol_version = "HTTP/1.0"
+
+class PooledWSGIServer(BaseWSGIServer):
+    """
+    Handles the requests on a fixed number of worker threads, so that a slow
+    request (graph, search, completion list) doesn't block the others.
+
+    At most queue_size accepted requests are waiting for a worker, after that
+    the server stops accepting connections until a worker is free.
+    """
+    multithread = True
+
+    def __init__(self, host: str, port: int, wsgi_app: Any, workers: int, queue_size: int = API_SERVER_QUEUE_SIZE):
+        super().__init__(host, port, wsgi_app, handler=ClosingRequestHandler)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='api_worker')
+        self._pending = threading.BoundedSemaphore(workers + queue_size)
+
+    def process_request(self, request, client_address):
+        self._pending.acquire()
+        try:
+            self.executor.submit(self._process_request_worker, request, client_address)
+        except RuntimeError:
+            # The executor was shut down.
+            self._pending.release()
+            self.shutdown_request(request)
+
+    def _process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._pending.release()
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False)
+
+@app.before_request
+def check_gui_route():
+    if app_callbacks.headless and request.endpoint in GUI_ROUTES:
+        return "Not available without the GUI", 503
+
 @app.route('/', methods=['GET'])
 def route_index():
     return 'OK', 200
@@ -90,10 +197,31 @@ def route_assets(filename):
 
     return send_from_directory(PACKAGE_ASSETS_DIR, filename) # type: ignore
 
+@app.route('/page_assets/<string:name>', methods=['GET'])
+def route_page_assets(name: str):
+    """The stylesheets and scripts linked from the pages. The versioned URL
+    (?v=...) of the current content is cached without revalidation."""
+    asset = PAGE_ASSETS.get(name)
+    if asset is None:
+        abort(404)
 
-def _get_sutta_by_uid(uid: str) -> Optional[USutta]:
-    db_eng, db_conn, db_session = get_db_engine_connection_session()
+    if request.args.get('v') == asset.version:
+        cache_control = 'public, max-age=31536000, immutable'
+    else:
+        cache_control = 'no-cache'
 
+    headers = {
+        'ETag': f'"{asset.version}"',
+        'Cache-Control': cache_control,
+    }
+
+    if request.if_none_match.contains(asset.version):
+        return Response(status=304, headers=headers)
+
+    return Response(asset.body, status=200, headers=headers, mimetype=asset.mimetype)
+
+
+def _get_sutta_by_uid(db_session: Session, uid: str) -> Optional[USutta]:
     results: List[USutta] = []
 
     res = db_session \
@@ -108,19 +236,13 @@ def _get_sutta_by_uid(uid: str) -> Optional[USutta]:
         .all()
     results.extend(res)
 
-    db_conn.close()
-    db_session.close()
-    db_eng.dispose()
-
     if len(results) == 0:
         logger.warn("No Sutta found with uid: %s" % uid)
         return None
 
     return results[0]
 
-def _get_word_by_uid(uid: str) -> Optional[UDictWord]:
-    db_eng, db_conn, db_session = get_db_engine_connection_session()
-
+def _get_word_by_uid(db_session: Session, uid: str) -> Optional[UDictWord]:
     results: List[UDictWord] = []
 
     res = db_session \
@@ -147,10 +269,6 @@ def _get_word_by_uid(uid: str) -> Optional[UDictWord]:
         .all()
     results.extend(res)
 
-    db_conn.close()
-    db_session.close()
-    db_eng.dispose()
-
     if len(results) == 0:
         logger.warn("No DictWord found with uid: %s" % uid)
         return None
@@ -168,35 +286,39 @@ def route_api_generate_graph():
 
         p: GraphRequest = request.json
 
-        if p['sutta_uid'] is not None:
-            sutta = _get_sutta_by_uid(p['sutta_uid'])
-        else:
-            sutta = None
-
-        if p['dict_word_uid'] is not None:
-            dict_word = _get_word_by_uid(p['dict_word_uid'])
-        else:
-            dict_word = None
+        # The graph is collected while the session is open, the sutta and
+        # word instances are not used after it is returned to the pool.
+        with db_read_session() as db_session:
+            if p['sutta_uid'] is not None:
+                sutta = _get_sutta_by_uid(db_session, p['sutta_uid'])
+            else:
+                sutta = None
 
-        if sutta is not None:
-            (nodes, edges) = sutta_nodes_and_edges(sutta, distance=p['distance'])
+            if p['dict_word_uid'] is not None:
+                dict_word = _get_word_by_uid(db_session, p['dict_word_uid'])
+            else:
+                dict_word = None
 
-            selected = []
-            for idx, n in enumerate(nodes):
-                if n[0] == sutta_graph_id(sutta):
-                    selected.append(idx)
+            if sutta is not None:
+                (nodes, edges) = sutta_nodes_and_edges(sutta, distance=p['distance'], db_session=db_session)
+                selected_id = sutta_graph_id(sutta)
 
-        elif dict_word is not None:
-            (nodes, edges) = dict_word_nodes_and_edges(dict_word, distance=p['distance'])
+            elif dict_word is not None:
+                (nodes, edges) = dict_word_nodes_and_edges(dict_word, distance=p['distance'], db_session=db_session)
+                selected_id = sutta_graph_id(dict_word)
 
-            selected = []
-            for idx, n in enumerate(nodes):
-                if n[0] == sutta_graph_id(dict_word):
-                    selected.append(idx)
+            else:
+                nodes = None
+                edges = []
+                selected_id = None
 
-        else:
+        if nodes is None:
             (nodes, edges) = all_nodes_and_edges()
-            selected = []
+
+        selected = []
+        for idx, n in enumerate(nodes):
+            if n[0] == selected_id:
+                selected.append(idx)
 
         generate_graph(nodes,
                        edges,
@@ -241,13 +363,15 @@ document.addEventListener("DOMContentLoaded", function(event) {
         return msg, 503
 
 
-def _bm_to_res(x: UBookmark) -> Dict[str, str]:
+BOOKMARK_RES_COLUMNS = ['id', 'quote', 'selection_range', 'comment_text', 'comment_attr_json']
+
+def _bm_to_res(x: Row) -> Dict[str, str]:
     return {
         'quote': str(x.quote) if x.quote is not None else '',
         'selection_range': str(x.selection_range) if x.selection_range is not None else '',
         'comment_text': str(x.comment_text) if x.comment_text is not None else '',
         'comment_attr_json': str(x.comment_attr_json) if x.comment_attr_json is not None else '',
-        'bookmark_schema_id': f"{x.metadata.schema}-{x.id}",
+        'bookmark_schema_id': f"{x.schema_name}-{x.id}",
     }
 
 @app.route('/suttas_fulltext_search', methods=['POST'])
@@ -282,7 +406,7 @@ def route_suttas_fulltext_search():
         fuzzy_distance = 0,
     )
 
-    res = app_callbacks.run_suttas_fulltext_search(data['query_text'].strip(), params, page_num)
+    res = _run_suttas_fulltext_search(data['query_text'].strip(), params, page_num)
 
     return jsonify(res), 200
 
@@ -328,66 +452,203 @@ def route_dict_combined_search():
         fuzzy_distance = 0,
     )
 
-    res = app_callbacks.run_dict_combined_search(data['query_text'].strip(), params, page_num)
+    res = _run_dict_combined_search(data['query_text'].strip(), params, page_num)
 
     return jsonify(res), 200
 
-@app.route('/dict_words_flat_completion_list', methods=['GET'])
-def route_dict_words_flat_completion_list():
-    logger.info('/dict_words_flat_completion_list')
-    db_eng, db_conn, db_session = get_db_engine_connection_session()
+def _int_param(value: Any, min_value: int, max_value: Optional[int] = None) -> int:
+    """An integer from a JSON value or a query argument, ValueError if it is not one or out of range."""
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f"Not an integer: {value}")
 
-    # NOTE: This gives a very long list, a 31 MB json response.
-    #
-    # r = get_and_save_completions(db_session, SearchArea.DictWords)
-    # # Flatten the lists into a single list of strings
-    # results = [item for sublist in r.values() for item in sublist]
-    #
-    # Instead, load the words and roots from the DPD, which yields a 1.6 MB list.
+    n = int(value)
+    if n < min_value or (max_value is not None and n > max_value):
+        raise ValueError(f"Out of range: {n}")
 
-    res = db_session.query(Dpd.DpdHeadwords.lemma_1).all()
-    res.extend(db_session.query(Dpd.DpdRoots.root_no_sign).all())
-    results: List[str] = list(map(lambda x: x[0].strip() or 'none', res))
+    return n
 
-    results = sorted(results, key=lambda x: pali_sort_key(x))
+def _cursor_page_res(cursor_id: str, cursor: SearchCursor, offset: int, limit: int) -> Dict[str, Any]:
+    results = cursor.results(offset, limit)
 
-    db_conn.close()
-    db_session.close()
-    db_eng.dispose()
+    if len(results) < limit:
+        next_offset = None
+    else:
+        next_offset = offset + len(results)
 
-    return jsonify(results), 200
+    return {
+        "cursor": cursor_id,
+        "hits": cursor.hits,
+        "deconstructor": cursor.deconstructor,
+        "offset": offset,
+        "next_offset": next_offset,
+        "results": results,
+    }
 
-@app.route('/sutta_titles_flat_completion_list', methods=['GET'])
-def route_sutta_titles_flat_completion_list():
-    logger.info('/sutta_titles_flat_completion_list')
-    db_eng, db_conn, db_session = get_db_engine_connection_session()
+def _dpd_filters_from_json(data: Any) -> Optional[DpdFilters]:
+    """DpdFilters from a JSON object, e.g. {"pos": "masc", "root_key": "√kar 1"}.
+    None if no filter has a value."""
+    if not isinstance(data, dict):
+        return None
 
-    r = get_and_save_completions(db_session, SearchArea.Suttas)
-    results = [item for sublist in r.values() for item in sublist]
+    values = dict()
+    for k in ['pos', 'root_key', 'family_key', 'pattern']:
+        v = data.get(k, None)
+        values[k] = v if isinstance(v, str) and v.strip() != "" else None
 
-    results = sorted(results, key=lambda x: pali_sort_key(x))
+    if all([v is None for v in values.values()]):
+        return None
 
-    db_conn.close()
-    db_session.close()
-    db_eng.dispose()
+    return DpdFilters(
+        pos = values['pos'],
+        root_key = values['root_key'],
+        family_key = values['family_key'],
+        pattern = values['pattern'],
+    )
 
-    return jsonify(results), 200
+@app.route('/search', methods=['POST'])
+def route_search():
+    """
+    Start a search, and return its first page with a cursor for the next ones.
 
-@app.route('/sutta_and_dict_search_options', methods=['GET'])
-def route_sutta_and_dict_search_options():
-    logger.info('/sutta_and_dict_search_options')
+    Post {"query_text": "...", "area": "suttas" or "dict_words", "limit": 20,
+    "lang": ..., "lang_include": ..., "source": ..., "source_include": ...}
+
+    A dict_words search can be filtered by DPD headword attributes with
+    "dpd_filters": {"pos": ..., "root_key": ..., "family_key": ..., "pattern": ...}.
+    The query_text may be empty then, e.g. all masc nouns of a root.
+    """
+    data = request.get_json()
+    if not isinstance(data, dict) or not isinstance(data.get('query_text', None), str):
+        return "Missing query_text", 400
+
+    try:
+        limit = _int_param(data.get('limit', 20), 1, SEARCH_CURSOR_LIMIT_MAX)
+    except ValueError:
+        return f"limit must be an integer from 1 to {SEARCH_CURSOR_LIMIT_MAX}", 400
+
+    queries = _get_api_queries()
+    if queries is None:
+        return "Search indexes are not loaded yet", 503
 
-    db_eng, db_conn, db_session = get_db_engine_connection_session()
+    dpd_filters = None
 
-    results = {
-        "sutta_languages": get_sutta_languages(db_session),
-        "dict_languages": get_dict_word_languages(db_session),
-        "dict_sources": get_dict_word_source_filter_labels(db_session),
+    if data.get('area', 'suttas') == 'dict_words':
+        area = SearchArea.DictWords
+        dpd_filters = _dpd_filters_from_json(data.get('dpd_filters', None))
+        # The filters apply to the fulltext index, not to the DPD Lookup results of Combined mode.
+        mode = SearchMode.Combined if dpd_filters is None else SearchMode.FulltextMatch
+    else:
+        area = SearchArea.Suttas
+        mode = SearchMode.FulltextMatch
+
+    params = SearchParams(
+        mode = mode,
+        page_len = 20,
+        lang = data.get('lang', None),
+        lang_include = data.get('lang_include', True),
+        source = data.get('source', None),
+        source_include = data.get('source_include', True),
+        enable_regex = False,
+        fuzzy_distance = 0,
+    )
+
+    try:
+        cursor_id, cursor = queries.start_cursor(data['query_text'].strip(), area, params, dpd_filters)
+    except ValueError as e:
+        # The query parser's syntax errors.
+        return f"Invalid query: {e}", 400
+
+    return jsonify(_cursor_page_res(cursor_id, cursor, 0, limit)), 200
+
+@app.route('/search/<string:cursor_id>', methods=['GET'])
+def route_search_cursor(cursor_id: str):
+    """The next results of a search, e.g. /search/<cursor>?offset=20&limit=50"""
+    try:
+        offset = _int_param(request.args.get('offset', '0'), 0)
+    except ValueError:
+        return "offset must be a non-negative integer", 400
+
+    try:
+        limit = _int_param(request.args.get('limit', '20'), 1, SEARCH_CURSOR_LIMIT_MAX)
+    except ValueError:
+        return f"limit must be an integer from 1 to {SEARCH_CURSOR_LIMIT_MAX}", 400
+
+    queries = _get_api_queries()
+    cursor = None if queries is None else queries.cursors.get(cursor_id)
+    if cursor is None:
+        return "Search cursor not found or expired", 404
+
+    return jsonify(_cursor_page_res(cursor_id, cursor, offset, limit)), 200
+
+@app.route('/search/<string:cursor_id>/export.ndjson', methods=['GET'])
+def route_search_cursor_export(cursor_id: str):
+    """All results of a search, one JSON line per result."""
+    queries = _get_api_queries()
+    cursor = None if queries is None else queries.cursors.get(cursor_id)
+    if cursor is None:
+        return "Search cursor not found or expired", 404
+
+    def _lines():
+        for i in cursor.iter_results():
+            yield json.dumps(i, ensure_ascii=False) + "\n"
+
+    return Response(_lines(), status=200, mimetype='application/x-ndjson')
+
+def _flat_completion_list_response(area: SearchArea):
+    """
+    The complete list, gzip compressed if the client accepts it, and 304 Not
+    Modified if the client has it already (If-None-Match).
+
+    With ?prefix=..., only the words starting with the prefix, at most ?limit=... items.
+    """
+    c = get_flat_completion_list(area)
+
+    prefix = request.args.get('prefix')
+    if prefix is not None:
+        limit: Optional[int] = None
+        if request.args.get('limit') is not None:
+            try:
+                limit = _int_param(request.args['limit'], 0)
+            except ValueError:
+                return "limit must be a non-negative integer", 400
+
+        return jsonify(c.prefix_matches(prefix, limit)), 200
+
+    headers = {
+        'ETag': f'"{c.etag}"',
+        'Cache-Control': 'no-cache',
+        'Vary': 'Accept-Encoding',
     }
 
-    db_conn.close()
-    db_session.close()
-    db_eng.dispose()
+    if request.if_none_match.contains(c.etag):
+        return Response(status=304, headers=headers)
+
+    if request.accept_encodings['gzip']:
+        headers['Content-Encoding'] = 'gzip'
+        return Response(c.gzip_body, status=200, headers=headers, mimetype='application/json')
+
+    return Response(c.body, status=200, headers=headers, mimetype='application/json')
+
+@app.route('/dict_words_flat_completion_list', methods=['GET'])
+def route_dict_words_flat_completion_list():
+    logger.info('/dict_words_flat_completion_list')
+    return _flat_completion_list_response(SearchArea.DictWords)
+
+@app.route('/sutta_titles_flat_completion_list', methods=['GET'])
+def route_sutta_titles_flat_completion_list():
+    logger.info('/sutta_titles_flat_completion_list')
+    return _flat_completion_list_response(SearchArea.Suttas)
+
+@app.route('/sutta_and_dict_search_options', methods=['GET'])
+def route_sutta_and_dict_search_options():
+    logger.info('/sutta_and_dict_search_options')
+
+    with db_read_session() as db_session:
+        results = {
+            "sutta_languages": get_sutta_languages(db_session),
+            "dict_languages": get_dict_word_languages(db_session),
+            "dict_sources": get_dict_word_source_filter_labels(db_session),
+        }
 
     return jsonify(results), 200
 
@@ -542,51 +803,98 @@ def route_words_json(word = '', dict_label = ''):
         fuzzy_distance = 0,
     )
 
-    res = app_callbacks.run_dict_combined_search(word, params, 0)
+    res = _run_dict_combined_search(word, params, 0)
 
     if len(res['results']) == 0:
         return jsonify([]), 200
 
-    db_eng, db_conn, db_session = get_db_engine_connection_session()
+    with db_read_session() as db_session:
+        res_dicts: List[dict] = []
 
-    res_dicts: List[dict] = []
+        for i in res['results']:
+            r: Optional[UDictWord] = None
 
-    for i in res['results']:
-        r: Optional[UDictWord] = None
+            if i['schema_name'] == DbSchemaName.AppData.value:
+                r = db_session.query(Am.DictWord) \
+                              .filter(Am.DictWord.uid == i['uid']).first()
 
-        if i['schema_name'] == DbSchemaName.AppData.value:
-            r = db_session.query(Am.DictWord) \
-                          .filter(Am.DictWord.uid == i['uid']).first()
+            elif i['schema_name'] == DbSchemaName.UserData.value:
+                r = db_session.query(Um.DictWord) \
+                              .filter(Um.DictWord.uid == i['uid']).first()
 
-        elif i['schema_name'] == DbSchemaName.UserData.value:
-            r = db_session.query(Um.DictWord) \
-                          .filter(Um.DictWord.uid == i['uid']).first()
+            elif i['schema_name'] == DbSchemaName.Dpd.value:
+                if i['table_name'] == "dpd_headwords":
+                    r = db_session.query(Dpd.DpdHeadwords) \
+                                .filter(Dpd.DpdHeadwords.uid == i['uid']).first()
 
-        elif i['schema_name'] == DbSchemaName.Dpd.value:
-            if i['table_name'] == "dpd_headwords":
-                r = db_session.query(Dpd.DpdHeadwords) \
-                            .filter(Dpd.DpdHeadwords.uid == i['uid']).first()
+                elif i['table_name'] == "dpd_roots":
+                    r = db_session.query(Dpd.DpdRoots) \
+                                .filter(Dpd.DpdRoots.uid == i['uid']).first()
 
-            elif i['table_name'] == "dpd_roots":
-                r = db_session.query(Dpd.DpdRoots) \
-                            .filter(Dpd.DpdRoots.uid == i['uid']).first()
+                else:
+                    continue
 
             else:
                 continue
 
-        else:
-            continue
+            if r is None:
+                continue
 
-        if r is None:
-            continue
+            res_dicts.append(r.as_dict)
 
-        res_dicts.append(r.as_dict)
+    return jsonify(res_dicts), 200
 
-    db_conn.close()
-    db_session.close()
-    db_eng.dispose()
+def _words_batch_dicts(tokens: List[str]) -> Dict[str, List[dict]]:
+    with db_read_session() as db_session:
+        res = dpd_lookup_batch(db_session, tokens)
+        return dict([(k, [w.as_dict for w in v]) for k, v in res.items()])
 
-    return jsonify(res_dicts), 200
+@app.route('/words_batch.json', methods=['POST'])
+def route_words_batch_json():
+    """
+    DPD lookup of many words in one request.
+
+    Post either {"words": ["dhammaṃ", "bhikkhave", ...]} or {"text": "..."} to
+    tokenize. Returns {word: [DPD word dicts]} for each unique word. With
+    {"format": "ndjson"} (or Accept: application/x-ndjson), streams one
+    {"word": ..., "results": [...]} line per word instead.
+
+    At most WORDS_BATCH_MAX unique words are accepted in one request.
+    """
+    data = request.get_json()
+    if not isinstance(data, dict) or ('words' not in data.keys() and 'text' not in data.keys()):
+        return "Missing words or text", 400
+
+    if 'words' in data.keys():
+        if not isinstance(data['words'], list):
+            return "words must be a list", 400
+        tokens = [str(i).strip() for i in data['words']]
+    else:
+        if not isinstance(data['text'], str):
+            return "text must be a string", 400
+        tokens = remove_punct(data['text']).split()
+
+    # Unique, in the order of the input.
+    tokens = list(dict.fromkeys([i for i in tokens if i != '']))
+
+    if len(tokens) > WORDS_BATCH_MAX:
+        return f"At most {WORDS_BATCH_MAX} words in one request", 400
+
+    logger.info(f"route_words_batch_json() {len(tokens)} words")
+
+    is_ndjson = data.get('format') == 'ndjson' or \
+        request.accept_mimetypes.best == 'application/x-ndjson'
+
+    if not is_ndjson:
+        return jsonify(_words_batch_dicts(tokens)), 200
+
+    def _lines():
+        for n in range(0, len(tokens), DPD_BATCH_SIZE):
+            res = _words_batch_dicts(tokens[n:n+DPD_BATCH_SIZE])
+            for word, results in res.items():
+                yield json.dumps({'word': word, 'results': results}, ensure_ascii=False) + "\n"
+
+    return Response(_lines(), status=200, mimetype='application/x-ndjson')
 
 @app.route('/open_window', defaults={'window_type': ''})
 @app.route('/open_window/<string:window_type>', methods=['GET'])
@@ -604,77 +912,29 @@ def route_get_bookmarks_with_quote_only_for_sutta():
     result = list(map(_bm_to_res, _get_bookmarks_with_quote_only_for_sutta(sutta_uid)))
     return jsonify(result), 200
 
-def _get_bookmarks_with_quote_only_for_sutta(sutta_uid: str, except_quote: str = "") -> List[UBookmark]:
-    db_eng, db_conn, db_session = get_db_engine_connection_session()
-    res = []
-
-    r = db_session \
-        .query(Am.Bookmark) \
-        .filter(and_(
-            Am.Bookmark.sutta_uid == sutta_uid,
-            or_(Am.Bookmark.selection_range.is_(None),
-                Am.Bookmark.selection_range == ""),
-            Am.Bookmark.quote.is_not(None),
-            Am.Bookmark.quote != "",
-            Am.Bookmark.quote != except_quote,
-        )) \
-        .all()
-    res.extend(r)
-
-    r = db_session \
-        .query(Um.Bookmark) \
-        .filter(and_(
-            Um.Bookmark.sutta_uid == sutta_uid,
-            or_(Um.Bookmark.selection_range.is_(None),
-                Um.Bookmark.selection_range == ""),
-            Um.Bookmark.quote.is_not(None),
-            Um.Bookmark.quote != "",
-            Um.Bookmark.quote != except_quote,
-        )) \
-        .all()
-    res.extend(r)
-
-    db_conn.close()
-    db_session.close()
-    db_eng.dispose()
-
-    return res
-
-def _get_bookmarks_with_range_for_sutta(sutta_uid: str, except_quote = "") -> List[UBookmark]:
-    db_eng, db_conn, db_session = get_db_engine_connection_session()
-    res = []
-
-    r = db_session \
-        .query(Am.Bookmark) \
-        .filter(and_(
-            Am.Bookmark.sutta_uid == sutta_uid,
-            Am.Bookmark.selection_range.is_not(None),
-            Am.Bookmark.selection_range != "",
-            Am.Bookmark.quote.is_not(None),
-            Am.Bookmark.quote != "",
-            Am.Bookmark.quote != except_quote,
-        )) \
-        .all()
-    res.extend(r)
-
-    r = db_session \
-        .query(Um.Bookmark) \
-        .filter(and_(
-            Um.Bookmark.sutta_uid == sutta_uid,
-            Um.Bookmark.selection_range.is_not(None),
-            Um.Bookmark.selection_range != "",
-            Um.Bookmark.quote.is_not(None),
-            Um.Bookmark.quote != "",
-            Um.Bookmark.quote != except_quote,
-        )) \
-        .all()
-    res.extend(r)
-
-    db_conn.close()
-    db_session.close()
-    db_eng.dispose()
-
-    return res
+def _get_bookmarks_with_quote_only_for_sutta(sutta_uid: str, except_quote: str = "") -> List[Row]:
+    def where(m) -> List[Any]:
+        return [m.Bookmark.sutta_uid == sutta_uid,
+                or_(m.Bookmark.selection_range.is_(None),
+                    m.Bookmark.selection_range == ""),
+                m.Bookmark.quote.is_not(None),
+                m.Bookmark.quote != "",
+                m.Bookmark.quote != except_quote]
+
+    with db_read_session() as db_session:
+        return union_rows(db_session, 'Bookmark', BOOKMARK_RES_COLUMNS, where)
+
+def _get_bookmarks_with_range_for_sutta(sutta_uid: str, except_quote = "") -> List[Row]:
+    def where(m) -> List[Any]:
+        return [m.Bookmark.sutta_uid == sutta_uid,
+                m.Bookmark.selection_range.is_not(None),
+                m.Bookmark.selection_range != "",
+                m.Bookmark.quote.is_not(None),
+                m.Bookmark.quote != "",
+                m.Bookmark.quote != except_quote]
+
+    with db_read_session() as db_session:
+        return union_rows(db_session, 'Bookmark', BOOKMARK_RES_COLUMNS, where)
 
 @app.errorhandler(400)
 def resp_bad_request(e):
@@ -703,8 +963,10 @@ def start_server(port: int,
                  run_sutta_study_fn: Callable[[SuttaStudyParams], None],
                  run_dictionary_search_fn: Callable[[LookupPanelParams], None],
                  run_suttas_fulltext_search_fn: Callable[[str, SearchParams, int], ApiSearchResult],
-                 run_dict_combined_search_fn: Callable[[str, SearchParams, int], ApiSearchResult]):
-    logger.info(f'Starting server on port {port}')
+                 run_dict_combined_search_fn: Callable[[str, SearchParams, int], ApiSearchResult],
+                 search_indexes_fn: Optional[Callable[[], Optional[TantivySearchIndexes]]] = None,
+                 workers: int = API_SERVER_WORKERS):
+    logger.info(f'Starting server on port {port} with {workers} workers')
 
     global server_queue
     server_queue = q
@@ -718,5 +980,38 @@ def start_server(port: int,
     app_callbacks.run_dictionary_search = run_dictionary_search_fn
     app_callbacks.run_suttas_fulltext_search = run_suttas_fulltext_search_fn
     app_callbacks.run_dict_combined_search = run_dict_combined_search_fn
+    app_callbacks.get_search_indexes = search_indexes_fn
+
+    server = PooledWSGIServer('127.0.0.1', port, app, workers)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+def start_headless_server(port: int, workers: int = API_SERVER_WORKERS):
+    """
+    Serve the API without the GUI. The search indexes and the completion lists
+    are loaded once at startup, and the searches run without Qt.
+    """
+    from simsapa.app.db_session import get_db_engine_connection_session
+
+    logger.info(f'Starting headless server on port {port} with {workers} workers')
 
-    app.run(host='127.0.0.1', port=port, debug=False, load_dotenv=False)
+    _, _, db_session = get_db_engine_connection_session()
+
+    global api_queries
+    api_queries = ApiSearchQueries(TantivySearchIndexes(db_session), workers)
+
+    for area in [SearchArea.Suttas, SearchArea.DictWords]:
+        get_flat_completion_list(area)
+
+    global app_callbacks
+    app_callbacks.headless = True
+    app_callbacks.run_suttas_fulltext_search = api_queries.suttas_fulltext_search
+    app_callbacks.run_dict_combined_search = api_queries.dict_combined_search
+
+    server = PooledWSGIServer('127.0.0.1', port, app, workers)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
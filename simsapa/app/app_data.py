@@ -21,11 +21,12 @@ from PyQt6.QtGui import QClipboard
 
 from simsapa import COURSES_DIR, DbSchemaName, get_is_gui, logger, APP_DB_PATH, USER_DB_PATH, DPD_DB_PATH, ASSETS_DIR, INDEX_DIR
 from simsapa.app.actions_manager import ActionsManager
-from simsapa.app.completion_lists import WordSublists
-from simsapa.app.db_session import get_db_session_with_schema
+from simsapa.app.completion_lists import WordSublists, clear_flat_completion_lists, delete_saved_completions
+from simsapa.app.db_session import apply_db_profile, check_db_migrations, get_db_session_with_schema
 from simsapa.app.dpd_render import DPD_PALI_WORD_TEMPLATES
-from simsapa.app.helpers import bilara_text_to_segments
+from simsapa.app.helpers import BilaraSegment, bilara_segment_rows, bilara_segments_data, bilara_segments_to_json, bilara_segments_unpack
 from simsapa.app.search.tantivy_index import TantivySearchIndexes
+from simsapa.app.sutta_render_cache import clear_sutta_render_caches
 
 from simsapa.app.types import SearchArea, USutta, UDictWord, UBookmark
 
@@ -89,6 +90,8 @@ class AppData:
         # Make sure the user_db exists before getting the db_session handle.
         self._check_db(self._user_db_path, DbSchemaName.UserData)
 
+        check_db_migrations(self._app_db_path, self._user_db_path, DPD_DB_PATH)
+
         self.db_eng, self.db_conn, self.db_session = self._get_db_engine_connection_session(self._app_db_path, self._user_db_path, DPD_DB_PATH)
         self._read_app_settings()
 
@@ -238,6 +241,8 @@ class AppData:
             db_conn.execute(text(f"ATTACH DATABASE '{user_db_path}' AS {DbSchemaName.UserData.value};"))
             db_conn.execute(text(f"ATTACH DATABASE '{dpd_db_path}' AS {DbSchemaName.Dpd.value};"))
 
+            apply_db_profile(db_conn, [DbSchemaName.AppData.value, DbSchemaName.UserData.value, DbSchemaName.Dpd.value])
+
             Session = sessionmaker(db_eng)
             Session.configure(bind=db_eng)
             db_session = Session()
@@ -515,10 +520,21 @@ class AppData:
             self.db_session.add(author)
             sutta.author = author
 
+            data = bilara_segments_data(sutta.content_json, sutta.content_json_tmpl)
+            if data is not None:
+                sutta.segments = Um.SuttaSegments(data = data)
+
             self.db_session.add(sutta)
 
         self.db_session.commit()
 
+        clear_sutta_render_caches()
+
+        # The sutta titles completions include the imported suttas.
+        delete_saved_completions(self.db_session, SearchArea.Suttas)
+        clear_flat_completion_lists()
+        self._init_completion_cache()
+
         n = len(import_suttas)
 
         import_db_conn.close()
@@ -791,29 +807,43 @@ class AppData:
 
         return course_name
 
-    def get_pali_for_translated(self, sutta: USutta) -> Optional[USutta]:
+    def get_pali_for_translated(self, sutta: USutta, db_session: Optional[Session] = None) -> Optional[USutta]:
+        """Uses the app's session, or the given one when called from a worker thread."""
         if sutta.language == 'pli':
             return None
 
+        if db_session is None:
+            db_session = self.db_session
+
+        # The appdata translations are mapped to their Pali suttas by the db migration.
+        if sutta.metadata.schema == DbSchemaName.AppData.value:
+            pali_sutta_id = db_session \
+                                .query(Am.SuttaPaliParallel.pali_sutta_id) \
+                                .filter(Am.SuttaPaliParallel.sutta_id == sutta.id) \
+                                .scalar()
+
+            if pali_sutta_id is not None:
+                return db_session.get(Am.Sutta, pali_sutta_id)
+
         uid_ref = re.sub('^([^/]+)/.*', r'\1', str(sutta.uid))
 
         res: List[USutta] = []
-        r = self.db_session \
+        r = db_session \
             .query(Am.Sutta) \
             .filter(and_(
                 Am.Sutta.uid != sutta.uid,
                 Am.Sutta.language == 'pli',
-                Am.Sutta.uid.like(f"{uid_ref}/%"),
+                Am.Sutta.uid_stem == uid_ref.lower(),
             )) \
             .all()
         res.extend(r)
 
-        r = self.db_session \
+        r = db_session \
             .query(Um.Sutta) \
             .filter(and_(
                 Um.Sutta.uid != sutta.uid,
                 Um.Sutta.language == 'pli',
-                Um.Sutta.uid.like(f"{uid_ref}/%"),
+                Um.Sutta.uid_stem == uid_ref.lower(),
             )) \
             .all()
         res.extend(r)
@@ -825,43 +855,56 @@ class AppData:
 
     def sutta_to_segments_json(self,
                                sutta: USutta,
-                               use_template: bool = True) -> Dict[str, str]:
+                               use_template: bool = True,
+                               db_session: Optional[Session] = None) -> Dict[str, str]:
 
-        res = sutta.variant
-        if res is None:
-            variant = None
-        else:
-            variant = str(res.content_json)
+        show_variants = self.app_settings.get('show_all_variant_readings', False)
+        show_glosses = self.app_settings.get('show_glosses', False)
 
-        res = sutta.comment
-        if res is None:
-            comment = None
-        else:
-            comment = str(res.content_json)
+        segments_json = bilara_segments_to_json(
+            self._sutta_segment_rows(sutta, db_session),
+            use_template,
+            show_variants,
+            show_glosses,
+        )
 
-        show_variants = self.app_settings.get('show_all_variant_readings', False)
+        return segments_json
 
-        res = sutta.gloss
-        if res is None:
-            gloss = None
-        else:
-            gloss = str(res.content_json)
+    def _sutta_segment_rows(self, sutta: USutta, db_session: Optional[Session] = None) -> List[BilaraSegment]:
+        """The merged segments of the sutta, read from the sutta_segments table.
+        Suttas without a row there (e.g. added since the migration) are parsed
+        from their JSON columns."""
 
-        show_glosses = self.app_settings.get('show_glosses', False)
+        if db_session is None:
+            db_session = self.db_session
 
-        if use_template:
-            tmpl = str(sutta.content_json_tmpl)
+        if sutta.metadata.schema == DbSchemaName.AppData.value:
+            model = Am.SuttaSegments
         else:
-            tmpl = None
+            model = Um.SuttaSegments
+
+        try:
+            data = db_session \
+                       .query(model.data) \
+                       .filter(model.sutta_id == sutta.id) \
+                       .scalar()
+        except Exception as e:
+            logger.error(f"_sutta_segment_rows(): {e}")
+            data = None
 
-        segments_json = bilara_text_to_segments(
+        if data is not None:
+            return bilara_segments_unpack(data)
+
+        def _content_json(x) -> Optional[str]:
+            if x is None:
+                return None
+            else:
+                return str(x.content_json)
+
+        return bilara_segment_rows(
             str(sutta.content_json),
-            tmpl,
-            variant,
-            comment,
-            gloss,
-            show_variants,
-            show_glosses,
+            sutta.content_json_tmpl,
+            _content_json(sutta.variant),
+            _content_json(sutta.comment),
+            _content_json(sutta.gloss),
         )
-
-        return segments_json
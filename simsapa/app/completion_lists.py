@@ -1,5 +1,6 @@
-from typing import List, Optional, Union
-import re, json
+from bisect import bisect_left
+from typing import Dict, List, Optional, Union
+import re, json, gzip, hashlib, threading
 
 from sqlalchemy.orm.session import Session
 from sqlalchemy.sql import func
@@ -9,6 +10,9 @@ from simsapa import logger, DbSchemaName
 from simsapa.app.db import appdata_models as Am
 from simsapa.app.db import userdata_models as Um
 from simsapa.app.db import dpd_models as Dpd
+from simsapa.app.db.uid_helpers import prefix_upper_bound
+from simsapa.app.db_session import db_read_session, userdata_write_session
+from simsapa.dpd_db.tools.pali_sort_key import pali_sort_key
 
 from simsapa.app.helpers import pali_to_ascii
 from simsapa.app.types import SearchArea
@@ -16,6 +20,38 @@ from simsapa.layouts.gui_types import WordSublists
 
 UAppSetting = Union[Am.AppSetting, Um.AppSetting]
 
+class FlatCompletionList:
+    """
+    A sorted completion list with its JSON response body prepared once: the
+    encoded JSON, the gzip compressed JSON and its ETag.
+    """
+
+    def __init__(self, words: List[str]):
+        self.words = words
+        self.body = json.dumps(words, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.gzip_body = gzip.compress(self.body)
+        self.etag = hashlib.sha1(self.body).hexdigest()
+
+        # Lowercase words in code point order, with their position in self.words,
+        # to find the words of a prefix with bisect. Pāḷi order can't be used
+        # for this, 'k' is not a prefix of 'kh' in pali_sort_key().
+        by_word = sorted((w.lower(), idx) for idx, w in enumerate(words))
+        self._keys = [i[0] for i in by_word]
+        self._positions = [i[1] for i in by_word]
+
+    def prefix_matches(self, prefix: str, limit: Optional[int] = None) -> List[str]:
+        """The words starting with prefix (case-insensitive), in the order of the list."""
+        prefix = prefix.lower()
+        if prefix == '':
+            return self.words[:limit]
+
+        a = bisect_left(self._keys, prefix)
+        b = bisect_left(self._keys, prefix_upper_bound(prefix))
+
+        positions = sorted(self._positions[a:b])[:limit]
+
+        return [self.words[i] for i in positions]
+
 def get_sutta_titles_completion_list(db_session: Session, load_only_from_appdata = False) -> WordSublists:
     res = []
     r = db_session.query(Am.Sutta.title).all()
@@ -141,3 +177,56 @@ def get_and_save_completions(db_session: Session,
             sublists = dict()
 
     return sublists
+
+def delete_saved_completions(db_session: Session, search_area: SearchArea):
+    """Remove the completions saved to userdata, they are generated again on the next request."""
+    if search_area == SearchArea.Suttas:
+        setting_key = 'sutta_titles_completions'
+    else:
+        setting_key = 'dict_words_completions'
+
+    db_session \
+        .query(Um.AppSetting) \
+        .filter(Um.AppSetting.key == setting_key) \
+        .delete()
+
+    db_session.commit()
+
+_FLAT_COMPLETION_LISTS: Dict[SearchArea, FlatCompletionList] = dict()
+_FLAT_COMPLETION_LISTS_LOCK = threading.Lock()
+
+def _load_flat_completion_list(area: SearchArea) -> FlatCompletionList:
+    if area == SearchArea.DictWords:
+        with db_read_session() as db_session:
+            # NOTE: The completions of all dict_words give a very long list, a 31 MB json response.
+            #
+            # r = get_and_save_completions(db_session, SearchArea.DictWords)
+            #
+            # Instead, load the words and roots from the DPD, which yields a 1.6 MB list.
+
+            res = db_session.query(Dpd.DpdHeadwords.lemma_1).all()
+            res.extend(db_session.query(Dpd.DpdRoots.root_no_sign).all())
+            results: List[str] = list(map(lambda x: x[0].strip() or 'none', res))
+
+    else:
+        # Saves the list to userdata if it was not found.
+        with userdata_write_session() as db_session:
+            r = get_and_save_completions(db_session, SearchArea.Suttas)
+            # Flatten the lists into a single list of strings
+            results = [item for sublist in r.values() for item in sublist]
+
+    return FlatCompletionList(sorted(results, key=lambda x: pali_sort_key(x)))
+
+def get_flat_completion_list(area: SearchArea) -> FlatCompletionList:
+    """The sorted completion list of the API and its response body, prepared
+    once and again after clear_flat_completion_lists()."""
+    with _FLAT_COMPLETION_LISTS_LOCK:
+        if area not in _FLAT_COMPLETION_LISTS:
+            _FLAT_COMPLETION_LISTS[area] = _load_flat_completion_list(area)
+
+        return _FLAT_COMPLETION_LISTS[area]
+
+def clear_flat_completion_lists():
+    """Called when suttas or words are imported, removed or re-indexed."""
+    with _FLAT_COMPLETION_LISTS_LOCK:
+        _FLAT_COMPLETION_LISTS.clear()
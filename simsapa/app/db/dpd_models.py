@@ -13,6 +13,7 @@ from sqlalchemy import null
 from sqlalchemy import DateTime
 from sqlalchemy import ForeignKey
 from sqlalchemy import ForeignKeyConstraint
+from sqlalchemy import Index
 # from sqlalchemy import Integer
 from sqlalchemy.ext.hybrid import hybrid_property
 # from sqlalchemy.orm import DeclarativeBase
@@ -21,7 +22,7 @@ from sqlalchemy.orm import mapped_column
 from sqlalchemy.orm import relationship
 # from sqlalchemy.orm import declared_attr
 from sqlalchemy.orm import object_session
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 
 from simsapa.dpd_db.tools.paths import ProjectPaths
 from simsapa.dpd_db.tools.sandhi_contraction import SandhiContractions
@@ -110,6 +111,13 @@ class InflectionTemplates(Base):
 
 class DpdRoots(Base):
     __tablename__ = "dpd_roots"
+    __table_args__ = (
+        Index("ix_dpd_roots_root_clean", "root_clean"),
+        Index("ix_dpd_roots_root_no_sign", "root_no_sign"),
+        Index("ix_dpd_roots_word_ascii", "word_ascii"),
+        Index("ix_dpd_roots_uid", "uid"),
+        Index("ix_dpd_roots_uid_lower", text("lower(uid)")),
+    )
 
     root: Mapped[str] = mapped_column(primary_key=True)
     root_in_comps: Mapped[str] = mapped_column(default='')
@@ -620,6 +628,13 @@ thai:          {self.thai}
 
 class DpdHeadwords(Base):
     __tablename__ = "dpd_headwords"
+    __table_args__ = (
+        Index("ix_dpd_headwords_lemma_clean", "lemma_clean"),
+        Index("ix_dpd_headwords_word_ascii", "word_ascii"),
+        Index("ix_dpd_headwords_stem", "stem"),
+        Index("ix_dpd_headwords_uid", "uid"),
+        Index("ix_dpd_headwords_uid_lower", text("lower(uid)")),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     lemma_1: Mapped[str] = mapped_column(unique=True)
@@ -12,6 +12,7 @@ from simsapa.app.helpers import latinize, pali_to_ascii, word_uid
 from simsapa.app.stardict import DictEntry, StarDictPaths, parse_bword_links_to_ssp, stardict_to_dict_entries, parse_ifo
 from simsapa.app.dict_link_helpers import add_epd_pali_words_links, add_example_links, add_grammar_links, add_sandhi_links
 from simsapa.app.export_helpers import add_sutta_links
+from simsapa.app.sutta_render_cache import preview_cache
 from simsapa.app.types import UDictWord
 from simsapa import DbSchemaName, DictTypeName, logger
 
@@ -114,6 +115,9 @@ def insert_db_words(db_session,
         # self.msg.setText(f"Imported {inserted} ...")
         logger.info(f"Imported {inserted}")
 
+    # The previews of the word links show the imported definitions.
+    preview_cache().clear()
+
     return uids
 
 def import_stardict_update_existing(db_session,
@@ -0,0 +1,62 @@
+"""Columns derived from the uid, so that queries can use equality or range
+predicates on indexed columns instead of LIKE patterns on the uid."""
+
+from typing import Any, Optional, Tuple
+
+from sqlalchemy import and_, func
+from sqlalchemy.sql.elements import ColumnElement
+
+def sutta_uid_parts(uid: str) -> Tuple[str, Optional[str], Optional[str]]:
+    """'dn1/pli/ms' -> ('dn1', 'pli', 'ms')"""
+    parts = uid.strip().strip('/').lower().split('/')
+
+    stem = parts[0]
+    lang = parts[1] if len(parts) > 1 and parts[1] != '' else None
+    source = parts[2] if len(parts) > 2 and parts[2] != '' else None
+
+    return (stem, lang, source)
+
+def dict_word_uid_source(uid: str) -> Optional[str]:
+    """'dhamma 1/dpd' -> 'dpd'"""
+    if '/' not in uid:
+        return None
+    source = uid.strip().rsplit('/', 1)[1].lower()
+    return source if source != '' else None
+
+def normalize_sutta_columns(sutta: Any):
+    """Fill uid_stem from the uid, and language and source_uid when they are
+    empty, as the queries expect."""
+    stem, lang, source = sutta_uid_parts(str(sutta.uid))
+
+    sutta.uid_stem = stem
+
+    if lang is not None and not sutta.language:
+        sutta.language = lang
+
+    if source is not None and not sutta.source_uid:
+        sutta.source_uid = source
+
+def normalize_dict_word_columns(word: Any):
+    source = dict_word_uid_source(str(word.uid))
+    if source is not None and not word.source_uid:
+        word.source_uid = source
+
+def prefix_upper_bound(prefix: str) -> str:
+    """The smallest string greater than all strings starting with prefix."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+def sqlite_lower(text: str) -> str:
+    """Lowercase as SQLite lower() and LIKE do, which only fold ASCII letters."""
+    return text.translate(_ASCII_LOWER)
+
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+def starts_with(column: Any, prefix: str) -> ColumnElement:
+    """Like column.like(f"{prefix}%"), case-insensitive as LIKE, as a range on
+    lower(column) which can use an index on lower(column)."""
+    if prefix == '':
+        return column.isnot(None)
+
+    prefix = sqlite_lower(prefix)
+
+    return and_(func.lower(column) >= prefix, func.lower(column) < prefix_upper_bound(prefix))
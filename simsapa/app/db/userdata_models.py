@@ -1,11 +1,12 @@
 from typing import Any, Dict, List, Optional
 from sqlalchemy import (MetaData, Table, Column, Integer,
-                        ForeignKey, DateTime, LargeBinary)
+                        ForeignKey, DateTime, LargeBinary, Index, event)
 
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 from sqlalchemy.orm import relationship, mapped_column, Mapped, declarative_base
 
 from simsapa import DbSchemaName
+from simsapa.app.db.uid_helpers import normalize_dict_word_columns, normalize_sutta_columns
 
 # -------------------------------------------------------------------------
 # NOTE: The schema label identifies the attached database. This is the only
@@ -72,9 +73,18 @@ class Author(Base):
 
 class Sutta(Base):
     __tablename__ = "suttas"
+    __table_args__ = (
+        Index("ix_suttas_uid_stem", "uid_stem"),
+        # For the uid_stem prefix ranges of uid_helpers.starts_with().
+        Index("ix_suttas_uid_stem_lower", text("lower(uid_stem)")),
+        Index("ix_suttas_sutta_ref", "sutta_ref"),
+        Index("ix_suttas_language", "language"),
+        Index("ix_suttas_source_uid", "source_uid"),
+    )
 
     id:  Mapped[int] = mapped_column(primary_key=True)
     uid: Mapped[str] = mapped_column(unique=True) # dn1/pli/ms
+    uid_stem:    Mapped[Optional[str]] # dn1, see uid_helpers.normalize_sutta_columns()
     sutta_ref:   Mapped[str] # DN 1
     nikaya:      Mapped[str] # DN
     language:    Mapped[str] # pli / en
@@ -117,6 +127,14 @@ class Sutta(Base):
     variant:    Mapped["SuttaVariant"]   = relationship("SuttaVariant", back_populates="sutta", passive_deletes=True, uselist=False)
     comment:    Mapped["SuttaComment"]   = relationship("SuttaComment", back_populates="sutta", passive_deletes=True, uselist=False)
     gloss:      Mapped["SuttaGloss"]     = relationship("SuttaGloss",   back_populates="sutta", passive_deletes=True, uselist=False)
+    # The derived segments row is deleted with the sutta by the ORM. The db's
+    # ON DELETE CASCADE doesn't apply, the connections don't enable foreign_keys.
+    segments:   Mapped[Optional["SuttaSegments"]] = relationship("SuttaSegments", cascade="all, delete-orphan", uselist=False)
+
+@event.listens_for(Sutta, 'before_insert')
+@event.listens_for(Sutta, 'before_update')
+def _sutta_before_save(_mapper, _connection, target: Sutta):
+    normalize_sutta_columns(target)
 
 class SuttaVariant(Base):
     __tablename__ = "sutta_variants"
@@ -166,6 +184,16 @@ class SuttaGloss(Base):
 
     sutta: Mapped[Sutta] = relationship("Sutta", back_populates="gloss", uselist=False)
 
+class SuttaSegments(Base):
+    """The bilara segments of a sutta, merged from the content, template,
+    variant, comment and gloss JSON, see helpers.bilara_segment_rows().
+    Derived from suttas, see db_helpers.create_sutta_segments()."""
+    __tablename__ = "sutta_segments"
+
+    sutta_id: Mapped[int] = mapped_column(ForeignKey("suttas.id", ondelete="CASCADE"), primary_key=True)
+    # zlib compressed JSON, see helpers.bilara_segments_pack()
+    data: Mapped[bytes] = mapped_column(LargeBinary)
+
 class Dictionary(Base):
     __tablename__ = "dictionaries"
 
@@ -191,6 +219,11 @@ class Dictionary(Base):
 
 class DictWord(Base):
     __tablename__ = "dict_words"
+    __table_args__ = (
+        Index("ix_dict_words_word", "word"),
+        Index("ix_dict_words_source_uid", "source_uid"),
+        Index("ix_dict_words_uid_lower", text("lower(uid)")),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     dictionary_id: Mapped[int] = mapped_column(ForeignKey("dictionaries.id", ondelete="CASCADE"), nullable=False)
@@ -243,6 +276,11 @@ class DictWord(Base):
 
         return d
 
+@event.listens_for(DictWord, 'before_insert')
+@event.listens_for(DictWord, 'before_update')
+def _dict_word_before_save(_mapper, _connection, target: DictWord):
+    normalize_dict_word_columns(target)
+
 class Example(Base):
     __tablename__ = "examples"
 
@@ -311,6 +349,9 @@ class Memo(Base):
 
 class MemoAssociation(Base):
     __tablename__ = "memo_associations"
+    __table_args__ = (
+        Index("ix_memo_associations_associated", "associated_table", "associated_id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     memo_id: Mapped[int] = mapped_column(ForeignKey("memos.id", ondelete="CASCADE"), nullable=False)
@@ -355,6 +396,9 @@ class Tag(Base):
 
 class Bookmark(Base):
     __tablename__ = "bookmarks"
+    __table_args__ = (
+        Index("ix_bookmarks_sutta_uid", "sutta_uid"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str]
@@ -381,6 +425,10 @@ class Bookmark(Base):
 
 class Link(Base):
     __tablename__ = "links"
+    __table_args__ = (
+        Index("ix_links_from", "from_table", "from_id"),
+        Index("ix_links_to", "to_table", "to_id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     label: Mapped[Optional[str]]
@@ -520,6 +568,24 @@ class MultiRef(Base):
 
     suttas: Mapped[List[Sutta]] = relationship("Sutta", secondary=assoc_sutta_multi_refs, back_populates="multi_refs")
 
+class MultiRefPage(Base):
+    """Volume and page range of a MultiRef.ref, one row per reference in the list.
+    Derived from multi_refs, see db_helpers.create_multi_ref_pages()."""
+    __tablename__ = "multi_ref_pages"
+    __table_args__ = (
+        Index("ix_multi_ref_pages_collection_volume_page", "collection", "volume", "page_start"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    multi_ref_id: Mapped[int] = mapped_column(ForeignKey("multi_refs.id", ondelete="CASCADE"), nullable=False)
+
+    collection: Mapped[str] # sn
+    volume: Mapped[int] # 2 in sn ii 45
+    page_start: Mapped[int] # 45
+    page_end: Mapped[int]
+
+    multi_ref: Mapped[MultiRef] = relationship("MultiRef")
+
 class HtmlResource(Base):
     __tablename__ = "html_resources"
 
@@ -1,6 +1,6 @@
 import sys, json
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List, Tuple
 
 import sqlite3
 import contextlib
@@ -9,7 +9,7 @@ from PyQt6.QtWidgets import QMessageBox
 
 from sqlalchemy import create_engine
 from sqlalchemy.orm.session import Session
-from sqlalchemy.sql import text
+from sqlalchemy.sql import func, text
 from sqlalchemy.engine import Engine
 
 from alembic import command
@@ -21,13 +21,14 @@ from simsapa.app.db import appdata_models as Am
 from simsapa.app.db import userdata_models as Um
 from simsapa.app.db import dpd_models as Dpd
 from simsapa.app.db_session import get_db_session_with_schema
-from simsapa.app.helpers import pali_to_ascii, word_uid
+from simsapa.app.helpers import bilara_segment_rows, bilara_segments_pack, pali_to_ascii, ref_to_pages, word_uid
+from simsapa.app.db.uid_helpers import dict_word_uid_source, sutta_uid_parts
 
 from simsapa.dpd_db.tools.sandhi_contraction import make_sandhi_contraction_dict
 from simsapa.dpd_db.tools.sandhi_contraction import SandhiContractions
 from simsapa.dpd_db.exporter.helpers import make_roots_count_dict
 
-from simsapa import DbSchemaName, DictTypeName, logger, ALEMBIC_INI, ALEMBIC_DIR
+from simsapa import APPDATA_MIGRATIONS_VERSION, DPD_MIGRATIONS_VERSION, USERDATA_MIGRATIONS_VERSION, DbSchemaName, DictTypeName, logger, ALEMBIC_INI, ALEMBIC_DIR
 
 def upgrade_db(db_path: Path, _: str):
     # NOTE: argument not used: schema_name: str
@@ -325,3 +326,339 @@ def migrate_dpd(dpd_db_path: Path, dpd_dictionary_id: int) -> None:
     except Exception as e:
         print(str(e))
         sys.exit(2)
+
+    migrate_dpd_indexes(dpd_db_path)
+
+def multi_ref_page_rows(refs: List[Tuple[int, str]]) -> List[Tuple[int, str, int, int, int]]:
+    """(multi_ref_id, collection, volume, page_start, page_end) rows from (id, ref) items."""
+    rows: List[Tuple[int, str, int, int, int]] = []
+
+    for (multi_ref_id, ref) in refs:
+        for p in ref_to_pages(ref):
+            rows.append((multi_ref_id, p['collection'], p['volume'], p['page_start'], p['page_end']))
+
+    # A single page ref is where the sutta starts. Extend it up to the page
+    # before the next sutta in the volume, so that a page inside the sutta is
+    # found with a range lookup.
+    rows.sort(key=lambda x: (x[1], x[2], x[3]))
+
+    for idx, r in enumerate(rows):
+        if r[3] != r[4]:
+            continue
+
+        for nxt in rows[idx+1:]:
+            if nxt[1] != r[1] or nxt[2] != r[2]:
+                break
+            if nxt[3] > r[3]:
+                rows[idx] = (r[0], r[1], r[2], r[3], nxt[3] - 1)
+                break
+
+    return rows
+
+def create_multi_ref_pages(connection: sqlite3.Connection):
+    """Create and fill the multi_ref_pages table from multi_refs."""
+    logger.info("create_multi_ref_pages()")
+
+    with contextlib.closing(connection.cursor()) as cursor:
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS multi_ref_pages (
+            id INTEGER NOT NULL PRIMARY KEY,
+            multi_ref_id INTEGER NOT NULL REFERENCES multi_refs (id) ON DELETE CASCADE,
+            collection VARCHAR NOT NULL,
+            volume INTEGER NOT NULL,
+            page_start INTEGER NOT NULL,
+            page_end INTEGER NOT NULL
+        );
+        """)
+
+        cursor.execute("""
+        CREATE INDEX IF NOT EXISTS ix_multi_ref_pages_collection_volume_page
+        ON multi_ref_pages (collection, volume, page_start);
+        """)
+
+        cursor.execute("DELETE FROM multi_ref_pages;")
+
+        refs = cursor.execute("SELECT id, ref FROM multi_refs WHERE ref IS NOT NULL;").fetchall()
+
+        cursor.executemany("""
+        INSERT INTO multi_ref_pages (multi_ref_id, collection, volume, page_start, page_end)
+        VALUES (?, ?, ?, ?, ?);
+        """, multi_ref_page_rows(refs))
+
+# Secondary indexes for the columns which lookups, sidebars and graph queries
+# filter on. The same indexes are declared in the models, these are for
+# databases created before them.
+# (index name, table, columns)
+APPDATA_USERDATA_INDEXES: List[Tuple[str, str, List[str]]] = [
+    ("ix_links_from", "links", ["from_table", "from_id"]),
+    ("ix_links_to", "links", ["to_table", "to_id"]),
+    ("ix_memo_associations_associated", "memo_associations", ["associated_table", "associated_id"]),
+    ("ix_bookmarks_sutta_uid", "bookmarks", ["sutta_uid"]),
+    ("ix_dict_words_word", "dict_words", ["word"]),
+]
+
+DPD_INDEXES: List[Tuple[str, str, List[str]]] = [
+    ("ix_dpd_headwords_lemma_clean", "dpd_headwords", ["lemma_clean"]),
+    ("ix_dpd_headwords_word_ascii", "dpd_headwords", ["word_ascii"]),
+    ("ix_dpd_headwords_stem", "dpd_headwords", ["stem"]),
+    ("ix_dpd_roots_root_clean", "dpd_roots", ["root_clean"]),
+    ("ix_dpd_roots_root_no_sign", "dpd_roots", ["root_no_sign"]),
+    ("ix_dpd_roots_word_ascii", "dpd_roots", ["word_ascii"]),
+]
+
+DPD_UID_INDEXES: List[Tuple[str, str, List[str]]] = [
+    ("ix_dpd_headwords_uid", "dpd_headwords", ["uid"]),
+    ("ix_dpd_roots_uid", "dpd_roots", ["uid"]),
+]
+
+def create_indexes(connection: sqlite3.Connection, indexes: List[Tuple[str, str, List[str]]]):
+    with contextlib.closing(connection.cursor()) as cursor:
+        for (name, table, columns) in indexes:
+            logger.info(f"Creating index {name}")
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)});")
+
+SUTTA_UID_INDEXES: List[Tuple[str, str, List[str]]] = [
+    ("ix_suttas_uid_stem", "suttas", ["uid_stem"]),
+    ("ix_suttas_sutta_ref", "suttas", ["sutta_ref"]),
+    ("ix_suttas_language", "suttas", ["language"]),
+    ("ix_suttas_source_uid", "suttas", ["source_uid"]),
+    ("ix_dict_words_source_uid", "dict_words", ["source_uid"]),
+]
+
+def normalize_uid_columns(connection: sqlite3.Connection):
+    """Add and fill suttas.uid_stem. The language and source_uid of suttas and
+    dict_words are filled from the uid only where they are empty, the values
+    of the downloaded database are kept."""
+    logger.info("normalize_uid_columns()")
+
+    with contextlib.closing(connection.cursor()) as cursor:
+        columns = [r[1] for r in cursor.execute("PRAGMA table_info(suttas);").fetchall()]
+        if 'uid_stem' not in columns:
+            cursor.execute("ALTER TABLE suttas ADD COLUMN uid_stem VARCHAR;")
+
+        rows = []
+        for (sutta_id, uid) in cursor.execute("SELECT id, uid FROM suttas;").fetchall():
+            stem, lang, source = sutta_uid_parts(uid)
+            rows.append((stem, lang, source, sutta_id))
+
+        cursor.executemany("""
+        UPDATE suttas SET
+            uid_stem = ?,
+            language = COALESCE(NULLIF(language, ''), ?),
+            source_uid = COALESCE(NULLIF(source_uid, ''), ?)
+        WHERE id = ?;
+        """, rows)
+
+        rows = []
+        for (word_id, uid) in cursor.execute("SELECT id, uid FROM dict_words WHERE source_uid IS NULL OR source_uid = '';").fetchall():
+            source = dict_word_uid_source(uid)
+            if source is not None:
+                rows.append((source, word_id))
+
+        cursor.executemany("UPDATE dict_words SET source_uid = ? WHERE id = ?;", rows)
+
+    create_indexes(connection, SUTTA_UID_INDEXES)
+
+# The prefix ranges of uid_helpers.starts_with() are on lower(column).
+LOWER_UID_INDEXES: List[Tuple[str, str, List[str]]] = [
+    ("ix_suttas_uid_stem_lower", "suttas", ["lower(uid_stem)"]),
+    ("ix_dict_words_uid_lower", "dict_words", ["lower(uid)"]),
+]
+
+DPD_LOWER_UID_INDEXES: List[Tuple[str, str, List[str]]] = [
+    ("ix_dpd_headwords_uid_lower", "dpd_headwords", ["lower(uid)"]),
+    ("ix_dpd_roots_uid_lower", "dpd_roots", ["lower(uid)"]),
+]
+
+def create_sutta_segments(connection: sqlite3.Connection, batch_len = 500):
+    """Create and fill the sutta_segments table, with the merged bilara
+    segments of the suttas which have content_json."""
+    logger.info("create_sutta_segments()")
+
+    with contextlib.closing(connection.cursor()) as cursor:
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sutta_segments (
+            sutta_id INTEGER NOT NULL PRIMARY KEY REFERENCES suttas (id) ON DELETE CASCADE,
+            data BLOB NOT NULL
+        );
+        """)
+
+        cursor.execute("DELETE FROM sutta_segments;")
+
+        # A separate cursor for the inserts, the select is read in batches.
+        with contextlib.closing(connection.cursor()) as select_cursor:
+            select_cursor.execute("""
+            SELECT s.id, s.content_json, s.content_json_tmpl, v.content_json, c.content_json, g.content_json
+            FROM suttas s
+            LEFT JOIN sutta_variants v ON v.sutta_id = s.id
+            LEFT JOIN sutta_comments c ON c.sutta_id = s.id
+            LEFT JOIN sutta_glosses g ON g.sutta_id = s.id
+            WHERE s.content_json IS NOT NULL AND s.content_json != '';
+            """)
+
+            while True:
+                batch = select_cursor.fetchmany(batch_len)
+                if len(batch) == 0:
+                    break
+
+                rows = []
+                for (sutta_id, content, tmpl, variant, comment, gloss) in batch:
+                    try:
+                        rows.append((sutta_id, bilara_segments_pack(bilara_segment_rows(content, tmpl, variant, comment, gloss))))
+                    except Exception as e:
+                        logger.error(f"create_sutta_segments(): sutta id {sutta_id}: {e}")
+
+                cursor.executemany("INSERT OR IGNORE INTO sutta_segments (sutta_id, data) VALUES (?, ?);", rows)
+
+def create_sutta_pali_parallels(connection: sqlite3.Connection):
+    """Create and fill the sutta_pali_parallels table, with the Pali sutta of
+    each translation which has one in the same db."""
+    logger.info("create_sutta_pali_parallels()")
+
+    with contextlib.closing(connection.cursor()) as cursor:
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sutta_pali_parallels (
+            sutta_id INTEGER NOT NULL PRIMARY KEY REFERENCES suttas (id) ON DELETE CASCADE,
+            pali_sutta_id INTEGER NOT NULL REFERENCES suttas (id) ON DELETE CASCADE
+        );
+        """)
+
+        cursor.execute("DELETE FROM sutta_pali_parallels;")
+
+        # Same as AppData.get_pali_for_translated(), the first Pali sutta with the uid stem.
+        cursor.execute("""
+        INSERT INTO sutta_pali_parallels (sutta_id, pali_sutta_id)
+        SELECT t.id, MIN(p.id)
+        FROM suttas t
+        JOIN suttas p ON p.uid_stem = t.uid_stem AND p.language = 'pli' AND p.uid != t.uid
+        WHERE t.language != 'pli'
+        GROUP BY t.id;
+        """)
+
+def update_sutta_pali_parallels(db_session: Session, uid_stems: List[str], batch_len = 500):
+    """Update the sutta_pali_parallels rows of the appdata translations with
+    the uid stems, e.g. after importing suttas, the same way as
+    create_sutta_pali_parallels()."""
+    logger.info(f"update_sutta_pali_parallels(): {len(uid_stems)} uid stems")
+
+    uid_stems = list(set(uid_stems))
+
+    for n in range(0, len(uid_stems), batch_len):
+        chunk = uid_stems[n:n+batch_len]
+
+        res = db_session \
+            .query(Am.Sutta.uid_stem, func.min(Am.Sutta.id)) \
+            .filter(Am.Sutta.uid_stem.in_(chunk)) \
+            .filter(Am.Sutta.language == 'pli') \
+            .group_by(Am.Sutta.uid_stem) \
+            .all()
+        pali_ids: Dict[str, int] = dict([(str(i[0]), int(i[1])) for i in res])
+
+        translations = db_session \
+            .query(Am.Sutta) \
+            .filter(Am.Sutta.uid_stem.in_(chunk)) \
+            .filter(Am.Sutta.language != 'pli') \
+            .all()
+
+        for t in translations:
+            pali_sutta_id = pali_ids.get(str(t.uid_stem), None)
+
+            if pali_sutta_id is None:
+                t.pali_parallel = None
+            elif t.pali_parallel is None:
+                t.pali_parallel = Am.SuttaPaliParallel(pali_sutta_id = pali_sutta_id)
+            else:
+                t.pali_parallel.pali_sutta_id = pali_sutta_id
+
+    db_session.commit()
+
+def migrate_appdata(app_db_path: Path) -> None:
+    """Add the derived tables and indexes to the appdata db, which are not part
+    of the downloaded database."""
+    logger.info("migrate_appdata()")
+
+    try:
+        with contextlib.closing(sqlite3.connect(app_db_path)) as connection:
+            version = connection.execute("PRAGMA user_version;").fetchone()[0]
+
+            if version < 1:
+                create_multi_ref_pages(connection)
+
+            if version < 2:
+                create_indexes(connection, APPDATA_USERDATA_INDEXES)
+
+            if version < 3:
+                normalize_uid_columns(connection)
+
+            if version < 4:
+                create_sutta_segments(connection)
+
+            if version < 5:
+                create_sutta_pali_parallels(connection)
+
+            if version < 6:
+                create_indexes(connection, LOWER_UID_INDEXES)
+
+            connection.execute(f"PRAGMA user_version = {APPDATA_MIGRATIONS_VERSION};")
+            connection.commit()
+
+    except Exception as e:
+        # The queries expect the migrated columns and tables, don't continue without them.
+        logger.error(f"migrate_appdata(): {e}")
+        raise e
+
+def migrate_userdata(user_db_path: Path) -> None:
+    """Add the indexes, uid-derived columns and sutta segments to a userdata db
+    created before they were declared in the models."""
+    logger.info("migrate_userdata()")
+
+    try:
+        with contextlib.closing(sqlite3.connect(user_db_path)) as connection:
+            version = connection.execute("PRAGMA user_version;").fetchone()[0]
+
+            if version < 1:
+                create_indexes(connection, APPDATA_USERDATA_INDEXES)
+
+            if version < 2:
+                normalize_uid_columns(connection)
+
+            if version < 3:
+                create_sutta_segments(connection)
+
+            if version < 4:
+                create_indexes(connection, LOWER_UID_INDEXES)
+
+            if version < 5:
+                # Rebuild, removing the rows of deleted or re-imported suttas.
+                create_sutta_segments(connection)
+
+            connection.execute(f"PRAGMA user_version = {USERDATA_MIGRATIONS_VERSION};")
+            connection.commit()
+
+    except Exception as e:
+        logger.error(f"migrate_userdata(): {e}")
+        raise e
+
+def migrate_dpd_indexes(dpd_db_path: Path) -> None:
+    """Add the lookup indexes to the dpd db."""
+    logger.info("migrate_dpd_indexes()")
+
+    try:
+        with contextlib.closing(sqlite3.connect(dpd_db_path)) as connection:
+            version = connection.execute("PRAGMA user_version;").fetchone()[0]
+
+            if version < 1:
+                create_indexes(connection, DPD_INDEXES)
+
+            if version < 2:
+                create_indexes(connection, DPD_UID_INDEXES)
+
+            if version < 3:
+                create_indexes(connection, DPD_LOWER_UID_INDEXES)
+
+            connection.execute(f"PRAGMA user_version = {DPD_MIGRATIONS_VERSION};")
+            connection.commit()
+
+    except Exception as e:
+        logger.error(f"migrate_dpd_indexes(): {e}")
+        raise e
@@ -1,6 +1,9 @@
 import os, sys
+import threading
+import contextlib
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Tuple, Optional
+from typing import Callable, Iterator, List, Tuple, Optional
 import sqlite3
 
 from sqlalchemy import create_engine
@@ -9,8 +12,9 @@ from sqlalchemy.engine import Engine
 from sqlalchemy.engine.base import Connection
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.orm.session import Session
+from sqlalchemy.pool import StaticPool
 
-from simsapa import APP_DB_PATH, DPD_DB_PATH, USER_DB_PATH, logger, DbSchemaName
+from simsapa import APP_DB_PATH, APPDATA_MIGRATIONS_VERSION, DB_CACHE_SIZE_KB, DPD_MIGRATIONS_VERSION, USERDATA_MIGRATIONS_VERSION, DB_MMAP_SIZE, DB_SESSION_POOL_SIZE, DPD_DB_PATH, USER_DB_PATH, logger, DbSchemaName
 
 def get_db_version(db_path: Path) -> Optional[str]:
     con = sqlite3.connect(db_path)
@@ -49,21 +53,142 @@ def get_dpd_db_version() -> Optional[str]:
 
     return val[0]
 
-def get_db_engine_connection_session(include_userdata: bool = True) -> Tuple[Engine, Connection, Session]:
-    app_db_path = APP_DB_PATH
-    user_db_path = USER_DB_PATH
-    dpd_db_path = DPD_DB_PATH
+_DB_MIGRATIONS_CHECKED = False
+_DB_MIGRATIONS_LOCK = threading.Lock()
+
+def pending_db_migrations(app_db_path: Path = APP_DB_PATH,
+                          user_db_path: Path = USER_DB_PATH,
+                          dpd_db_path: Path = DPD_DB_PATH) -> List[Tuple[Path, str]]:
+    """
+    The dbs whose derived tables and indexes are not up to date (PRAGMA
+    user_version), with the name of their migration function in db_helpers.
+    """
+    if _DB_MIGRATIONS_CHECKED:
+        return []
+
+    checks = [
+        (app_db_path, APPDATA_MIGRATIONS_VERSION, 'migrate_appdata'),
+        (user_db_path, USERDATA_MIGRATIONS_VERSION, 'migrate_userdata'),
+        (dpd_db_path, DPD_MIGRATIONS_VERSION, 'migrate_dpd_indexes'),
+    ]
+
+    pending: List[Tuple[Path, str]] = []
+
+    for (db_path, migrations_version, migrate_fn) in checks:
+        if not Path(db_path).exists():
+            continue
+
+        with contextlib.closing(sqlite3.connect(db_path)) as connection:
+            version = connection.execute("PRAGMA user_version;").fetchone()[0]
+
+        if version < migrations_version:
+            pending.append((Path(db_path), migrate_fn))
+
+    return pending
 
-    if not os.path.isfile(app_db_path):
-        logger.error(f"Database file doesn't exist: {app_db_path}")
+def check_db_migrations(app_db_path: Path = APP_DB_PATH,
+                        user_db_path: Path = USER_DB_PATH,
+                        dpd_db_path: Path = DPD_DB_PATH,
+                        progress_fn: Optional[Callable[[Path], None]] = None):
+    """
+    Checks if the derived tables and indexes of appdata, userdata and dpd are
+    up to date. If not, runs the migration from db_helpers. progress_fn is
+    called with the path of each db before migrating it.
+
+    The GUI runs this with a progress window before AppData(), see
+    DbMigrationsWindow. A failed migration raises its exception.
+
+    This check avoids loading the db_helpers module if not necessary.
+    """
+    global _DB_MIGRATIONS_CHECKED
+    with _DB_MIGRATIONS_LOCK:
+        if _DB_MIGRATIONS_CHECKED:
+            return
+
+        for (db_path, migrate_fn) in pending_db_migrations(app_db_path, user_db_path, dpd_db_path):
+            if progress_fn is not None:
+                progress_fn(db_path)
+
+            from simsapa.app import db_helpers
+            getattr(db_helpers, migrate_fn)(db_path)
+
+        _DB_MIGRATIONS_CHECKED = True
+
+def _check_db_paths(include_userdata: bool = True):
+    if not os.path.isfile(APP_DB_PATH):
+        logger.error(f"Database file doesn't exist: {APP_DB_PATH}")
         sys.exit(1)
 
-    if include_userdata and not os.path.isfile(user_db_path):
-        logger.error(f"Database file doesn't exist: {user_db_path}")
+    if include_userdata and not os.path.isfile(USER_DB_PATH):
+        logger.error(f"Database file doesn't exist: {USER_DB_PATH}")
         sys.exit(1)
 
-    if not os.path.isfile(dpd_db_path):
-        logger.error(f"Database file doesn't exist: {dpd_db_path}")
+    if not os.path.isfile(DPD_DB_PATH):
+        logger.error(f"Database file doesn't exist: {DPD_DB_PATH}")
+
+    check_db_migrations()
+
+def apply_db_profile(db_conn: Connection,
+                     schemas: List[str],
+                     read_only: bool = False,
+                     cache_scale: int = 1):
+    """
+    Sets the page cache and memory-mapped I/O size of the attached databases
+    (DB_CACHE_SIZE_KB, DB_MMAP_SIZE, smaller in low memory mode) and keeps
+    temporary tables and indexes in memory.
+
+    A read_only connection refuses writes. Otherwise userdata is switched to WAL
+    journaling, so that saving to userdata doesn't block the readers.
+
+    cache_scale divides the cache size, for connections kept open in a pool.
+    """
+    db_conn.execute(text("PRAGMA temp_store = MEMORY;"))
+
+    for schema in schemas:
+        # A negative cache_size is in KiB, not pages.
+        cache_kb = DB_CACHE_SIZE_KB.get(schema, 2*1024) // max(1, cache_scale)
+        db_conn.execute(text(f"PRAGMA {schema}.cache_size = -{cache_kb};"))
+        db_conn.execute(text(f"PRAGMA {schema}.mmap_size = {DB_MMAP_SIZE.get(schema, 0)};"))
+
+        if schema == DbSchemaName.UserData.value and not read_only:
+            db_conn.execute(text(f"PRAGMA {schema}.journal_mode = WAL;"))
+
+    if read_only:
+        db_conn.execute(text("PRAGMA query_only = ON;"))
+
+def _read_only_uri(db_path: Path) -> str:
+    # Requires a connection opened with uri=True.
+    return Path(db_path).absolute().as_uri() + "?mode=ro"
+
+def _attach_databases(db_conn: Connection, include_userdata: bool = True, read_only: bool = False):
+    """
+    Attach appdata, userdata and dpd. With read_only, appdata and dpd are opened
+    in read-only mode, and the connection must be created with uri=True.
+    """
+    if read_only:
+        app_db = _read_only_uri(APP_DB_PATH)
+        dpd_db = _read_only_uri(DPD_DB_PATH)
+    else:
+        app_db = str(APP_DB_PATH)
+        dpd_db = str(DPD_DB_PATH)
+
+    schemas = [DbSchemaName.AppData.value]
+
+    db_conn.execute(text(f"ATTACH DATABASE '{app_db}' AS appdata;"))
+    if include_userdata:
+        db_conn.execute(text(f"ATTACH DATABASE '{USER_DB_PATH}' AS userdata;"))
+        schemas.append(DbSchemaName.UserData.value)
+
+    db_conn.execute(text(f"ATTACH DATABASE '{dpd_db}' AS dpd;"))
+    schemas.append(DbSchemaName.Dpd.value)
+
+    apply_db_profile(db_conn,
+                     schemas,
+                     read_only = read_only,
+                     cache_scale = DB_SESSION_POOL_SIZE if read_only else 1)
+
+def get_db_engine_connection_session(include_userdata: bool = True) -> Tuple[Engine, Connection, Session]:
+    _check_db_paths(include_userdata)
 
     try:
         # Create an in-memory database
@@ -71,12 +196,7 @@ def get_db_engine_connection_session(include_userdata: bool = True) -> Tuple[Eng
 
         db_conn = db_eng.connect()
 
-        # Attach appdata and userdata
-        db_conn.execute(text(f"ATTACH DATABASE '{app_db_path}' AS appdata;"))
-        if include_userdata:
-            db_conn.execute(text(f"ATTACH DATABASE '{user_db_path}' AS userdata;"))
-
-        db_conn.execute(text(f"ATTACH DATABASE '{dpd_db_path}' AS dpd;"))
+        _attach_databases(db_conn, include_userdata)
 
         Session = sessionmaker(db_eng)
         Session.configure(bind=db_eng)
@@ -88,6 +208,144 @@ def get_db_engine_connection_session(include_userdata: bool = True) -> Tuple[Eng
 
     return (db_eng, db_conn, db_session)
 
+def _get_shared_engine_connection_session(read_only: bool = False) -> Tuple[Engine, Connection, Session]:
+    """
+    Like get_db_engine_connection_session(), but the engine keeps a single
+    connection (StaticPool) which may be used from another thread than the one
+    which created it, so that the session can be handed to the next thread.
+    """
+    _check_db_paths()
+
+    db_eng = create_engine("sqlite+pysqlite://",
+                           echo=False,
+                           poolclass=StaticPool,
+                           connect_args={'check_same_thread': False, 'uri': True})
+
+    db_conn = db_eng.connect()
+
+    _attach_databases(db_conn, read_only = read_only)
+
+    Session = sessionmaker(db_eng)
+    Session.configure(bind=db_eng)
+    db_session = Session()
+
+    return (db_eng, db_conn, db_session)
+
+class DbSessionPool:
+    """
+    A bounded pool of sessions with appdata, userdata and dpd attached.
+
+    Creating a new engine and attaching the databases for each query discards
+    SQLite's page cache and parsed schema. The pool keeps the connections open
+    for the next query. A session is used by one thread at a time, and a thread
+    gets the session it used last, if it is available.
+
+    The pooled connections are read-only (query_only), appdata and dpd are
+    attached in read-only mode.
+
+    with db_session_pool().checkout() as db_session:
+        ...
+    """
+
+    def __init__(self, max_size: int = DB_SESSION_POOL_SIZE):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        # Idle sessions and the id of the thread which used them last.
+        self._idle: List[Tuple[int, Tuple[Engine, Connection, Session]]] = []
+
+    def _take_idle(self, thread_id: int) -> Optional[Tuple[Engine, Connection, Session]]:
+        with self._lock:
+            if len(self._idle) == 0:
+                return None
+
+            for idx, (t, item) in enumerate(self._idle):
+                if t == thread_id:
+                    return self._idle.pop(idx)[1]
+
+            return self._idle.pop()[1]
+
+    @contextmanager
+    def checkout(self) -> Iterator[Session]:
+        self._slots.acquire()
+        thread_id = threading.get_ident()
+
+        try:
+            item = self._take_idle(thread_id)
+            if item is None:
+                item = _get_shared_engine_connection_session(read_only = True)
+
+        except Exception as e:
+            self._slots.release()
+            logger.error(f"Can't connect to database: {e}")
+            raise e
+
+        try:
+            yield item[2]
+
+        finally:
+            # Ends the transaction and clears the identity map. The connection
+            # and the attached databases stay open.
+            item[2].close()
+
+            with self._lock:
+                self._idle.append((thread_id, item))
+
+            self._slots.release()
+
+    def dispose(self):
+        with self._lock:
+            for (_, (db_eng, db_conn, db_session)) in self._idle:
+                db_conn.close()
+                db_session.close()
+                db_eng.dispose()
+
+            self._idle = []
+
+_DB_SESSION_POOL: Optional[DbSessionPool] = None
+_DB_SESSION_POOL_LOCK = threading.Lock()
+
+def db_session_pool() -> DbSessionPool:
+    global _DB_SESSION_POOL
+    with _DB_SESSION_POOL_LOCK:
+        if _DB_SESSION_POOL is None:
+            _DB_SESSION_POOL = DbSessionPool()
+
+        return _DB_SESSION_POOL
+
+@contextmanager
+def db_read_session() -> Iterator[Session]:
+    """A pooled session for queries. Use userdata_write_session() for saving to userdata."""
+    with db_session_pool().checkout() as db_session:
+        yield db_session
+
+_USERDATA_WRITE: Optional[Tuple[Engine, Connection, Session]] = None
+_USERDATA_WRITE_LOCK = threading.Lock()
+
+@contextmanager
+def userdata_write_session() -> Iterator[Session]:
+    """
+    The session for writing to userdata, one writer at a time. The changes are
+    committed at the end of the block, or rolled back if it raises an exception.
+    """
+    global _USERDATA_WRITE
+    with _USERDATA_WRITE_LOCK:
+        if _USERDATA_WRITE is None:
+            _USERDATA_WRITE = _get_shared_engine_connection_session()
+
+        db_session = _USERDATA_WRITE[2]
+
+        try:
+            yield db_session
+            db_session.commit()
+
+        except Exception as e:
+            db_session.rollback()
+            raise e
+
+        finally:
+            db_session.close()
+
 def get_db_session_with_schema(db_path: Path, schema: DbSchemaName) -> Tuple[Engine, Connection, Session]:
     if not os.path.isfile(db_path):
         logger.error(f"Database file doesn't exist: {db_path}")
@@ -100,6 +358,7 @@ def get_db_session_with_schema(db_path: Path, schema: DbSchemaName) -> Tuple[Eng
         db_conn = db_eng.connect()
 
         db_conn.execute(text(f"ATTACH DATABASE '{db_path}' AS {schema.value};"))
+        apply_db_profile(db_conn, [schema.value])
 
         Session = sessionmaker(db_eng)
         Session.configure(bind=db_eng)
@@ -1,4 +1,4 @@
-from typing import List, Set
+from typing import Dict, List, Set
 import re
 
 from mako.template import Template
@@ -6,15 +6,17 @@ from mako.template import Template
 from sqlalchemy.orm import object_session
 
 from simsapa.app.db.dpd_models import FamilyCompound, FamilySet, FamilyIdiom, DpdRoots, DpdHeadwords, FamilyRoot, FamilyWord, Russian, SBS, DPD_PALI_WORD_TEMPLATES, get_render_data
+from simsapa.app.dpd_views import DpdRootViewParts, headwords_view_parts, root_view_parts
+from simsapa.app.dpd_render_cache import dpd_render_cache, render_cache_key
 from simsapa.app.helpers import strip_html, root_info_clean_plaintext
 
-from simsapa.dpd_db.exporter.export_dpd import DpdHeadwordsDbParts, DpdHeadwordsDbRowItems, DpdHeadwordsRenderData, render_example_templ, render_family_compound_templ, render_family_idioms_templ, render_family_root_templ, render_family_set_templ, render_family_word_templ, render_feedback_templ, render_frequency_templ, render_grammar_templ, render_inflection_templ
-from simsapa.dpd_db.exporter.export_roots import render_root_buttons_templ, render_root_definition_templ, render_root_families_templ, render_root_info_templ, render_root_matrix_templ
-
-from simsapa.dpd_db.tools.exporter_functions import get_family_compounds, get_family_idioms, get_family_set
+from simsapa.dpd_db.exporter.export_dpd import DpdHeadwordsDbParts, DpdHeadwordsRenderData, render_example_templ, render_family_compound_templ, render_family_idioms_templ, render_family_root_templ, render_family_set_templ, render_family_word_templ, render_feedback_templ, render_frequency_templ, render_grammar_templ, render_inflection_templ
+from simsapa.dpd_db.exporter.export_roots import render_root_definition_templ, render_root_info_templ, render_root_matrix_templ
 
 from simsapa.dpd_db.tools.meaning_construction import degree_of_completion, make_meaning_html, summarize_construction
 from simsapa.dpd_db.tools.niggahitas import add_niggahitas
+from simsapa.dpd_db.tools.pali_sort_key import pali_sort_key
+from simsapa.dpd_db.tools.paths import ProjectPaths
 # from simsapa.dpd_db.tools.pos import CONJUGATIONS, DECLENSIONS, EXCLUDE_FROM_FREQ
 from simsapa.dpd_db.tools.utils import RenderResult
 
@@ -109,57 +111,55 @@ def pali_root_index_plaintext(pali_root: DpdRoots) -> str:
     return plaintext
 
 def pali_word_dpd_html(pali_word: DpdHeadwords, open_details: List[DetailsTab] = []) -> RenderResult:
-    db_session = object_session(pali_word)
-    assert(db_session is not None)
+    key = render_cache_key(DpdHeadwords.__tablename__, str(pali_word.id), open_details)
+    return dpd_render_cache().get_or_render(key, lambda: render_pali_word_dpd_html(pali_word, open_details))
+
+def pali_words_dpd_html(pali_words: List[DpdHeadwords], open_details: List[DetailsTab] = []) -> Dict[int, RenderResult]:
+    """The rendered entries by headword id. The entries which are not in the
+    cache are rendered together with render_pali_words_dpd_html()."""
+    cache = dpd_render_cache()
+
+    res: Dict[int, RenderResult] = dict()
+    missing: List[DpdHeadwords] = []
+
+    for w in pali_words:
+        r = cache.get(render_cache_key(DpdHeadwords.__tablename__, str(w.id), open_details))
+        if r is None:
+            missing.append(w)
+        else:
+            res[w.id] = r
+
+    if len(missing) > 0:
+        rendered = render_pali_words_dpd_html(missing, open_details)
+        cache.put_many([(render_cache_key(DpdHeadwords.__tablename__, str(k), open_details), v) for k, v in rendered.items()],
+                       keep_in_memory = True)
+        res.update(rendered)
 
-    dpd_db = db_session.query(
-        DpdHeadwords, FamilyRoot, FamilyWord, SBS, Russian
-    ).outerjoin(
-        SBS,
-        DpdHeadwords.id == SBS.id
-    ).outerjoin(
-        Russian,
-        DpdHeadwords.id == Russian.id
-    ).outerjoin(
-        FamilyRoot,
-        DpdHeadwords.root_family_key == FamilyRoot.root_family_key
-    ).outerjoin(
-        FamilyWord,
-        DpdHeadwords.family_word == FamilyWord.word_family
-    ) \
-                       .filter(DpdHeadwords.id == pali_word.id) \
-                       .first()
-
-    assert(dpd_db is not None)
-
-    def _add_parts(i: DpdHeadwordsDbRowItems) -> DpdHeadwordsDbParts:
-        pw: DpdHeadwords
-        fr: FamilyRoot
-        fw: FamilyWord
-        sbs: SBS
-        ru: Russian
-        pw, fr, fw, sbs, ru = i
-
-        return DpdHeadwordsDbParts(
-            pali_word = pw,
-            pali_root = pw.rt,
-            sbs = sbs,
-            ru = ru,
-            family_root = fr,
-            family_word = fw,
-            family_compounds = get_family_compounds(pw),
-            family_idioms = get_family_idioms(pw),
-            family_set = get_family_set(pw),
-        )
+    return res
+
+def render_pali_word_dpd_html(pali_word: DpdHeadwords, open_details: List[DetailsTab] = []) -> RenderResult:
+    """Renders the entry without the cache."""
+    return render_pali_words_dpd_html([pali_word], open_details)[pali_word.id]
 
-    db_parts = _add_parts(dpd_db._tuple())
+def render_pali_words_dpd_html(pali_words: List[DpdHeadwords], open_details: List[DetailsTab] = []) -> Dict[int, RenderResult]:
+    """Renders the entries without the cache, reading the rows of all entries
+    with a fixed number of queries."""
+    if len(pali_words) == 0:
+        return dict()
 
-    render_res = render_pali_word_dpd_simsapa_html(db_parts, get_render_data(), open_details)
+    db_session = object_session(pali_words[0])
+    assert(db_session is not None)
 
-    return render_res
+    # Rendering only reads the views, not the ORM objects.
+    parts = headwords_view_parts(db_session, [i.id for i in pali_words])
+
+    rd = get_render_data()
+
+    return dict([(k, render_pali_word_dpd_simsapa_html(v, rd, open_details)) for k, v in parts.items()])
 
 def pali_root_dpd_html(pali_root: DpdRoots, open_details: List[DetailsTab] = []) -> RenderResult:
-    return render_pali_root_dpd_simsapa_html(pali_root, get_render_data(), open_details)
+    key = render_cache_key(DpdRoots.__tablename__, str(pali_root.root), open_details)
+    return dpd_render_cache().get_or_render(key, lambda: render_pali_root_dpd_simsapa_html(pali_root, get_render_data(), open_details))
 
 def render_button_box_simsapa_templ(
         i: DpdHeadwords,
@@ -392,45 +392,6 @@ def render_pali_word_dpd_simsapa_html(db_parts: DpdHeadwordsDbParts,
     pth = rd['pth']
     sandhi_contractions = rd['sandhi_contractions']
 
-    # replace \n with html line break
-    if i.meaning_1:
-        i.meaning_1 = i.meaning_1.replace("\n", "<br>")
-    if i.sanskrit:
-        i.sanskrit = i.sanskrit.replace("\n", "<br>")
-    if i.phonetic:
-        i.phonetic = i.phonetic.replace("\n", "<br>")
-    if i.compound_construction:
-        i.compound_construction = i.compound_construction.replace("\n", "<br>")
-    if i.commentary:
-        i.commentary = i.commentary.replace("\n", "<br>")
-    if i.link:
-        i.link = i.link.replace("\n", "<br>")
-    if i.sutta_1:
-        i.sutta_1 = i.sutta_1.replace("\n", "<br>")
-    if i.sutta_2:
-        i.sutta_2 = i.sutta_2.replace("\n", "<br>")
-    if i.example_1:
-        i.example_1 = i.example_1.replace("\n", "<br>")
-    if i.example_2:
-        i.example_2 = i.example_2.replace("\n", "<br>")
-    if dps_data and sbs:
-        if sbs.sbs_sutta_1:
-            sbs.sbs_sutta_1 = sbs.sbs_sutta_1.replace("\n", "<br>")
-        if sbs.sbs_sutta_2:
-            sbs.sbs_sutta_2 = sbs.sbs_sutta_2.replace("\n", "<br>")
-        if sbs.sbs_sutta_3:
-            sbs.sbs_sutta_3 = sbs.sbs_sutta_3.replace("\n", "<br>")
-        if sbs.sbs_sutta_4:
-            sbs.sbs_sutta_4 = sbs.sbs_sutta_4.replace("\n", "<br>")
-        if sbs.sbs_example_1:
-            sbs.sbs_example_1 = sbs.sbs_example_1.replace("\n", "<br>")
-        if sbs.sbs_example_2:
-            sbs.sbs_example_2 = sbs.sbs_example_2.replace("\n", "<br>")
-        if sbs.sbs_example_3:
-            sbs.sbs_example_3 = sbs.sbs_example_3.replace("\n", "<br>")
-        if sbs.sbs_example_4:
-            sbs.sbs_example_4 = sbs.sbs_example_4.replace("\n", "<br>")
-
     html: str = ""
     # header = render_header_templ(pth, tt.dpd_css, tt.button_js, tt.header_templ)
     # html += header
@@ -574,29 +535,58 @@ def render_pali_word_dpd_simsapa_html(db_parts: DpdHeadwordsDbParts,
 def render_pali_root_dpd_simsapa_html(r: DpdRoots,
                                       render_data: DpdHeadwordsRenderData,
                                       open_details: List[DetailsTab] = []) -> RenderResult:
+    return render_pali_root_view_html(root_view_parts(r), render_data, open_details)
+
+def render_root_buttons_simsapa_templ(pth: ProjectPaths,
+                                      r: DpdRoots,
+                                      frs: List[FamilyRoot],
+                                      open_details: List[DetailsTab] = []) -> str:
+    """Same as render_root_buttons_templ(), with the root families given instead of queried."""
+
+    root_buttons_templ = Template(filename=str(pth.root_button_templ_path))
+
+    frs = sorted(frs, key=lambda x: pali_sort_key(x.root_family))
+
+    root_info_active = "active" if DetailsTab.RootInfo in open_details else ""
+
+    return str(
+        root_buttons_templ.render(
+            root_info_active=root_info_active,
+            r=r,
+            frs=frs))
+
+def render_root_families_simsapa_templ(pth: ProjectPaths, r: DpdRoots, frs: List[FamilyRoot]) -> str:
+    """Same as render_root_families_templ(), with the root families given instead of queried."""
+
+    root_families_templ = Template(filename=str(pth.root_families_templ_path))
+
+    frs = sorted(frs, key=lambda x: pali_sort_key(x.root_family))
+
+    return str(
+        root_families_templ.render(
+            r=r,
+            frs=frs,
+            hidden="hidden",
+            today=TODAY))
+
+def render_pali_root_view_html(parts: DpdRootViewParts,
+                               render_data: DpdHeadwordsRenderData,
+                               open_details: List[DetailsTab] = []) -> RenderResult:
     # NOTE: Compare with
     # exporter/export_roots.py::generate_root_html()
 
-    db_session = object_session(r)
-    assert(db_session is not None)
+    r = parts['pali_root']
+    frs = parts['family_roots']
 
     rd = render_data
     pth = rd['pth']
 
-    # replace \n with html line break
-    if r.panini_root:
-        r.panini_root = r.panini_root.replace("\n", "<br>")
-    if r.panini_sanskrit:
-        r.panini_sanskrit = r.panini_sanskrit.replace("\n", "<br>")
-    if r.panini_english:
-        r.panini_english = r.panini_english.replace("\n", "<br>")
-
     html = ""
 
     definition = render_root_definition_templ(pth, r, rd['roots_count_dict'])
     html += definition
 
-    root_buttons = render_root_buttons_templ(pth, r, db_session, open_details)
+    root_buttons = render_root_buttons_simsapa_templ(pth, r, frs, open_details)
     html += root_buttons
 
     root_info = render_root_info_templ(pth, r, open_details)
@@ -605,7 +595,7 @@ def render_pali_root_dpd_simsapa_html(r: DpdRoots,
     root_matrix = render_root_matrix_templ(pth, r, rd['roots_count_dict'])
     html += root_matrix
 
-    root_families = render_root_families_templ(pth, r, db_session)
+    root_families = render_root_families_simsapa_templ(pth, r, frs)
     html += root_families
 
     # FIXME improve specifying Simsapa and DPD version in feedback link
@@ -618,9 +608,6 @@ def render_pali_root_dpd_simsapa_html(r: DpdRoots,
     synonyms.add(re.sub("√", "", r.root))
     synonyms.add(re.sub("√", "", r.root_clean))
 
-    frs = db_session.query(FamilyRoot)\
-        .filter(FamilyRoot.root_key == r.root).all()
-
     for fr in frs:
         synonyms.add(fr.root_family)
         synonyms.add(re.sub("√", "", fr.root_family))
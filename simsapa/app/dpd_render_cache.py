@@ -0,0 +1,118 @@
+"""Cache of the rendered DPD headword and root entries.
+
+Two tiers (see render_cache.py): an in-memory LRU of DPD_RENDER_CACHE_SIZE
+entries, in front of a sqlite3 file which is kept between sessions and can be
+filled in advance with 'simsapa dpd-render-cache'.
+
+The entries are keyed by the app version and DPD release version, the word's
+table and key, and the open details tabs. Entries of other versions are
+removed when the store is opened. When the DPD release version is not known,
+the entries are only kept in memory.
+"""
+
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+import multiprocessing, threading
+
+from simsapa import DPD_RENDER_CACHE_PATH, DPD_RENDER_CACHE_SIZE, SIMSAPA_APP_VERSION, DetailsTab, logger
+from simsapa.app.render_cache import RenderCache
+from simsapa.dpd_db.tools.utils import RenderResult
+
+def render_cache_key(table_name: str, word_key: str, open_details: List[DetailsTab]) -> str:
+    """'dpd_headwords/123/Examples,Inflections', the word_key is the id of a headword and the root of a root."""
+    details = ",".join(sorted([i.value for i in open_details]))
+    return f"{table_name}/{word_key}/{details}"
+
+class DpdRenderCache(RenderCache):
+    def __init__(self, version: str, db_path: Optional[Path] = DPD_RENDER_CACHE_PATH, size: int = DPD_RENDER_CACHE_SIZE):
+        super().__init__(version, db_path, size)
+
+def new_dpd_render_cache(dpd_version: Optional[str], db_path: Path = DPD_RENDER_CACHE_PATH) -> DpdRenderCache:
+    """Without the DPD release version, the stored entries of an earlier
+    release couldn't be told apart, so the cache is memory-only."""
+    if dpd_version is None:
+        logger.warn("dpd_render_cache(): Unknown DPD version, the rendered entries are not stored")
+        return DpdRenderCache(SIMSAPA_APP_VERSION, None)
+
+    return DpdRenderCache(f"{SIMSAPA_APP_VERSION}/{dpd_version}", db_path)
+
+_DPD_RENDER_CACHE: Optional[DpdRenderCache] = None
+_DPD_RENDER_CACHE_LOCK = threading.Lock()
+
+def dpd_render_cache() -> DpdRenderCache:
+    global _DPD_RENDER_CACHE
+    with _DPD_RENDER_CACHE_LOCK:
+        if _DPD_RENDER_CACHE is None:
+            from simsapa.app.db_session import get_dpd_db_version
+
+            _DPD_RENDER_CACHE = new_dpd_render_cache(get_dpd_db_version())
+            logger.info(f"dpd_render_cache(): {_DPD_RENDER_CACHE.version}")
+
+        return _DPD_RENDER_CACHE
+
+def _prewarm_chunk(table_name: str, word_keys: List[str]) -> int:
+    """Renders the entries which are not yet in the store. Runs in a worker process."""
+    from simsapa.app.db_session import db_read_session
+    from simsapa.app.db import dpd_models as Dpd
+    from simsapa.app.dpd_render import render_pali_words_dpd_html, render_pali_root_dpd_simsapa_html
+
+    cache = dpd_render_cache()
+    items: List[Tuple[str, RenderResult]] = []
+
+    with db_read_session() as db_session:
+        if table_name == Dpd.DpdHeadwords.__tablename__:
+            words = db_session.query(Dpd.DpdHeadwords) \
+                              .filter(Dpd.DpdHeadwords.id.in_([int(i) for i in word_keys])) \
+                              .all()
+
+            words = [w for w in words if not cache.has(render_cache_key(table_name, str(w.id), []))]
+
+            for k, res in render_pali_words_dpd_html(words, []).items():
+                items.append((render_cache_key(table_name, str(k), []), res))
+
+        else:
+            roots = db_session.query(Dpd.DpdRoots) \
+                              .filter(Dpd.DpdRoots.root.in_(word_keys)) \
+                              .all()
+
+            for r in roots:
+                key = render_cache_key(table_name, str(r.root), [])
+                if not cache.has(key):
+                    items.append((key, render_pali_root_dpd_simsapa_html(r, Dpd.get_render_data(), [])))
+
+    cache.put_many(items)
+
+    return len(items)
+
+def prewarm_dpd_render_cache(workers: int, chunk_len = 200) -> int:
+    """Renders every DPD headword and root (with closed details) into the store,
+    in worker processes. Returns the number of newly rendered entries."""
+    from simsapa.app.db_session import db_read_session, get_dpd_db_version
+    from simsapa.app.db import dpd_models as Dpd
+
+    if get_dpd_db_version() is None:
+        logger.error("prewarm_dpd_render_cache(): Unknown DPD version, the rendered entries would not be stored")
+        return 0
+
+    with db_read_session() as db_session:
+        ids = [str(i[0]) for i in db_session.query(Dpd.DpdHeadwords.id).all()]
+        roots = [str(i[0]) for i in db_session.query(Dpd.DpdRoots.root).all()]
+
+    chunks: List[Tuple[str, List[str]]] = []
+    for table_name, keys in [(Dpd.DpdHeadwords.__tablename__, ids), (Dpd.DpdRoots.__tablename__, roots)]:
+        for n in range(0, len(keys), chunk_len):
+            chunks.append((table_name, keys[n:n+chunk_len]))
+
+    logger.info(f"prewarm_dpd_render_cache(): {len(ids)} headwords, {len(roots)} roots, {len(chunks)} chunks")
+
+    total = 0
+    # spawn: the workers open their own db connections.
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as executor:
+        for done, n in enumerate(executor.map(_prewarm_chunk, [i[0] for i in chunks], [i[1] for i in chunks])):
+            total += n
+            if done % 50 == 0:
+                logger.info(f"prewarm_dpd_render_cache(): {done}/{len(chunks)} chunks")
+
+    return total
@@ -0,0 +1,207 @@
+"""Read-only views of the DPD rows, for rendering.
+
+A view is a snapshot of a row's column values, taken once when the entry is
+rendered. The text fields are prepared for html (\\n to <br>) on the snapshot,
+instead of on the ORM object, which marked the rows as changed in the session.
+
+The views don't refer to the session, can't be changed, and can be shared
+between threads. The model's properties (lemma_1_, needs_example_button, etc.)
+are evaluated on the view's values, so the templates use a view as they would
+use the ORM object. The properties which query the session (root_count,
+pos_list, root_family_list) are not available on a view.
+"""
+
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, List, Optional, Set, TypeVar, TypedDict, cast
+import inspect
+
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import Query, Session, object_session
+
+from simsapa.app.db.dpd_models import DpdHeadwords, DpdRoots, FamilyCompound, FamilyIdiom, FamilyRoot, FamilySet, FamilyWord, Russian, SBS
+from simsapa.dpd_db.exporter.export_dpd import DpdHeadwordsDbParts, DpdHeadwordsDbRowItems
+
+T = TypeVar('T')
+
+HEADWORD_HTML_FIELDS = ['meaning_1', 'sanskrit', 'phonetic', 'compound_construction', 'commentary',
+                        'link', 'sutta_1', 'sutta_2', 'example_1', 'example_2']
+
+SBS_HTML_FIELDS = ['sbs_sutta_1', 'sbs_sutta_2', 'sbs_sutta_3', 'sbs_sutta_4',
+                   'sbs_example_1', 'sbs_example_2', 'sbs_example_3', 'sbs_example_4']
+
+ROOT_HTML_FIELDS = ['panini_root', 'panini_sanskrit', 'panini_english']
+
+class DpdView:
+    __slots__ = ('_model', '_values')
+
+    def __init__(self, model: type, values: Dict[str, Any]):
+        object.__setattr__(self, '_model', model)
+        object.__setattr__(self, '_values', MappingProxyType(values))
+
+    def __getattr__(self, name: str) -> Any:
+        # Only called when the name is not a slot.
+        values = object.__getattribute__(self, '_values')
+        if name in values:
+            return values[name]
+
+        model = object.__getattribute__(self, '_model')
+        attr = inspect.getattr_static(model, name, None)
+        if isinstance(attr, (property, hybrid_property)) and attr.fget is not None:
+            return attr.fget(self)
+
+        raise AttributeError(f"{model.__name__} view has no attribute '{name}'")
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError(f"{self._model.__name__} view is read-only")
+
+    def __delattr__(self, name: str):
+        raise AttributeError(f"{self._model.__name__} view is read-only")
+
+    def __repr__(self) -> str:
+        return f"DpdView({self._model.__name__})"
+
+def row_view(row: T, html_fields: Iterable[str] = []) -> T:
+    """A view of the row's columns, with \\n replaced by <br> in the html_fields.
+    The view is typed as the row, which it stands in for in the templates."""
+    mapper = sa_inspect(type(row))
+    assert mapper is not None, f"Not a mapped class: {type(row).__name__}"
+    values = {c.key: getattr(row, c.key) for c in mapper.column_attrs}
+
+    for k in html_fields:
+        if values.get(k):
+            values[k] = values[k].replace("\n", "<br>")
+
+    return cast(T, DpdView(type(row), values))
+
+def optional_row_view(row: Optional[T], html_fields: Iterable[str] = []) -> Optional[T]:
+    if row is None:
+        return None
+    return row_view(row, html_fields)
+
+def headword_parts_query(db_session: Session) -> Query:
+    """Headwords with their SBS, Russian, root family and word family rows."""
+    return db_session.query(
+        DpdHeadwords, FamilyRoot, FamilyWord, SBS, Russian
+    ).outerjoin(
+        SBS,
+        DpdHeadwords.id == SBS.id
+    ).outerjoin(
+        Russian,
+        DpdHeadwords.id == Russian.id
+    ).outerjoin(
+        FamilyRoot,
+        DpdHeadwords.root_family_key == FamilyRoot.root_family_key
+    ).outerjoin(
+        FamilyWord,
+        DpdHeadwords.family_word == FamilyWord.word_family
+    )
+
+def _by_order(rows: List[T], word_order: List[str], key_fn) -> List[T]:
+    return sorted(rows, key=lambda x: word_order.index(key_fn(x)))
+
+def _family_compounds(i: DpdHeadwords, fc_by_key: Dict[str, List[FamilyCompound]]) -> List[FamilyCompound]:
+    """Same as get_family_compounds(), from the prefetched rows."""
+    if i.family_compound:
+        word_order = i.family_compound_list
+        fc = [x for k in set(word_order) for x in fc_by_key.get(k, [])]
+        return _by_order(fc, word_order, lambda x: x.compound_family)
+    else:
+        return fc_by_key.get(i.lemma_clean, [])
+
+def _family_idioms(i: DpdHeadwords, fi_by_key: Dict[str, List[FamilyIdiom]]) -> List[FamilyIdiom]:
+    """Same as get_family_idioms(), from the prefetched rows."""
+    if i.family_idioms:
+        word_order = i.family_idioms_list
+        fi = [x for k in set(word_order) for x in fi_by_key.get(k, [])]
+        return _by_order(fi, word_order, lambda x: x.idiom)
+    else:
+        return fi_by_key.get(i.lemma_clean, [])
+
+def _family_set(i: DpdHeadwords, fs_by_key: Dict[str, List[FamilySet]]) -> List[FamilySet]:
+    """Same as get_family_set(), from the prefetched rows."""
+    word_order = i.family_set_list
+    fs = [x for k in set(word_order) for x in fs_by_key.get(k, [])]
+    return _by_order(fs, word_order, lambda x: x.set)
+
+def _group_by(rows: List[T], key_fn) -> Dict[str, List[T]]:
+    res: Dict[str, List[T]] = dict()
+    for i in rows:
+        res.setdefault(key_fn(i), []).append(i)
+    return res
+
+def headwords_view_parts(db_session: Session, ids: List[int], dps_data = False) -> Dict[int, DpdHeadwordsDbParts]:
+    """Views of the headwords and their related rows, by headword id.
+
+    The rows are read with five queries for any number of headwords: the
+    headwords with the joined rows, their roots, and the compound, idiom and
+    set families.
+    """
+    row_items: List[DpdHeadwordsDbRowItems] = [
+        r._tuple() for r in headword_parts_query(db_session).filter(DpdHeadwords.id.in_(ids)).all()]
+
+    if len(row_items) == 0:
+        return dict()
+
+    headwords = [i[0] for i in row_items]
+
+    root_keys = set([i.root_key for i in headwords if i.root_key])
+    roots = db_session.query(DpdRoots).filter(DpdRoots.root.in_(root_keys)).all()
+    roots_by_key = dict([(i.root, i) for i in roots])
+
+    fc_keys: Set[str] = set()
+    fi_keys: Set[str] = set()
+    fs_keys: Set[str] = set()
+    for i in headwords:
+        fc_keys.update(i.family_compound_list if i.family_compound else [i.lemma_clean])
+        fi_keys.update(i.family_idioms_list if i.family_idioms else [i.lemma_clean])
+        fs_keys.update([k for k in i.family_set_list if k])
+
+    fc_by_key = _group_by(db_session.query(FamilyCompound).filter(FamilyCompound.compound_family.in_(fc_keys)).all(),
+                          lambda x: x.compound_family)
+    fi_by_key = _group_by(db_session.query(FamilyIdiom).filter(FamilyIdiom.idiom.in_(fi_keys)).all(),
+                          lambda x: x.idiom)
+    fs_by_key = _group_by(db_session.query(FamilySet).filter(FamilySet.set.in_(fs_keys)).all(),
+                          lambda x: x.set)
+
+    res: Dict[int, DpdHeadwordsDbParts] = dict()
+
+    for pw, fr, fw, sbs, ru in row_items:
+        if dps_data:
+            sbs_view = optional_row_view(sbs, SBS_HTML_FIELDS)
+        else:
+            sbs_view = optional_row_view(sbs)
+
+        # The related rows are None in the outer join when not found, the type
+        # annotations of DpdHeadwordsDbParts don't include this.
+        res[pw.id] = DpdHeadwordsDbParts(
+            pali_word = row_view(pw, HEADWORD_HTML_FIELDS),
+            pali_root = cast(DpdRoots, optional_row_view(roots_by_key.get(pw.root_key))),
+            sbs = cast(SBS, sbs_view),
+            ru = cast(Any, optional_row_view(ru)),
+            family_root = cast(Any, optional_row_view(fr)),
+            family_word = cast(Any, optional_row_view(fw)),
+            family_compounds = [row_view(i) for i in _family_compounds(pw, fc_by_key)],
+            family_idioms = [row_view(i) for i in _family_idioms(pw, fi_by_key)],
+            family_set = [row_view(i) for i in _family_set(pw, fs_by_key)],
+        )
+
+    return res
+
+class DpdRootViewParts(TypedDict):
+    pali_root: DpdRoots
+    family_roots: List[FamilyRoot]
+
+def root_view_parts(r: DpdRoots) -> DpdRootViewParts:
+    """Reads the root and its root families from the session, and returns their views."""
+    db_session = object_session(r)
+    assert(db_session is not None)
+
+    frs = db_session.query(FamilyRoot) \
+                    .filter(FamilyRoot.root_key == r.root) \
+                    .all()
+
+    return DpdRootViewParts(
+        pali_root = row_view(r, ROOT_HTML_FIELDS),
+        family_roots = [row_view(i) for i in frs],
+    )
@@ -2,7 +2,7 @@ from pathlib import Path
 import re
 import subprocess
 import json
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
 from PyQt6.QtCore import QUrl
 
@@ -14,9 +14,10 @@ from simsapa import QueryType, SuttaQuote
 from simsapa.layouts.html_content import html_page
 from simsapa.app.helpers import bilara_content_json_to_html, bilara_line_by_line_html, normalize_sutta_ref
 from simsapa.app.helpers import strip_html
+from simsapa.app.search.helpers import get_sutta_uids_by_pts_refs
+from simsapa.app.sutta_render_cache import pali_segments_cache, sutta_render_cache, sutta_render_cache_key
 from simsapa.app.types import USutta
 from simsapa.app.app_data import AppData
-from simsapa.app.db import appdata_models as Am
 # from simsapa.app.db import userdata_models as Um
 
 def sutta_content_plain(sutta: USutta, join_short_lines: int = 80) -> str:
@@ -53,7 +54,7 @@ def sutta_content_plain(sutta: USutta, join_short_lines: int = 80) -> str:
     return content
 
 def save_sutta_as_html(app_data: AppData, output_path: Path, sutta: USutta):
-    s = render_sutta_content(app_data, sutta)
+    s = render_sutta_content(app_data, sutta, inline_assets = True)
     html = sanitized_sutta_html_for_export(s)
     with open(output_path, 'w') as f:
         f.write(html)
@@ -92,7 +93,7 @@ def save_suttas_as_epub(app_data: AppData,
         if i.language is not None:
             chapter.lang = i.language
 
-        html = render_sutta_content(app_data, i)
+        html = render_sutta_content(app_data, i, inline_assets = True)
         chapter.content = sanitized_sutta_html_for_export(html)
         book.add_item(chapter)
         toc.append(chapter)
@@ -216,20 +217,32 @@ def sanitized_sutta_html_for_export(tab_html: str) -> str:
 
     return clean_html
 
-def render_sutta_content(app_data: AppData, sutta: USutta, sutta_quote: Optional[SuttaQuote] = None) -> str:
-    if sutta.content_json is not None and sutta.content_json != '':
-        line_by_line = app_data.app_settings.get('show_translation_and_pali_line_by_line', True)
+def render_sutta_body(app_data: AppData, sutta: USutta, db_session: Optional[Session] = None) -> str:
+    """The sutta content html, without the page. Uses the render cache.
+    A worker thread passes its own db_session, with the sutta loaded from it."""
+    line_by_line = app_data.app_settings.get('show_translation_and_pali_line_by_line', True)
+    show_variants = app_data.app_settings.get('show_all_variant_readings', False)
+    show_glosses = app_data.app_settings.get('show_glosses', False)
+
+    key = sutta_render_cache_key(sutta, line_by_line, show_variants, show_glosses)
+
+    return sutta_render_cache().get_or_render(key, lambda: _render_sutta_body(app_data, sutta, line_by_line, db_session))
 
-        pali_sutta = app_data.get_pali_for_translated(sutta)
+def _render_sutta_body(app_data: AppData, sutta: USutta, line_by_line: bool, db_session: Optional[Session] = None) -> str:
+    if sutta.content_json is not None and sutta.content_json != '':
+        if line_by_line:
+            pali_sutta = app_data.get_pali_for_translated(sutta, db_session)
+        else:
+            pali_sutta = None
 
-        if line_by_line and pali_sutta:
-            translated_json = app_data.sutta_to_segments_json(sutta, use_template=False)
-            pali_json = app_data.sutta_to_segments_json(pali_sutta, use_template=False)
+        if pali_sutta:
+            translated_json = app_data.sutta_to_segments_json(sutta, use_template=False, db_session=db_session)
+            pali_json = pali_segments_json(app_data, pali_sutta, db_session)
             tmpl_json = json.loads(str(sutta.content_json_tmpl))
             content = bilara_line_by_line_html(translated_json, pali_json, tmpl_json)
 
         else:
-            translated_json = app_data.sutta_to_segments_json(sutta, use_template=True)
+            translated_json = app_data.sutta_to_segments_json(sutta, use_template=True, db_session=db_session)
             content = bilara_content_json_to_html(translated_json)
 
     elif sutta.content_html is not None and sutta.content_html != '':
@@ -241,6 +254,24 @@ def render_sutta_content(app_data: AppData, sutta: USutta, sutta_quote: Optional
     else:
         content = 'No content.'
 
+    return content
+
+def pali_segments_json(app_data: AppData, pali_sutta: USutta, db_session: Optional[Session] = None) -> Dict[str, str]:
+    """The segments of the Pali sutta for the line by line view, shared by its translations."""
+    show_variants = app_data.app_settings.get('show_all_variant_readings', False)
+    show_glosses = app_data.app_settings.get('show_glosses', False)
+
+    key = sutta_render_cache_key(pali_sutta, False, show_variants, show_glosses)
+
+    return pali_segments_cache().get_or_render(key, lambda: app_data.sutta_to_segments_json(pali_sutta, use_template=False, db_session=db_session))
+
+def render_sutta_content(app_data: AppData,
+                         sutta: USutta,
+                         sutta_quote: Optional[SuttaQuote] = None,
+                         inline_assets = False,
+                         segment_id: Optional[str] = None) -> str:
+    content = render_sutta_body(app_data, sutta)
+
     font_size = app_data.app_settings.get('sutta_font_size', 22)
     max_width = app_data.app_settings.get('sutta_max_width', 75)
 
@@ -258,12 +289,17 @@ def render_sutta_content(app_data: AppData, sutta: USutta, sutta_quote: Optional
         text = sutta_quote['quote'].replace('"', '\\"')
         # selection_range = sutta_quote['selection_range'] if sutta_quote['selection_range'] is not None else 0
         # NOTE: highlight_and_scroll_to() doesn't take selection_range argument at the moment.
+        # The segment containing the quote, if it was found in the segments index.
+        if segment_id:
+            segment = '"%s"' % segment_id.replace('"', '\\"')
+        else:
+            segment = 'null'
         js_extra += """
-        document.addEventListener("DOMContentLoaded", function(event) { highlight_and_scroll_to("%s"); });
+        document.addEventListener("DOMContentLoaded", function(event) { highlight_and_scroll_to("%s", %s); });
         const SHOW_QUOTE = "%s";
-        """ % (text, text)
+        """ % (text, segment, text)
 
-    html = html_page(content, app_data.api_url, css_extra, js_extra)
+    html = html_page(content, app_data.api_url, css_extra, js_extra, inline_assets)
 
     return html
 
@@ -286,124 +322,192 @@ def apply_escape(text: str) -> str:
 
     return text
 
-def find_linkable_sutta_urls_in_text(db_session: Session, content: str) -> List[Tuple[QUrl, str]]:
-    content = content \
-        .replace("&nbsp;", " ") \
-        .replace(u"\u00A0", " ")
-
-    linkable: List[Tuple[QUrl, str]] = []
-
-    matches = re.finditer(RE_ALL_BOOK_SUTTA_REF, content)
-    already_found = []
-    for ref in matches:
-        if ref.group(0) in already_found:
-            continue
-
-        sutta_uid = f"{ref.group(1)}{ref.group(2)}".lower()
-
-        url = QUrl(f"ssp://{QueryType.suttas.value}/{sutta_uid}")
-        text = ref.group(0)
-        linkable.append((url, text))
-
-        already_found.append(text)
-
-    matches = re.finditer(RE_ALL_PTS_VOL_SUTTA_REF, content)
-    already_found = []
-    for ref in matches:
-        if ref.group(0) in already_found:
-            continue
-        pts_ref = normalize_sutta_ref(ref.group(0), for_ebooks=True)
-
-        multi_ref = db_session \
-            .query(Am.MultiRef) \
-            .filter(Am.MultiRef.ref.like(f"%{pts_ref}%")) \
-            .first()
-
-        if multi_ref and len(multi_ref.suttas) > 0:
-
-            sutta = multi_ref.suttas[0]
-
-            url = QUrl(f"ssp://{QueryType.suttas.value}/{sutta.uid}")
-            text = ref.group(0)
-            linkable.append((url, text))
+# The book and PTS refs with one pattern. They can't both match at the same
+# position, the book refs have a number after the collection, the PTS refs a volume.
+RE_SUTTA_REF_LINK = re.compile(f"(?P<book>{RE_ALL_BOOK_SUTTA_REF.pattern})|(?P<pts>{RE_ALL_PTS_VOL_SUTTA_REF.pattern})",
+                               re.IGNORECASE)
+
+# A comment or a tag. A '<' which isn't followed by a tag name is text, and a
+# '>' in a quoted attribute value doesn't end the tag.
+RE_HTML_TAG = re.compile(r'<!--.*?-->|</?[a-zA-Z!?](?:"[^"]*"|\'[^\']*\'|[^\'">])*>', re.DOTALL)
+RE_TAG_NAME = re.compile(r'^<\s*(/?)\s*([a-zA-Z0-9]+)')
+RE_HREF_ATTR = re.compile(r'(\bhref\s*=\s*)(["\'])(.*?)\2', re.IGNORECASE | re.DOTALL)
+
+# The text in these is not linked.
+NO_LINK_TAGS = ['a', 'script', 'style']
+
+# The content of these is text up to their closing tag, it may contain '<'.
+RAW_TEXT_TAGS = ['script', 'style']
+
+def _tag_name(tag: str) -> Tuple[str, bool]:
+    """'</a>' -> ('a', True)"""
+    m = RE_TAG_NAME.match(tag)
+    if m is None:
+        return ('', False)
+    return (m.group(2).lower(), m.group(1) == '/')
+
+def html_tokens(html: str) -> List[str]:
+    """Splits html to text and tags, with the tags at the odd indexes."""
+    tokens: List[str] = []
+    text_start = 0
+    pos = 0
+
+    while True:
+        m = RE_HTML_TAG.search(html, pos)
+        if m is None:
+            break
+
+        tokens.append(html[text_start:m.start()])
+        tokens.append(m.group(0))
+        text_start = m.end()
+        pos = m.end()
+
+        name, closing = _tag_name(m.group(0))
+        if name in RAW_TEXT_TAGS and not closing and not m.group(0).endswith('/>'):
+            end = re.compile(rf'</{name}[\s/>]', re.IGNORECASE).search(html, pos)
+            pos = len(html) if end is None else end.start()
+
+    tokens.append(html[text_start:])
+
+    return tokens
+
+def sutta_ref_urls(db_session: Session, texts: List[str]) -> Dict[str, str]:
+    """The ssp:// href of the sutta refs in the texts, keyed by the ref text.
+    The PTS refs are resolved with one batched lookup, the refs which are not
+    found are not included."""
+    res: Dict[str, str] = dict()
+    pts_refs: Dict[str, str] = dict()
+
+    for text in texts:
+        for m in RE_SUTTA_REF_LINK.finditer(text):
+            ref = m.group(0)
+            if ref in res or ref in pts_refs:
+                continue
+
+            if m.group('book') is not None:
+                b = RE_ALL_BOOK_SUTTA_REF.match(ref)
+                if b is not None:
+                    res[ref] = f"ssp://{QueryType.suttas.value}/{b.group(1)}{b.group(2)}".lower()
+            else:
+                pts_refs[ref] = normalize_sutta_ref(ref, for_ebooks=True)
+
+    if len(pts_refs) > 0:
+        sutta_uids = get_sutta_uids_by_pts_refs(db_session, list(pts_refs.values()))
+        for ref, pts_ref in pts_refs.items():
+            if pts_ref in sutta_uids:
+                res[ref] = f"ssp://{QueryType.suttas.value}/{sutta_uids[pts_ref]}"
+
+    return res
+
+def _linkable_text_tokens(tokens: List[str]) -> List[int]:
+    """Indexes of the text tokens which are not in a link, script or style."""
+    res: List[int] = []
+    depth = 0
+
+    for idx, tok in enumerate(tokens):
+        if idx % 2 == 1:
+            name, closing = _tag_name(tok)
+            if name in NO_LINK_TAGS and not tok.endswith('/>'):
+                depth = max(0, depth - 1) if closing else depth + 1
+
+        elif depth == 0 and tok != '':
+            res.append(idx)
+
+    return res
+
+def _link_text(urls: Dict[str, str], text: str, do_mark_escape = True, do_apply_escape = True) -> str:
+    def _link(m: re.Match) -> str:
+        href = urls.get(m.group(0))
+        if href is None:
+            return m.group(0)
+
+        label = m.group(0)
+        if do_mark_escape:
+            label = f":ESCAPE_START:{label}:ESCAPE_END:"
+        if do_apply_escape:
+            label = apply_escape(label)
 
-            already_found.append(text)
+        return f'<a href="{href}">{label}</a>'
 
-    return linkable
+    return RE_SUTTA_REF_LINK.sub(_link, text)
 
 def add_href_sutta_links_in_text(db_session: Session,
                                  content: str,
                                  do_mark_escape = True,
                                  do_apply_escape = True) -> str:
+    """Links the sutta refs in the text of the html, except in links, in one
+    pass over the html."""
 
-    linkable = find_linkable_sutta_urls_in_text(db_session, content)
-    linked_content = content
-    already_replaced: List[str] = []
+    tokens = html_tokens(content)
+    text_idx = _linkable_text_tokens(tokens)
 
-    for i in linkable:
-        url, text = i
-        if text in already_replaced:
-            continue
+    urls = sutta_ref_urls(db_session, [tokens[i] for i in text_idx])
+    if len(urls) == 0:
+        return content
 
-        label = text
-        if do_mark_escape:
-            label = f":ESCAPE_START:{label}:ESCAPE_END:"
-        if do_apply_escape:
-            label = apply_escape(label)
-        link = f'<a href="{url.toString()}">{label}</a>'
+    for i in text_idx:
+        tokens[i] = _link_text(urls, tokens[i], do_mark_escape, do_apply_escape)
 
-        linked_content = re.sub(text, link, linked_content)
-        already_replaced.append(text)
-
-    return linked_content
+    return "".join(tokens)
 
 def add_sutta_links(db_session: Session, html_content: str) -> str:
-    from bs4 import BeautifulSoup
-    from bs4.element import Tag, ResultSet
+    """Links the sutta refs in the html, and rewrites the links to suttas as
+    ssp:// links.
+
+    - A suttacentral.net link uses the path as uid.
+    - Another link which has a sutta ref as its text links to the ref.
+    - The sutta refs in the text outside the links are linked.
+
+    The refs are resolved with one lookup, and the html is tokenized once.
+    """
 
     # Interferes with sutta ref linking if &nbsp; is used between the nikaya and section numbers.
     html_content = html_content \
         .replace("&nbsp;", " ") \
         .replace(u"\u00A0", " ")
 
-    # Find all links and rewrite to ssp:// links if possible
-    # - If the href is suttacentral, use the path as uid and rewrite as ssp://
-    # - else, if the link text is a sutta ref, parse it and replace link href to a ssp://
-    # - replace link text with escaped text block overlapping replacements later
-
-    # NOTE: html.parser mangles href url params,
-    # replacing &quot with "
-    # kālaṁ&quote_scope=nikaya becomes kālaṁ"e_scope=nikaya
-    soup = BeautifulSoup(html_content, 'lxml')
+    tokens = html_tokens(html_content)
+    text_idx = _linkable_text_tokens(tokens)
 
-    links: ResultSet[Tag] = soup.find_all(name = 'a', href = True)
-    for link in links:
-        if 'ssp://' in str(link.get('href')):
-            if link.string is not None:
-                link.string = f":ESCAPE_START:{link.string}:ESCAPE_END:"
+    # Index of the <a> tag -> its href, for the links which are not ssp://
+    link_hrefs: Dict[int, str] = dict()
+    for idx in range(1, len(tokens), 2):
+        name, closing = _tag_name(tokens[idx])
+        if name != 'a' or closing:
+            continue
 
-        elif 'suttacentral.net' in str(link.get('href')):
+        m = RE_HREF_ATTR.search(tokens[idx])
+        if m is not None and 'ssp://' not in m.group(3):
+            link_hrefs[idx] = m.group(3)
 
-            sc_url = QUrl(link.attrs['href'])
+    def _has_only_text(idx: int) -> bool:
+        # <a href="...">MN 10</a>
+        return idx + 2 < len(tokens) and _tag_name(tokens[idx + 2]) == ('a', True)
 
-            uid = re.sub(r'^/', '', sc_url.path())
+    link_texts = [tokens[idx + 1] for idx, href in link_hrefs.items()
+                  if 'suttacentral.net' not in href and _has_only_text(idx)]
 
-            ssp_href = f"ssp://{QueryType.suttas.value}/{uid}"
+    urls = sutta_ref_urls(db_session, [tokens[i] for i in text_idx] + link_texts)
 
-            link['href'] = ssp_href
+    for idx, href in link_hrefs.items():
+        if 'suttacentral.net' in href:
+            uid = re.sub(r'^/', '', QUrl(href).path())
+            new_href: Optional[str] = f"ssp://{QueryType.suttas.value}/{uid}"
 
-            if link.string is not None:
-                link.string = f":ESCAPE_START:{link.string}:ESCAPE_END:"
+        elif _has_only_text(idx):
+            # The first ref of the link text, a book ref before a PTS ref.
+            refs = [m for m in RE_SUTTA_REF_LINK.finditer(tokens[idx + 1]) if m.group(0) in urls]
+            refs.sort(key=lambda m: m.group('book') is None)
+            new_href = urls[refs[0].group(0)] if len(refs) > 0 else None
 
-        elif link.string is not None:
-            linkable = find_linkable_sutta_urls_in_text(db_session, link.string)
-            if len(linkable) > 0:
-                url, _ = linkable[0]
-                link['href'] = url.toString()
-                link.string = f":ESCAPE_START:{link.string}:ESCAPE_END:"
+        else:
+            new_href = None
 
-    linked_content = apply_escape(soup.decode_contents())
+        if new_href is not None:
+            tokens[idx] = RE_HREF_ATTR.sub(lambda m: f"{m.group(1)}{m.group(2)}{new_href}{m.group(2)}", tokens[idx], count=1)
 
-    linked_content = add_href_sutta_links_in_text(db_session, linked_content)
+    if len(urls) > 0:
+        for i in text_idx:
+            tokens[i] = _link_text(urls, tokens[i])
 
-    return linked_content
+    return "".join(tokens)
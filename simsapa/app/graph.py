@@ -1,5 +1,6 @@
 import re
-from typing import List, Tuple, TypedDict, Optional
+from contextlib import contextmanager
+from typing import Iterator, List, Tuple, TypedDict, Optional
 from pathlib import Path
 from itertools import chain
 from bokeh.document.locking import UnlockedDocumentProxy
@@ -23,7 +24,7 @@ from sqlalchemy.orm.session import Session
 from sqlalchemy import and_
 
 from simsapa import ShowLabels
-from simsapa.app.db_session import get_db_engine_connection_session
+from simsapa.app.db_session import db_read_session
 
 from .db import appdata_models as Am
 from .db import userdata_models as Um
@@ -157,7 +158,7 @@ def get_related_suttas(db_session: Session, sutta: USutta) -> List[USutta]:
         .query(Am.Sutta) \
         .filter(and_(
             Am.Sutta.uid != sutta.uid,
-            Am.Sutta.uid.like(f"{uid_ref}/%"),
+            Am.Sutta.uid_stem == uid_ref.lower(),
         )) \
         .all()
     res.extend(r)
@@ -166,7 +167,7 @@ def get_related_suttas(db_session: Session, sutta: USutta) -> List[USutta]:
         .query(Um.Sutta) \
         .filter(and_(
             Um.Sutta.uid != sutta.uid,
-            Um.Sutta.uid.like(f"{uid_ref}/%"),
+            Um.Sutta.uid_stem == uid_ref.lower(),
         )) \
         .all()
     res.extend(r)
@@ -174,84 +175,86 @@ def get_related_suttas(db_session: Session, sutta: USutta) -> List[USutta]:
     return res
 
 
-def sutta_nodes_and_edges(sutta: USutta, distance: int = 1):
-    # NOTE: Don't pass Db Session in the argument. Db Session must remain within the same thread, otherwise causes exception:
-    # Exception closing connection <sqlite3.Connection object at 0x7f7b83c6a4e0>
-    db_eng, db_conn, db_session = get_db_engine_connection_session()
+@contextmanager
+def _graph_session(db_session: Optional[Session]) -> Iterator[Session]:
+    if db_session is not None:
+        yield db_session
+    else:
+        with db_read_session() as s:
+            yield s
 
-    links = {'appdata.suttas': [], 'userdata.suttas': []}
-    sutta_ids = {'appdata.suttas': [], 'userdata.suttas': []}
 
-    related_suttas = get_related_suttas(db_session, sutta)
-    related_suttas.append(sutta)
+def sutta_nodes_and_edges(sutta: USutta, distance: int = 1, db_session: Optional[Session] = None):
+    # NOTE: Only pass the Db Session of the calling thread. Db Session must remain within the same thread, otherwise causes exception:
+    # Exception closing connection <sqlite3.Connection object at 0x7f7b83c6a4e0>
+    with _graph_session(db_session) as session:
+        links = {'appdata.suttas': [], 'userdata.suttas': []}
+        sutta_ids = {'appdata.suttas': [], 'userdata.suttas': []}
 
-    related_ids = list(map(lambda x: x.id, related_suttas))
+        related_suttas = get_related_suttas(session, sutta)
+        related_suttas.append(sutta)
 
-    for s in related_suttas:
-        for DbLink in [Am.Link, Um.Link]:
-            for table in ['appdata.suttas', 'userdata.suttas']:
+        related_ids = list(map(lambda x: x.id, related_suttas))
 
-                r = db_session \
-                    .query(DbLink.to_id) \
-                    .filter(DbLink.from_table == table) \
-                    .filter(DbLink.to_table == table) \
-                    .filter(DbLink.from_id == s.id) \
-                    .all()
+        for s in related_suttas:
+            for DbLink in [Am.Link, Um.Link]:
+                for table in ['appdata.suttas', 'userdata.suttas']:
 
-                links[table].extend(r)
+                    r = session \
+                        .query(DbLink.to_id) \
+                        .filter(DbLink.from_table == table) \
+                        .filter(DbLink.to_table == table) \
+                        .filter(DbLink.from_id == s.id) \
+                        .all()
 
-                r = db_session \
-                    .query(DbLink.from_id) \
-                    .filter(DbLink.from_table == table) \
-                    .filter(DbLink.to_table == table) \
-                    .filter(DbLink.to_id == s.id) \
-                    .all()
+                    links[table].extend(r)
 
-                links[table].extend(r)
+                    r = session \
+                        .query(DbLink.from_id) \
+                        .filter(DbLink.from_table == table) \
+                        .filter(DbLink.to_table == table) \
+                        .filter(DbLink.to_id == s.id) \
+                        .all()
 
-    for table in ['appdata.suttas', 'userdata.suttas']:
-        # results IDs, exluding the the current sutta ID (i.e. suttas connecting to it)
-        ids = filter(lambda x: x not in related_ids, map(lambda x: x[0], links[table]))
-        # set() will contain unique items
-        sutta_ids[table] = list(set(ids))
+                    links[table].extend(r)
 
-    suttas = []
+        for table in ['appdata.suttas', 'userdata.suttas']:
+            # results IDs, exluding the the current sutta ID (i.e. suttas connecting to it)
+            ids = filter(lambda x: x not in related_ids, map(lambda x: x[0], links[table]))
+            # set() will contain unique items
+            sutta_ids[table] = list(set(ids))
 
-    r = db_session \
-                .query(Am.Sutta) \
-                .filter(Am.Sutta.id.in_(sutta_ids['appdata.suttas'])) \
-                .all()
-    suttas.extend(r)
+        suttas = []
 
-    r = db_session \
-                .query(Um.Sutta) \
-                .filter(Um.Sutta.id.in_(sutta_ids['userdata.suttas'])) \
-                .all()
-    suttas.extend(r)
+        r = session \
+                    .query(Am.Sutta) \
+                    .filter(Am.Sutta.id.in_(sutta_ids['appdata.suttas'])) \
+                    .all()
+        suttas.extend(r)
 
-    nodes = list(map(sutta_to_node, suttas))
+        r = session \
+                    .query(Um.Sutta) \
+                    .filter(Um.Sutta.id.in_(sutta_ids['userdata.suttas'])) \
+                    .all()
+        suttas.extend(r)
 
-    def to_edge(x: USutta):
-        from_id = sutta_graph_id(sutta)
-        to_id = sutta_graph_id(x)
-        if to_id < from_id:
-            return (to_id, from_id)
-        else:
-            return (from_id, to_id)
+        nodes = list(map(sutta_to_node, suttas))
 
-    edges = list(map(to_edge, suttas))
+        def to_edge(x: USutta):
+            from_id = sutta_graph_id(sutta)
+            to_id = sutta_graph_id(x)
+            if to_id < from_id:
+                return (to_id, from_id)
+            else:
+                return (from_id, to_id)
 
-    # Close the session here, so that it's not the context manager in another
-    # thread that has to close it.
-    db_conn.close()
-    db_session.close()
-    db_eng.dispose()
+        edges = list(map(to_edge, suttas))
 
     # Collect links from other nodes
 
     if distance > 1:
         for i in suttas:
-            (n, e) = sutta_nodes_and_edges(sutta=i, distance=distance - 1)
+            (n, e) = sutta_nodes_and_edges(sutta=i, distance=distance - 1, db_session=db_session)
             nodes.extend(n)
             edges.extend(e)
 
@@ -261,58 +264,53 @@ def sutta_nodes_and_edges(sutta: USutta, distance: int = 1):
     return (unique_nodes(nodes), unique_edges(edges))
 
 
-def dict_word_nodes_and_edges(dict_word: UDictWord, distance: int = 1):
-    db_eng, db_conn, db_session = get_db_engine_connection_session()
+def dict_word_nodes_and_edges(dict_word: UDictWord, distance: int = 1, db_session: Optional[Session] = None):
+    with _graph_session(db_session) as session:
+        schema = dict_word.metadata.schema
 
-    schema = dict_word.metadata.schema
+        links = []
 
-    links = []
+        r = session \
+            .query(Um.Link.to_id) \
+            .filter(Um.Link.from_table == f"{schema}.dict_words") \
+            .filter(Um.Link.to_table == "appdata.suttas") \
+            .filter(Um.Link.from_id == dict_word.id) \
+            .all()
 
-    r = db_session \
-        .query(Um.Link.to_id) \
-        .filter(Um.Link.from_table == f"{schema}.dict_words") \
-        .filter(Um.Link.to_table == "appdata.suttas") \
-        .filter(Um.Link.from_id == dict_word.id) \
-        .all()
+        links.extend(r)
 
-    links.extend(r)
+        r = session \
+            .query(Um.Link.from_id) \
+            .filter(Um.Link.from_table == f"{schema}.dict_words") \
+            .filter(Um.Link.to_table == "appdata.suttas") \
+            .filter(Um.Link.to_id == dict_word.id) \
+            .all()
 
-    r = db_session \
-        .query(Um.Link.from_id) \
-        .filter(Um.Link.from_table == f"{schema}.dict_words") \
-        .filter(Um.Link.to_table == "appdata.suttas") \
-        .filter(Um.Link.to_id == dict_word.id) \
-        .all()
+        links.extend(r)
 
-    links.extend(r)
-
-    ids = map(lambda x: x[0], links)
-    # set() will contain unique items
-    sutta_ids = list(set(ids))
-
-    suttas = db_session \
-        .query(Am.Sutta) \
-        .filter(Am.Sutta.id.in_(sutta_ids)) \
-        .all()
+        ids = map(lambda x: x[0], links)
+        # set() will contain unique items
+        sutta_ids = list(set(ids))
 
-    nodes = list(map(sutta_to_node, suttas))
+        suttas = session \
+            .query(Am.Sutta) \
+            .filter(Am.Sutta.id.in_(sutta_ids)) \
+            .all()
 
-    def to_edge(x: USutta):
-        from_id = dict_word_graph_id(dict_word)
-        to_id = sutta_graph_id(x)
-        return (to_id, from_id)
+        nodes = list(map(sutta_to_node, suttas))
 
-    edges = list(map(to_edge, suttas))
+        def to_edge(x: USutta):
+            from_id = dict_word_graph_id(dict_word)
+            to_id = sutta_graph_id(x)
+            return (to_id, from_id)
 
-    db_conn.close()
-    db_session.close()
-    db_eng.dispose()
+        edges = list(map(to_edge, suttas))
 
     # Collect links from other nodes
 
     if distance > 1:
         for i in suttas:
-            (n, e) = sutta_nodes_and_edges(sutta=i, distance=distance - 1)
+            (n, e) = sutta_nodes_and_edges(sutta=i, distance=distance - 1, db_session=db_session)
             nodes.extend(n)
             edges.extend(e)
 
@@ -324,38 +322,33 @@ def dict_word_nodes_and_edges(dict_word: UDictWord, distance: int = 1):
 
 
 def document_page_nodes_and_edges(db_doc: Am.Document, page_number: int, distance: int = 1):
-    db_eng, db_conn, db_session = get_db_engine_connection_session()
-
-    links = db_session \
-        .query(Um.Link.to_id) \
-        .filter(Um.Link.from_table == "userdata.documents") \
-        .filter(Um.Link.from_page_number == page_number) \
-        .filter(Um.Link.to_table == "appdata.suttas") \
-        .filter(Um.Link.from_id == db_doc.id) \
-        .all()
-
-    ids = map(lambda x: x[0], links)
-    # set() will contain unique items
-    sutta_ids = list(set(ids))
-
-    suttas = db_session \
-        .query(Am.Sutta) \
-        .filter(Am.Sutta.id.in_(sutta_ids)) \
-        .all()
+    with db_read_session() as db_session:
+        links = db_session \
+            .query(Um.Link.to_id) \
+            .filter(Um.Link.from_table == "userdata.documents") \
+            .filter(Um.Link.from_page_number == page_number) \
+            .filter(Um.Link.to_table == "appdata.suttas") \
+            .filter(Um.Link.from_id == db_doc.id) \
+            .all()
+
+        ids = map(lambda x: x[0], links)
+        # set() will contain unique items
+        sutta_ids = list(set(ids))
 
-    nodes = list(map(sutta_to_node, suttas))
+        suttas = db_session \
+            .query(Am.Sutta) \
+            .filter(Am.Sutta.id.in_(sutta_ids)) \
+            .all()
 
-    def to_edge(x: USutta):
-        d = DocumentPage(doc=db_doc, page_number=page_number)
-        from_id = document_graph_id(d)
-        to_id = sutta_graph_id(x)
-        return (to_id, from_id)
+        nodes = list(map(sutta_to_node, suttas))
 
-    edges = list(map(to_edge, suttas))
+        def to_edge(x: USutta):
+            d = DocumentPage(doc=db_doc, page_number=page_number)
+            from_id = document_graph_id(d)
+            to_id = sutta_graph_id(x)
+            return (to_id, from_id)
 
-    db_conn.close()
-    db_session.close()
-    db_eng.dispose()
+        edges = list(map(to_edge, suttas))
 
     # Collect links from other nodes
 
@@ -492,21 +485,16 @@ def _documents_and_pages_from_links(db_session: Session, links: List[Um.Link]) -
 
 
 def all_nodes_and_edges():
-    db_eng, db_conn, db_session = get_db_engine_connection_session()
-
-    links = []
-    r = db_session.query(Am.Link).all()
-    links.extend(r)
-    r = db_session.query(Um.Link).all()
-    links.extend(r)
-
-    suttas = _suttas_from_links(db_session, links)
-    words = _dict_words_from_links(db_session, links)
-    documents_and_pages = _documents_and_pages_from_links(db_session, links)
-
-    db_conn.close()
-    db_session.close()
-    db_eng.dispose()
+    with db_read_session() as db_session:
+        links = []
+        r = db_session.query(Am.Link).all()
+        links.extend(r)
+        r = db_session.query(Um.Link).all()
+        links.extend(r)
+
+        suttas = _suttas_from_links(db_session, links)
+        words = _dict_words_from_links(db_session, links)
+        documents_and_pages = _documents_and_pages_from_links(db_session, links)
 
     nodes = []
     nodes.extend(list(map(sutta_to_node, suttas)))
@@ -1,6 +1,6 @@
 from pathlib import Path
-from typing import Dict, Optional, TypedDict
-import re, socket
+from typing import Dict, List, Optional, Tuple, TypedDict
+import re, socket, zlib
 import html, json
 from datetime import datetime
 
@@ -14,6 +14,17 @@ class SuttaRange(TypedDict):
     start: Optional[int] # 7
     end: Optional[int] # 16
 
+class RefPages(TypedDict):
+    # sn ii 44 - ii 47
+    collection: str # sn
+    volume: int # 2
+    page_start: int # 44
+    page_end: int # 47
+
+# sn ii 45 / an i 77.1 - i 80.1 / i 80 (collection given earlier in the list)
+RE_REF_PAGES = re.compile(r'^(?:(?P<collection>[a-z]+(?: [a-z]+)*?) +)?(?P<vol>[ivxl]+)[ \.]+(?P<page>\d+)[\d\.]*' + \
+                          r'(?: *- *(?:(?P<vol_end>[ivxl]+)[ \.]+)?(?P<page_end>\d+)[\d\.]*)?$')
+
 def download_file(url: str, folder_path: Path) -> Path:
     import requests
 
@@ -159,6 +170,56 @@ def normalize_sutta_ref(ref: str, for_ebooks = False) -> str:
     return ref.strip()
 
 
+def ref_to_pages(ref: str) -> List[RefPages]:
+    """
+    Volume and page ranges in a normalized PTS ref, such as MultiRef.ref.
+
+    sn ii 45 -> sn, 2, 45, 45
+    an i 77.1 - i 80.1 -> an, 1, 77, 80
+    dn iii 123, dn iii 124 -> dn, 3, 123, 123 and dn, 3, 124, 124
+    """
+    import roman
+
+    res: List[RefPages] = []
+    collection: Optional[str] = None
+
+    for part in ref.lower().split(","):
+        part = re.sub(r'  +', ' ', part.strip())
+
+        m = RE_REF_PAGES.match(part)
+        if m is None:
+            continue
+
+        if m.group('collection') is not None:
+            collection = m.group('collection')
+
+        if collection is None:
+            continue
+
+        try:
+            volume = roman.fromRoman(m.group('vol').upper())
+        except roman.InvalidRomanNumeralError:
+            continue
+
+        page_start = int(m.group('page'))
+        page_end = page_start
+
+        # Page range within the same volume.
+        if m.group('page_end') is not None:
+            vol_end = m.group('vol_end')
+            if vol_end is None or vol_end == m.group('vol'):
+                page_end = max(page_start, int(m.group('page_end')))
+
+        res.append(RefPages(
+            collection = collection,
+            volume = volume,
+            page_start = page_start,
+            page_end = page_end,
+        ))
+
+    return res
+
+
 def normalize_sutta_uid(uid: str) -> str:
     uid = normalize_sutta_ref(uid).replace(' ', '')
     return uid
@@ -394,93 +455,127 @@ def bilara_html_post_process(body: str) -> str:
 
     return html
 
-def bilara_text_to_segments(
+# (segment id, text, template, variant, comment, gloss)
+# The variant, comment and gloss are stripped, None when the segment has none.
+BilaraSegment = Tuple[str, str, Optional[str], Optional[str], Optional[str], Optional[str]]
+
+def bilara_segment_rows(
         content: str,
-        tmpl: Optional[str],
+        tmpl: Optional[str] = None,
         variant: Optional[str] = None,
         comment: Optional[str] = None,
-        gloss: Optional[str] = None,
+        gloss: Optional[str] = None) -> List[BilaraSegment]:
+    """Merges the JSON of the content and its template, variants, comments and
+    glosses by segment id, in the order of the content."""
+
+    content_json: Dict[str, str] = json.loads(content)
+
+    def _parse(x: Optional[str]) -> Dict[str, str]:
+        if x:
+            return json.loads(x)
+        else:
+            return dict()
+
+    tmpl_json = _parse(tmpl)
+    variant_json = _parse(variant)
+    comment_json = _parse(comment)
+    gloss_json = _parse(gloss)
+
+    def _stripped(d: Dict[str, str], i: str) -> Optional[str]:
+        if i in d:
+            return d[i].strip()
+        else:
+            return None
+
+    return [(i,
+             text,
+             tmpl_json.get(i),
+             _stripped(variant_json, i),
+             _stripped(comment_json, i),
+             _stripped(gloss_json, i)) for i, text in content_json.items()]
+
+def bilara_segments_pack(rows: List[BilaraSegment]) -> bytes:
+    return zlib.compress(json.dumps(rows, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+def bilara_segments_unpack(data: bytes) -> List[BilaraSegment]:
+    return [tuple(i) for i in json.loads(zlib.decompress(data))] # type: ignore
+
+def bilara_segments_data(content: Optional[str], tmpl: Optional[str] = None) -> Optional[bytes]:
+    """The sutta_segments data of a sutta being added, which has no variants,
+    comments or glosses yet. None if it has no bilara JSON."""
+    if content is None or content == '':
+        return None
+
+    try:
+        return bilara_segments_pack(bilara_segment_rows(content, tmpl))
+    except Exception as e:
+        logger.error(f"bilara_segments_data(): {e}")
+        return None
+
+def bilara_segments_to_json(
+        rows: List[BilaraSegment],
+        use_template: bool = True,
         show_variant_readings: bool = False,
         show_glosses: bool = False) -> Dict[str, str]:
 
-    content_json = json.loads(content)
-    if tmpl:
-        tmpl_json = json.loads(tmpl)
-    else:
-        tmpl_json = None
-
-    if variant:
-        variant_json = json.loads(variant)
-    else:
-        variant_json = None
+    content_json: Dict[str, str] = dict()
 
-    if comment:
-        comment_json = json.loads(comment)
-    else:
-        comment_json = None
+    for (i, text, tmpl, variant, comment, gloss) in rows:
+        content_json[i] = text
 
-    if gloss:
-        gloss_json = json.loads(gloss)
-    else:
-        gloss_json = None
+        # NOTE: An empty variant, comment or gloss skips the rest of the
+        # segment, including the template.
 
-    for i in content_json.keys():
-        if variant_json:
-            if i in variant_json.keys():
-                txt = variant_json[i].strip()
-                if len(txt) == 0:
-                    continue
+        if variant is not None:
+            if len(variant) == 0:
+                continue
 
-                classes = ['variant',]
+            classes = ['variant',]
 
-                if not show_variant_readings:
-                    classes.append('hide')
+            if not show_variant_readings:
+                classes.append('hide')
 
-                s = """
+            s = """
                 <span class='variant-wrap'>
                   <span class='mark'>⧫</span>
                   <span class='%s'>(%s)</span>
                 </span>
-                """ % (' '.join(classes), txt)
+                """ % (' '.join(classes), variant)
 
-                content_json[i] += s
+            content_json[i] += s
 
-        if comment_json:
-            if i in comment_json.keys():
-                txt = comment_json[i].strip()
-                if len(txt) == 0:
-                    continue
+        if comment is not None:
+            if len(comment) == 0:
+                continue
 
-                s = """
+            s = """
                 <span class='comment-wrap'>
                   <span class='mark'>✱</span>
                   <span class='comment hide'>(%s)</span>
                 </span>
-                """ % txt
+                """ % comment
 
-                content_json[i] += s
+            content_json[i] += s
 
-        if gloss_json:
-            if i in gloss_json.keys():
-                txt = gloss_json[i].strip()
-                if len(txt) == 0:
-                    continue
+        if gloss is not None:
+            if len(gloss) == 0:
+                continue
 
-                classes = ['gloss',]
+            classes = ['gloss',]
 
-                if not show_glosses:
-                    classes.append('hide')
+            if not show_glosses:
+                classes.append('hide')
 
-                s = """
+            s = """
                 <span class='gloss-wrap' onclick="toggle_gloss('#gloss_%s')">
                   <span class='mark'>
                     <svg class="ssp-icon-button__icon"><use xlink:href="#icon-table"></use></svg>
                   </span>
                 </span>
                 <div class='%s'>%s</div>
-                """ % (i, ' '.join(classes), txt)
+                """ % (i, ' '.join(classes), gloss)
 
-                content_json[i] += s
+            content_json[i] += s
 
         """
         Template JSON example:
@@ -495,12 +590,25 @@ def bilara_text_to_segments(
 }
         """
 
-        if tmpl_json and i in tmpl_json.keys():
+        if use_template and tmpl is not None:
             content = f"<span data-tmpl-key='{i}'>{content_json[i]}</span>"
-            content_json[i] = tmpl_json[i].replace('{}', content)
+            content_json[i] = tmpl.replace('{}', content)
 
     return content_json
 
+def bilara_text_to_segments(
+        content: str,
+        tmpl: Optional[str],
+        variant: Optional[str] = None,
+        comment: Optional[str] = None,
+        gloss: Optional[str] = None,
+        show_variant_readings: bool = False,
+        show_glosses: bool = False) -> Dict[str, str]:
+
+    rows = bilara_segment_rows(content, tmpl, variant, comment, gloss)
+
+    return bilara_segments_to_json(rows, True, show_variant_readings, show_glosses)
+
 def bilara_content_json_to_html(content_json: Dict[str, str]) -> str:
     page = "\n\n".join(content_json.values())
 
@@ -525,11 +633,11 @@ def bilara_line_by_line_html(translated_json: Dict[str, str],
             pali_segment = ""
 
         content_json[i] = """
-        <span class='segment'>
+        <span class='segment' data-tmpl-key='%s'>
           <span class='translated'>%s</span>
           <span class='pali'>%s</span>
         </span>
-        """ % (translated_segment, pali_segment)
+        """ % (i, translated_segment, pali_segment)
 
         if tmpl_json and i in tmpl_json.keys():
             content_json[i] = tmpl_json[i].replace('{}', content_json[i])
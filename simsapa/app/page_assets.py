@@ -0,0 +1,43 @@
+"""The stylesheets and scripts of the html pages.
+
+The pages link to these on the API server with a versioned URL, instead of
+including them in the html of every setHtml(). The version is a checksum of
+the content, so the web engine can keep the responses until a new version is
+released, and only the per-page settings (font size, SHOW_BOOKMARKS, etc.)
+are included in the page.
+"""
+
+from typing import Dict, Optional
+import hashlib
+
+from simsapa import DICTIONARY_CSS, SUTTAS_CSS, SUTTAS_JS
+
+class PageAsset:
+    def __init__(self, name: str, mimetype: str, content: str):
+        self.name = name
+        self.mimetype = mimetype
+        # The font URLs in the stylesheets are written with localhost:8000, on
+        # the API server they are relative to the stylesheet's URL.
+        self.body = content.replace("http://localhost:8000", "").encode("utf-8")
+        self.version = hashlib.sha1(self.body).hexdigest()[0:12]
+
+    def url(self, api_url: str) -> str:
+        return f"{api_url}/page_assets/{self.name}?v={self.version}"
+
+    def link_html(self, api_url: str) -> str:
+        if self.mimetype == "text/css":
+            return f'<link rel="stylesheet" href="{self.url(api_url)}">'
+        else:
+            return f'<script src="{self.url(api_url)}"></script>'
+
+PAGE_ASSETS: Dict[str, PageAsset] = dict([(i.name, i) for i in [
+    PageAsset("suttas.css", "text/css", SUTTAS_CSS),
+    PageAsset("dictionary.css", "text/css", DICTIONARY_CSS),
+    PageAsset("suttas.js", "text/javascript", SUTTAS_JS),
+]])
+
+def page_asset_link(api_url: Optional[str], name: str) -> str:
+    """The <link> or <script> tag of the asset, or an empty string without an API server."""
+    if api_url is None:
+        return ""
+    return PAGE_ASSETS[name].link_html(api_url)
@@ -0,0 +1,133 @@
+"""EXPLAIN QUERY PLAN for a catalogue of the queries the app runs, to find the
+ones which scan a whole table instead of using an index."""
+
+from typing import List, Tuple, TypedDict
+
+from sqlalchemy import select, or_, and_
+from sqlalchemy.sql import text
+from sqlalchemy.sql.expression import Select
+from sqlalchemy.orm.session import Session
+
+from simsapa.app.db import appdata_models as Am
+from simsapa.app.db import userdata_models as Um
+from simsapa.app.db import dpd_models as Dpd
+from simsapa.app.db.uid_helpers import starts_with
+
+class QueryPlanReport(TypedDict):
+    name: str
+    sql: str
+    plan: List[str]
+    full_scans: List[str]
+
+def query_catalogue() -> List[Tuple[str, Select]]:
+    """The app's hot queries with sample parameters. Keep these in sync with
+    the queries in graph.py, memos_sidebar.py, search/helpers.py, etc."""
+
+    q: List[Tuple[str, Select]] = []
+
+    for (schema, m) in [('appdata', Am), ('userdata', Um)]:
+        q.extend([
+            (f"{schema} links from sutta (graph)",
+             select(m.Link.to_id).where(and_(m.Link.from_table == 'appdata.suttas',
+                                             m.Link.to_table == 'appdata.suttas',
+                                             m.Link.from_id == 1))),
+
+            (f"{schema} links to sutta (graph)",
+             select(m.Link.from_id).where(and_(m.Link.from_table == 'appdata.suttas',
+                                               m.Link.to_table == 'appdata.suttas',
+                                               m.Link.to_id == 1))),
+
+            (f"{schema} memo associations of sutta (sidebar)",
+             select(m.MemoAssociation).where(and_(m.MemoAssociation.associated_table == 'appdata.suttas',
+                                                  m.MemoAssociation.associated_id == 1))),
+
+            (f"{schema} bookmarks of sutta",
+             select(m.Bookmark).where(m.Bookmark.sutta_uid == 'sn56.11/pli/ms')),
+
+            (f"{schema} dict_words by word",
+             select(m.DictWord).where(m.DictWord.word == 'dhamma')),
+
+            (f"{schema} dict_words by uid prefix (word links)",
+             select(m.DictWord).where(starts_with(m.DictWord.uid, 'dhamma/'))),
+
+            (f"{schema} sutta by uid",
+             select(m.Sutta).where(m.Sutta.uid == 'sn56.11/pli/ms')),
+
+            (f"{schema} suttas by uid stem (partial uid, related suttas)",
+             select(m.Sutta).where(m.Sutta.uid_stem == 'sn56.11')),
+
+            (f"{schema} suttas by nikaya (partial uid)",
+             select(m.Sutta).where(starts_with(m.Sutta.uid_stem, 'sn'))),
+
+            (f"{schema} Pali sutta for translation",
+             select(m.Sutta).where(and_(m.Sutta.uid != 'sn56.11/en/sujato',
+                                        m.Sutta.language == 'pli',
+                                        m.Sutta.uid_stem == 'sn56.11'))),
+
+            (f"{schema} suttas by source (search filter)",
+             select(m.Sutta).where(m.Sutta.source_uid == 'ms')),
+
+            (f"{schema} dict_words by source (search filter)",
+             select(m.DictWord).where(m.DictWord.source_uid == 'pts')),
+        ])
+
+    q.extend([
+        ("appdata multi_ref_pages by page",
+         select(Am.MultiRefPage.multi_ref_id).where(and_(Am.MultiRefPage.collection == 'sn',
+                                                        Am.MultiRefPage.volume == 5,
+                                                        Am.MultiRefPage.page_start <= 420,
+                                                        Am.MultiRefPage.page_end >= 420))),
+
+        ("dpd headwords by lemma_clean or word_ascii (dpd_lookup)",
+         select(Dpd.DpdHeadwords).where(or_(Dpd.DpdHeadwords.lemma_clean == 'dhamma',
+                                            Dpd.DpdHeadwords.word_ascii == 'dhamma'))),
+
+        ("dpd headwords by stem (dpd_lookup)",
+         select(Dpd.DpdHeadwords).where(Dpd.DpdHeadwords.stem == 'dhamm')),
+
+        ("dpd roots by root_clean, root_no_sign or word_ascii (dpd_lookup)",
+         select(Dpd.DpdRoots).where(or_(Dpd.DpdRoots.root_clean == '√gam',
+                                        Dpd.DpdRoots.root_no_sign == 'gam',
+                                        Dpd.DpdRoots.word_ascii == 'gam'))),
+
+        ("dpd lookup by key (inflection_to_pali_words)",
+         select(Dpd.Lookup).where(Dpd.Lookup.lookup_key == 'dhammassa')),
+
+        ("dpd lookup by key prefix (dpd_deconstructor_query)",
+         select(Dpd.Lookup).where(Dpd.Lookup.lookup_key.like('dhammas%'))),
+    ])
+
+    return q
+
+def explain_query_plan(db_session: Session, stmt: Select) -> Tuple[str, List[str]]:
+    """Returns the SQL and the plan details of the statement."""
+    bind = db_session.get_bind()
+    sql = str(stmt.compile(dialect=bind.dialect, compile_kwargs={"literal_binds": True}))
+
+    # Rows are (id, parent, notused, detail).
+    rows = db_session.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+
+    return (sql, [str(r[3]) for r in rows])
+
+def is_full_scan(detail: str) -> bool:
+    """A SCAN step reads every row of the table or index.
+
+    E.g. 'SCAN dict_words', as opposed to
+    'SEARCH dict_words USING INDEX ix_dict_words_word (word=?)'.
+    """
+    return detail.startswith("SCAN ")
+
+def audit_query_plans(db_session: Session) -> List[QueryPlanReport]:
+    reports: List[QueryPlanReport] = []
+
+    for (name, stmt) in query_catalogue():
+        sql, plan = explain_query_plan(db_session, stmt)
+
+        reports.append(QueryPlanReport(
+            name = name,
+            sql = sql,
+            plan = plan,
+            full_scans = [i for i in plan if is_full_scan(i)],
+        ))
+
+    return reports
@@ -0,0 +1,111 @@
+"""Two tier cache of rendered html.
+
+An in-memory LRU in front of an optional sqlite3 file with the zlib
+compressed entries, which is kept between sessions. The values are anything
+which can be stored as JSON.
+
+The entries are stored with a version string (e.g. the app and database
+versions), and the entries of other versions are removed when the store is
+opened.
+"""
+
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, List, Optional, Tuple
+import json, sqlite3, threading, zlib
+
+class RenderCache:
+    def __init__(self, version: str, db_path: Optional[Path], size: int):
+        """Without a db_path, the entries are only kept in memory."""
+        self.version = version
+        self._size = size
+        self._memory: OrderedDict[str, Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+        if db_path is None:
+            self._con = None
+            return
+
+        self._con = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._con.execute("PRAGMA journal_mode=WAL;")
+        self._con.execute("""
+            CREATE TABLE IF NOT EXISTS rendered (
+                version TEXT NOT NULL,
+                key TEXT NOT NULL,
+                data BLOB NOT NULL,
+                PRIMARY KEY (version, key)
+            );""")
+        self._con.execute("DELETE FROM rendered WHERE version != ?;", (self.version,))
+        self._con.commit()
+
+    def _remember(self, key: str, res: Any):
+        self._memory[key] = res
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._size:
+            self._memory.popitem(last = False)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            res = self._memory.get(key)
+            if res is not None:
+                self._memory.move_to_end(key)
+                return res
+
+            if self._con is None:
+                return None
+
+            row = self._con.execute("SELECT data FROM rendered WHERE version = ? AND key = ?;",
+                                    (self.version, key)).fetchone()
+            if row is None:
+                return None
+
+            res = json.loads(zlib.decompress(row[0]))
+            self._remember(key, res)
+
+            return res
+
+    def put(self, key: str, res: Any):
+        self.put_many([(key, res)], keep_in_memory = True)
+
+    def put_many(self, items: List[Tuple[str, Any]], keep_in_memory = False):
+        """Writes the entries to the store in one transaction."""
+        with self._lock:
+            if self._con is not None:
+                rows = [(self.version, key, zlib.compress(json.dumps(res, ensure_ascii=False).encode('utf-8')))
+                        for key, res in items]
+
+                self._con.executemany("INSERT OR REPLACE INTO rendered (version, key, data) VALUES (?, ?, ?);", rows)
+                self._con.commit()
+
+            if keep_in_memory or self._con is None:
+                for key, res in items:
+                    self._remember(key, res)
+
+    def has(self, key: str) -> bool:
+        with self._lock:
+            if key in self._memory:
+                return True
+
+            if self._con is None:
+                return False
+
+            row = self._con.execute("SELECT 1 FROM rendered WHERE version = ? AND key = ?;",
+                                    (self.version, key)).fetchone()
+            return row is not None
+
+    def get_or_render(self, key: str, render_fn: Callable[[], Any]) -> Any:
+        res = self.get(key)
+        if res is None:
+            res = render_fn()
+            self.put(key, res)
+
+        return res
+
+    def clear(self):
+        """Removes all entries, e.g. when the rendered data has changed."""
+        with self._lock:
+            self._memory.clear()
+
+            if self._con is not None:
+                self._con.execute("DELETE FROM rendered;")
+                self._con.commit()
@@ -0,0 +1,213 @@
+"""Search queries for the API server, without Qt.
+
+GuiSearchQueries keeps the query workers of the last search, and the results
+pages are read from those. Here each request runs its own query tasks, so
+concurrent requests don't share state, and a page_num > 0 request doesn't
+depend on which search ran before it.
+
+A search cursor keeps the finished tasks of a search for a while, so that its
+pages (of any length) can be read without running the query again.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Iterator, List, Optional, Set, Tuple
+import secrets, threading, time
+
+from simsapa import API_SERVER_WORKERS, SEARCH_CURSOR_TTL, SEARCH_CURSORS_MAX, ApiSearchResult, SearchResult, logger
+from simsapa.app.search.helpers import deconstructor_variations, unique_search_results
+from simsapa.app.search.query_task import SearchQueryTask, new_search_tasks
+from simsapa.app.search.results_merge import ResultsMerge, ResultsStream, result_score
+from simsapa.app.search.tantivy_index import TantivySearchIndexes
+from simsapa.app.types import DpdFilters, SearchArea, SearchParams
+
+def _result_key(x: SearchResult) -> str:
+    return f"{x['title']} {x['schema_name']} {x['uid']}"
+
+class SearchCursor:
+    """
+    The finished query tasks of a search, kept on the server so that the
+    following pages are read from the same results merge, instead of running
+    the query again for each page.
+
+    The results are the pinned results, followed by the score ranked results
+    of all tasks which are not already pinned.
+    """
+
+    def __init__(self, tasks: List[SearchQueryTask], hits: Optional[int], deconstructor: List[str]):
+        self.hits = hits
+        self.deconstructor = deconstructor
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+        pinned: List[SearchResult] = []
+        for i in tasks:
+            pinned.extend(i.pinned_results())
+
+        self._results = unique_search_results(sorted(pinned, key=result_score, reverse = True))
+        self._keys: Set[str] = set([_result_key(i) for i in self._results])
+
+        self._merge = ResultsMerge([ResultsStream(i.ranked_results_page) for i in tasks])
+        self._merge_pos = 0
+        self.exhausted = False
+
+    def _fill_to(self, n: int, batch_len = 50):
+        while len(self._results) < n and not self.exhausted:
+            batch = self._merge.results(self._merge_pos, self._merge_pos + batch_len)
+            if len(batch) == 0:
+                self.exhausted = True
+                break
+
+            self._merge_pos += len(batch)
+
+            for i in batch:
+                k = _result_key(i)
+                if k not in self._keys:
+                    self._keys.add(k)
+                    self._results.append(i)
+
+    def results(self, offset: int, limit: int) -> List[SearchResult]:
+        with self.lock:
+            self.last_used = time.monotonic()
+            self._fill_to(offset + limit)
+            return self._results[offset:offset + limit]
+
+    def iter_results(self, batch_len = 100) -> Iterator[SearchResult]:
+        offset = 0
+        while True:
+            res = self.results(offset, batch_len)
+            if len(res) == 0:
+                return
+
+            yield from res
+            offset += len(res)
+
+class SearchCursors:
+    """The search cursors by id, removed after SEARCH_CURSOR_TTL seconds without use."""
+
+    def __init__(self, ttl = SEARCH_CURSOR_TTL, max_cursors = SEARCH_CURSORS_MAX):
+        self._ttl = ttl
+        self._max_cursors = max_cursors
+        self._cursors: OrderedDict[str, SearchCursor] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expire(self):
+        now = time.monotonic()
+        for k in [k for k, v in self._cursors.items() if now - v.last_used > self._ttl]:
+            del self._cursors[k]
+
+        while len(self._cursors) > self._max_cursors:
+            self._cursors.popitem(last = False)
+
+    def add(self, cursor: SearchCursor) -> str:
+        cursor_id = secrets.token_urlsafe(16)
+        with self._lock:
+            self._cursors[cursor_id] = cursor
+            self._expire()
+
+        return cursor_id
+
+    def get(self, cursor_id: str) -> Optional[SearchCursor]:
+        with self._lock:
+            self._expire()
+            cursor = self._cursors.get(cursor_id)
+            if cursor is not None:
+                self._cursors.move_to_end(cursor_id)
+
+            return cursor
+
+class ApiSearchQueries:
+    def __init__(self, search_indexes: TantivySearchIndexes, workers: int = API_SERVER_WORKERS):
+        self.search_indexes = search_indexes
+        # Runs the language index tasks of a query in parallel.
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='search_task')
+        self.cursors = SearchCursors()
+
+    def _run_tasks(self,
+                   query_text: str,
+                   area: SearchArea,
+                   params: SearchParams,
+                   dpd_filters: Optional[DpdFilters] = None) -> List[SearchQueryTask]:
+        tasks = new_search_tasks(self.search_indexes,
+                                 query_text,
+                                 datetime.now(),
+                                 params,
+                                 area,
+                                 dpd_filters)
+
+        # Raises the exception of a task, if there was one.
+        list(self.executor.map(lambda t: t.run(), tasks))
+
+        return tasks
+
+    def _query_hits(self, tasks: List[SearchQueryTask]) -> Optional[int]:
+        if len(tasks) == 0:
+            return 0
+
+        t = tasks[0]
+        if t.enable_regex or t.fuzzy_distance > 0:
+            return None
+
+        return sum(filter(None, [i.query_hits() for i in tasks]))
+
+    def _results_page(self, tasks: List[SearchQueryTask], page_num: int, page_len: int) -> List[SearchResult]:
+        streams = [ResultsStream(i.ranked_results_page) for i in tasks]
+        res = ResultsMerge(streams, page_len).page(page_num)
+
+        if page_num == 0:
+            pinned: List[SearchResult] = []
+            for i in tasks:
+                pinned.extend(i.pinned_results())
+
+            pinned = sorted(pinned, key=result_score, reverse = True)
+            res = pinned + res
+
+        return unique_search_results(res)
+
+    def search(self,
+               query_text: str,
+               area: SearchArea,
+               params: SearchParams,
+               page_num = 0) -> ApiSearchResult:
+        logger.info(f"ApiSearchQueries::search(): {area} {query_text} page_num = {page_num}")
+
+        page_len = params['page_len'] if params['page_len'] is not None else 20
+
+        tasks = self._run_tasks(query_text, area, params)
+
+        if area == SearchArea.DictWords:
+            deconstructor = deconstructor_variations(query_text)
+        else:
+            deconstructor = []
+
+        return ApiSearchResult(
+            hits = self._query_hits(tasks),
+            results = self._results_page(tasks, page_num, page_len),
+            deconstructor = deconstructor,
+        )
+
+    def suttas_fulltext_search(self, query_text: str, params: SearchParams, page_num = 0) -> ApiSearchResult:
+        return self.search(query_text, SearchArea.Suttas, params, page_num)
+
+    def dict_combined_search(self, query_text: str, params: SearchParams, page_num = 0) -> ApiSearchResult:
+        return self.search(query_text, SearchArea.DictWords, params, page_num)
+
+    def start_cursor(self,
+                     query_text: str,
+                     area: SearchArea,
+                     params: SearchParams,
+                     dpd_filters: Optional[DpdFilters] = None) -> Tuple[str, SearchCursor]:
+        """Run the query once, and keep its results for reading with the returned cursor id."""
+        logger.info(f"ApiSearchQueries::start_cursor(): {area} {query_text}")
+
+        tasks = self._run_tasks(query_text, area, params, dpd_filters)
+
+        if area == SearchArea.DictWords:
+            deconstructor = deconstructor_variations(query_text)
+        else:
+            deconstructor = []
+
+        cursor = SearchCursor(tasks, self._query_hits(tasks), deconstructor)
+
+        return (self.cursors.add(cursor), cursor)
@@ -6,17 +6,20 @@ from PyQt6.QtCore import QObject, QRunnable, pyqtSignal, pyqtSlot
 from sqlalchemy import or_
 from sqlalchemy.orm.session import Session
 
-from simsapa import SIMSAPA_PACKAGE_DIR, ICONS_HTML, DbSchemaName, SearchResult, DetailsTab, logger, QueryType
+from simsapa import DICTIONARY_CSS, ICONS_HTML, DbSchemaName, SearchResult, DetailsTab, logger, QueryType
 from simsapa.app.helpers import is_complete_word_uid
-from simsapa.app.db_session import get_db_engine_connection_session
+from simsapa.app.db_session import db_read_session
 from simsapa.app.dict_link_helpers import add_word_links_to_bold
+from simsapa.app.page_assets import page_asset_link
 from simsapa.app.types import SearchParams, UDictWord, DictionaryQueriesInterface
 from simsapa.app.db import appdata_models as Am
 from simsapa.app.db import userdata_models as Um
 from simsapa.app.db import dpd_models as Dpd
+from simsapa.app.db.uid_helpers import starts_with
 from simsapa.layouts.html_content import page_tmpl
 
-from simsapa.app.dpd_render import DPD_PALI_WORD_TEMPLATES, pali_root_dpd_html, pali_word_dpd_html
+from simsapa.app.dpd_render import DPD_PALI_WORD_TEMPLATES, pali_root_dpd_html, pali_word_dpd_html, pali_words_dpd_html
+from simsapa.dpd_db.tools.utils import RenderResult
 
 class ResultHtml(TypedDict):
     body: str
@@ -66,25 +69,25 @@ class DictionaryQueries(DictionaryQueriesInterface):
 
             res = self.db_session \
                 .query(Am.DictWord) \
-                .filter(Am.DictWord.uid.like(f"{uid}/%")) \
+                .filter(starts_with(Am.DictWord.uid, f"{uid}/")) \
                 .all()
             results.extend(res)
 
             res = self.db_session \
                 .query(Um.DictWord) \
-                .filter(Um.DictWord.uid.like(f"{uid}/%")) \
+                .filter(starts_with(Um.DictWord.uid, f"{uid}/")) \
                 .all()
             results.extend(res)
 
             res = self.db_session \
                 .query(Dpd.DpdHeadwords) \
-                .filter(Dpd.DpdHeadwords.uid.like(f"{uid}/%")) \
+                .filter(starts_with(Dpd.DpdHeadwords.uid, f"{uid}/")) \
                 .all()
             results.extend(res)
 
             res = self.db_session \
                 .query(Dpd.DpdRoots) \
-                .filter(Dpd.DpdRoots.uid.like(f"{uid}/%")) \
+                .filter(starts_with(Dpd.DpdRoots.uid, f"{uid}/")) \
                 .all()
             results.extend(res)
 
@@ -153,9 +156,7 @@ class DictionaryQueries(DictionaryQueriesInterface):
         else:
             open_details = []
 
-        for w in words:
-            word_html = self.get_word_html(w, open_details)
-
+        for w, word_html in zip(words, self.get_words_html(words, open_details)):
             if w.source_uid == "cpd":
                 word_html['body'] = add_word_links_to_bold(word_html['body'])
 
@@ -198,24 +199,25 @@ class DictionaryQueries(DictionaryQueriesInterface):
                           css_extra: Optional[str] = None,
                           js_head: str = '',
                           js_body: str = '') -> str:
-        try:
-            with open(SIMSAPA_PACKAGE_DIR.joinpath('assets/css/dictionary.css'), 'r') as f: # type: ignore
-                css = f.read()
-                if self.api_url is not None:
-                    css = css.replace("http://localhost:8000", self.api_url)
-        except Exception as e:
-            logger.error(f"Can't read dictionary.css: {e}")
-            css = ""
-
         css_head = re.sub(r'font-family[^;]+;', '', css_head)
-        css_head += css
+
+        if self.api_url is not None:
+            # The linked dictionary.css has to come after the css of the
+            # definitions, as it did when it was included in the style.
+            css_links = f"<style>{css_head}</style>" + page_asset_link(self.api_url, "dictionary.css")
+            css_head = ""
+        else:
+            css_links = ""
+            css_head += DICTIONARY_CSS
 
         if css_extra is not None:
             css_head += css_extra
 
         html = str(page_tmpl.substitute(content=body,
+                                        css_links=css_links,
                                         css_head=css_head,
                                         js_head=js_head,
+                                        js_links='',
                                         js_body=js_body,
                                         icons_html=ICONS_HTML,
                                         api_url=self.api_url))
@@ -241,13 +243,37 @@ class DictionaryQueries(DictionaryQueriesInterface):
 
         return html
 
-    def get_word_html(self, word: UDictWord, open_details: List[DetailsTab] = []) -> ResultHtml:
+    def get_words_html(self, words: List[UDictWord], open_details: List[DetailsTab] = []) -> List[ResultHtml]:
+        """Same as get_word_html() for each word, but the DPD headwords are rendered together."""
+        headwords = [w for w in words if isinstance(w, Dpd.DpdHeadwords)]
+        if len(headwords) > 0:
+            rendered = pali_words_dpd_html(headwords, open_details)
+        else:
+            rendered = dict()
+
+        res: List[ResultHtml] = []
+        for w in words:
+            if isinstance(w, Dpd.DpdHeadwords):
+                res.append(self.get_word_html(w, open_details, rendered.get(w.id)))
+            else:
+                res.append(self.get_word_html(w, open_details))
+
+        return res
+
+    def get_word_html(self,
+                      word: UDictWord,
+                      open_details: List[DetailsTab] = [],
+                      dpd_rendered: Optional[RenderResult] = None) -> ResultHtml:
+        """dpd_rendered: the DPD headword entry, if it was already rendered."""
         from bs4 import BeautifulSoup
 
         if word.metadata.schema == DbSchemaName.Dpd:
 
             if isinstance(word, Dpd.DpdHeadwords):
-                res = pali_word_dpd_html(word, open_details)
+                if dpd_rendered is not None:
+                    res = dpd_rendered
+                else:
+                    res = pali_word_dpd_html(word, open_details)
             elif isinstance(word, Dpd.DpdRoots):
                 res = pali_root_dpd_html(word, open_details)
             else:
@@ -367,29 +393,24 @@ class ExactQueryWorker(QRunnable):
         logger.info("ExactQueryWorker::run()")
         res: List[UDictWord] = []
         try:
-            db_eng, db_conn, db_session = get_db_engine_connection_session()
-
-            r = db_session \
-                .query(Am.DictWord) \
-                .filter(or_(
-                    Am.DictWord.word.like(f"{self.query}%"),
-                    Am.DictWord.synonyms.like(f"%{self.query}%"),
-                )) \
-                .all()
-            res.extend(r)
-
-            r = db_session \
-                .query(Um.DictWord) \
-                .filter(or_(
-                    Um.DictWord.word.like(f"{self.query}%"),
-                    Um.DictWord.synonyms.like(f"%{self.query}%"),
-                )) \
-                .all()
-            res.extend(r)
-
-            db_conn.close()
-            db_session.close()
-            db_eng.dispose()
+            with db_read_session() as db_session:
+                r = db_session \
+                    .query(Am.DictWord) \
+                    .filter(or_(
+                        Am.DictWord.word.like(f"{self.query}%"),
+                        Am.DictWord.synonyms.like(f"%{self.query}%"),
+                    )) \
+                    .all()
+                res.extend(r)
+
+                r = db_session \
+                    .query(Um.DictWord) \
+                    .filter(or_(
+                        Um.DictWord.word.like(f"{self.query}%"),
+                        Um.DictWord.synonyms.like(f"%{self.query}%"),
+                    )) \
+                    .all()
+                res.extend(r)
 
         except Exception as e:
             logger.error(f"DB query failed: {e}")
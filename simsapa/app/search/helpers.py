@@ -1,4 +1,4 @@
-from typing import List, Optional, Set, Union, Dict
+from typing import List, Optional, Set, Tuple, Union, Dict
 from datetime import datetime
 from time import sleep
 import re
@@ -6,14 +6,16 @@ import re
 import tantivy
 
 from sqlalchemy import or_
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import selectinload
 from sqlalchemy.orm.session import Session
 from simsapa import DbSchemaName, SearchResult, ApiSearchResult
 
 from simsapa.app.db import appdata_models as Am
 from simsapa.app.db import userdata_models as Um
 from simsapa.app.db import dpd_models as Dpd
-from simsapa.app.db_session import get_db_engine_connection_session
-from simsapa.app.helpers import strip_html, root_info_clean_plaintext
+from simsapa.app.db_session import db_read_session
+from simsapa.app.helpers import RefPages, ref_to_pages, strip_html, root_info_clean_plaintext
 from simsapa.app.pali_stemmer import pali_stem
 from simsapa.app.types import SearchArea, SearchParams
 from simsapa.dpd_db.tools.pali_sort_key import pali_sort_key
@@ -55,6 +57,43 @@ def dict_word_to_search_result(x: UDictWord, snippet: str) -> SearchResult:
         rank = None,
     )
 
+# Columns to select with union_queries for sutta_row_to_search_result() and
+# dict_word_row_to_search_result().
+SUTTA_RESULT_COLUMNS = ['id', 'uid', 'source_uid', 'title', 'sutta_ref', 'nikaya', 'content_plain', 'content_html']
+DICT_WORD_RESULT_COLUMNS = ['id', 'uid', 'source_uid', 'word', 'summary', 'definition_plain', 'definition_html']
+
+def sutta_row_to_search_result(x: Row, snippet: str) -> SearchResult:
+    return SearchResult(
+        uid = str(x.uid),
+        schema_name = x.schema_name,
+        table_name = 'suttas',
+        source_uid = str(x.source_uid),
+        title = str(x.title) if x.title else '',
+        ref = str(x.sutta_ref) if x.sutta_ref else '',
+        nikaya = str(x.nikaya) if x.nikaya else '',
+        author = None,
+        snippet = snippet,
+        page_number = None,
+        score = None,
+        rank = None,
+    )
+
+def dict_word_row_to_search_result(x: Row, snippet: str) -> SearchResult:
+    return SearchResult(
+        uid = str(x.uid),
+        schema_name = x.schema_name,
+        table_name = 'dict_words',
+        source_uid = str(x.source_uid),
+        title = str(x.word),
+        ref = None,
+        nikaya = None,
+        author = None,
+        snippet = snippet,
+        page_number = None,
+        score = None,
+        rank = None,
+    )
+
 def search_compact_plain_snippet(content: str,
                                  title: Optional[str] = None,
                                  ref: Optional[str] = None) -> str:
@@ -100,16 +139,93 @@ def search_oneline(content: str) -> str:
 
     return s
 
-def is_index_empty(__ix__: tantivy.Index) -> bool:
-    # FIXME requires dir path as argument
-    # if not ix.exists():
-    #     return True
+def is_index_empty(ix: tantivy.Index) -> bool:
+    # The searcher shows the documents of the last reload, not of the commits since.
+    ix.reload()
+    return ix.searcher().num_docs == 0
 
-    # FIXME returns 0
-    # if ix.searcher().num_docs == 0:
-    #     return True
+def get_multi_ref_by_pts_ref(db_session: Session, ref: str) -> Optional[Am.MultiRef]:
+    """
+    Find the MultiRef of a normalized PTS ref, e.g. 'sn ii 45', with a range
+    lookup on multi_ref_pages. The page may be inside the page range of a sutta.
 
-    return False
+    Refs which are not a volume and page fall back to matching MultiRef.ref.
+    """
+    pages = ref_to_pages(ref)
+
+    if len(pages) == 0:
+        return db_session \
+            .query(Am.MultiRef) \
+            .filter(Am.MultiRef.ref.like(f"%{ref}%")) \
+            .first()
+
+    p = pages[0]
+
+    # The nearest sutta starting on or before the page.
+    return db_session \
+        .query(Am.MultiRef) \
+        .join(Am.MultiRefPage, Am.MultiRefPage.multi_ref_id == Am.MultiRef.id) \
+        .filter(Am.MultiRefPage.collection == p['collection'],
+                Am.MultiRefPage.volume == p['volume'],
+                Am.MultiRefPage.page_start <= p['page_start'],
+                Am.MultiRefPage.page_end >= p['page_start']) \
+        .order_by(Am.MultiRefPage.page_start.desc()) \
+        .first()
+
+def get_sutta_uids_by_pts_refs(db_session: Session, refs: List[str]) -> Dict[str, str]:
+    """
+    The uid of the first sutta of each ref's MultiRef, found as with
+    get_multi_ref_by_pts_ref(), keyed by the normalized PTS ref.
+
+    The page ranges of all the volumes in the refs are read with one query, and
+    the suttas of the found MultiRefs with another.
+    """
+    ref_pages: Dict[str, RefPages] = dict()
+    multi_ref_ids: Dict[str, int] = dict()
+
+    for ref in set(refs):
+        pages = ref_to_pages(ref)
+        if len(pages) > 0:
+            ref_pages[ref] = pages[0]
+        else:
+            multi_ref = get_multi_ref_by_pts_ref(db_session, ref)
+            if multi_ref is not None:
+                multi_ref_ids[ref] = multi_ref.id
+
+    if len(ref_pages) > 0:
+        rows = db_session \
+            .query(Am.MultiRefPage) \
+            .filter(Am.MultiRefPage.collection.in_(set([p['collection'] for p in ref_pages.values()])),
+                    Am.MultiRefPage.volume.in_(set([p['volume'] for p in ref_pages.values()]))) \
+            .all()
+
+        by_volume: Dict[Tuple[str, int], List[Am.MultiRefPage]] = dict()
+        for r in rows:
+            by_volume.setdefault((r.collection, r.volume), []).append(r)
+
+        for ref, p in ref_pages.items():
+            # The nearest sutta starting on or before the page.
+            found: Optional[Am.MultiRefPage] = None
+            for r in by_volume.get((p['collection'], p['volume']), []):
+                if r.page_start <= p['page_start'] and r.page_end >= p['page_start'] \
+                   and (found is None or r.page_start > found.page_start):
+                    found = r
+
+            if found is not None:
+                multi_ref_ids[ref] = found.multi_ref_id
+
+    if len(multi_ref_ids) == 0:
+        return dict()
+
+    multi_refs = db_session \
+        .query(Am.MultiRef) \
+        .options(selectinload(Am.MultiRef.suttas)) \
+        .filter(Am.MultiRef.id.in_(set(multi_ref_ids.values()))) \
+        .all()
+
+    sutta_uids = dict([(i.id, i.suttas[0].uid) for i in multi_refs if len(i.suttas) > 0])
+
+    return dict([(ref, sutta_uids[i]) for ref, i in multi_ref_ids.items() if i in sutta_uids])
 
 def get_sutta_languages(db_session: Session) -> List[str]:
     res = []
@@ -261,31 +377,34 @@ def _parse_words(words_res: List[UDpdWord], do_pali_sort = False) -> List[Search
 
     return res_page
 
-def dpd_lookup(db_session: Session, query_text: str, do_pali_sort = False, exact_only = True) -> List[SearchResult]:
-    # NOTE: Use exact_only=True as default because 'starts with' matches show confusing additional words.
-
+def _dpd_lookup_key(query_text: str) -> str:
     query_text = query_text.lower()
-    query_text = re.sub("[’']ti$", "ti", query_text)
+    return re.sub("[’']ti$", "ti", query_text)
+
+def _is_dpd_ref(query_text: str) -> bool:
+    """A DPD id number or uid, e.g. 1234, 1234/dpd, √gam 1/dpd"""
+    return query_text.endswith("/dpd") or query_text.isdigit()
 
+def _dpd_ref_words(db_session: Session, query_text: str) -> List[UDpdWord]:
     res: List[UDpdWord] = []
 
-    # Query text may be a DPD id number or uid.
-    if query_text.endswith("/dpd") or query_text.isdigit():
-        ref = query_text.replace("/dpd", "")
-        if ref.isdigit():
-            r = db_session.query(Dpd.DpdHeadwords) \
-                          .filter(Dpd.DpdHeadwords.id == int(ref)) \
-                          .first()
-            res.append(r)
+    ref = query_text.replace("/dpd", "")
+    if ref.isdigit():
+        r = db_session.query(Dpd.DpdHeadwords) \
+                      .filter(Dpd.DpdHeadwords.id == int(ref)) \
+                      .first()
+        res.append(r)
 
-        else:
-            r = db_session.query(Dpd.DpdRoots) \
-                          .filter(Dpd.DpdRoots.uid == query_text) \
-                          .first()
-            res.append(r)
+    else:
+        r = db_session.query(Dpd.DpdRoots) \
+                      .filter(Dpd.DpdRoots.uid == query_text) \
+                      .first()
+        res.append(r)
+
+    return res
 
-    if len(res) > 0:
-        return _parse_words(res)
+def _dpd_exact_words(db_session: Session, query_text: str) -> List[UDpdWord]:
+    res: List[UDpdWord] = []
 
     # Word exact match.
     r = db_session.query(Dpd.DpdHeadwords) \
@@ -307,13 +426,18 @@ def dpd_lookup(db_session: Session, query_text: str, do_pali_sort = False, exact
     # - assa: imp 2nd sg of assati
     res.extend(inflection_to_pali_words(db_session, query_text))
 
-    if len(res) == 0:
-        # Stem form exact match.
-        stem = pali_stem(query_text)
-        r = db_session.query(Dpd.DpdHeadwords) \
-                      .filter(Dpd.DpdHeadwords.stem == stem) \
-                      .all()
-        res.extend(r)
+    return res
+
+def _dpd_fallback_words(db_session: Session, query_text: str, exact_only = True) -> List[UDpdWord]:
+    """Matches for a query which has no exact or inflection matches."""
+    res: List[UDpdWord] = []
+
+    # Stem form exact match.
+    stem = pali_stem(query_text)
+    r = db_session.query(Dpd.DpdHeadwords) \
+                  .filter(Dpd.DpdHeadwords.stem == stem) \
+                  .all()
+    res.extend(r)
 
     if len(res) == 0:
         # If the query contained multiple words, remove spaces to find compound forms.
@@ -351,8 +475,103 @@ def dpd_lookup(db_session: Session, query_text: str, do_pali_sort = False, exact
                           .all()
             res.extend(r)
 
+    return res
+
+def dpd_lookup(db_session: Session, query_text: str, do_pali_sort = False, exact_only = True) -> List[SearchResult]:
+    # NOTE: Use exact_only=True as default because 'starts with' matches show confusing additional words.
+
+    query_text = _dpd_lookup_key(query_text)
+
+    # Query text may be a DPD id number or uid.
+    if _is_dpd_ref(query_text):
+        res = _dpd_ref_words(db_session, query_text)
+        if len(res) > 0:
+            return _parse_words(res)
+
+    res = _dpd_exact_words(db_session, query_text)
+
+    if len(res) == 0:
+        res = _dpd_fallback_words(db_session, query_text, exact_only)
+
     return _parse_words(res, do_pali_sort)
 
+# Bound parameters per IN (...) query, below the SQLite limit.
+DPD_BATCH_SIZE = 500
+
+def dpd_lookup_batch(db_session: Session, words: List[str], exact_only = True) -> Dict[str, List[UDpdWord]]:
+    """
+    The DPD words of many queries, as dpd_lookup() finds them, keyed by query.
+
+    The exact and inflection matches of all the queries are found with one
+    query per table (in batches of DPD_BATCH_SIZE). Only the queries without
+    those matches go through the fallbacks one by one.
+    """
+    keys: Dict[str, str] = dict([(w, _dpd_lookup_key(w)) for w in words])
+
+    found: Dict[str, List[UDpdWord]] = dict()
+    batch_keys: List[str] = []
+
+    for k in set(keys.values()):
+        if _is_dpd_ref(k):
+            found[k] = [i for i in _dpd_ref_words(db_session, k) if i is not None]
+        else:
+            found[k] = []
+            batch_keys.append(k)
+
+    def _add(k: str, w: UDpdWord):
+        if k in found and w not in found[k]:
+            found[k].append(w)
+
+    headword_ids: Dict[str, List[int]] = dict()
+
+    for n in range(0, len(batch_keys), DPD_BATCH_SIZE):
+        chunk = batch_keys[n:n+DPD_BATCH_SIZE]
+
+        r = db_session.query(Dpd.DpdHeadwords) \
+                      .filter(or_(Dpd.DpdHeadwords.lemma_clean.in_(chunk),
+                                  Dpd.DpdHeadwords.word_ascii.in_(chunk))) \
+                      .all()
+        for w in r:
+            _add(str(w.lemma_clean), w)
+            _add(str(w.word_ascii), w)
+
+        r = db_session.query(Dpd.DpdRoots) \
+                      .filter(or_(Dpd.DpdRoots.root_clean.in_(chunk),
+                                  Dpd.DpdRoots.root_no_sign.in_(chunk),
+                                  Dpd.DpdRoots.word_ascii.in_(chunk))) \
+                      .all()
+        for w in r:
+            _add(str(w.root_clean), w)
+            _add(str(w.root_no_sign), w)
+            _add(str(w.word_ascii), w)
+
+        r = db_session.query(Dpd.Lookup) \
+                      .filter(Dpd.Lookup.lookup_key.in_(chunk)) \
+                      .all()
+        for i in r:
+            headword_ids[str(i.lookup_key)] = i.headwords_unpack
+
+    all_ids = list(set([i for ids in headword_ids.values() for i in ids]))
+    headwords: Dict[int, Dpd.DpdHeadwords] = dict()
+
+    for n in range(0, len(all_ids), DPD_BATCH_SIZE):
+        r = db_session.query(Dpd.DpdHeadwords) \
+                      .filter(Dpd.DpdHeadwords.id.in_(all_ids[n:n+DPD_BATCH_SIZE])) \
+                      .all()
+        for w in r:
+            headwords[int(w.id)] = w
+
+    for k, ids in headword_ids.items():
+        for i in ids:
+            if i in headwords:
+                _add(k, headwords[i])
+
+    for k in batch_keys:
+        if len(found[k]) == 0:
+            found[k] = _dpd_fallback_words(db_session, k, exact_only)
+
+    return dict([(w, found[k]) for w, k in keys.items()])
+
 def unique_search_results(results: List[SearchResult]) -> List[SearchResult]:
     keys: Set[str] = set()
     uniq_results = []
@@ -401,6 +620,19 @@ def suttas_fulltext_search(queries: GuiSearchQueriesInterface,
 
     return res
 
+def deconstructor_variations(query_text: str) -> List[str]:
+    """The DPD deconstructor variations of the query, e.g. ['kamma + ārāmatā']"""
+    deconstructor: List[str] = []
+
+    with db_read_session() as db_session:
+        r = dpd_deconstructor_query(db_session, query_text)
+        if r is not None:
+            for variation in r.deconstructor_nested:
+                content = " + ".join(variation)
+                deconstructor.append(content)
+
+    return deconstructor
+
 def combined_search(queries: GuiSearchQueriesInterface,
                     query_text: str,
                     params: SearchParams,
@@ -429,24 +661,10 @@ def combined_search(queries: GuiSearchQueriesInterface,
     if do_pali_sort:
         results = sorted(results, key=lambda i: pali_sort_key(f"{i['title']}.{i['schema_name']}.{i['uid']}"))
 
-    deconstructor: List[str] = []
-
-    db_eng, db_conn, db_session = get_db_engine_connection_session()
-
-    r = dpd_deconstructor_query(db_session, query_text)
-    if r is not None:
-        for variation in r.deconstructor_nested:
-            content = " + ".join(variation)
-            deconstructor.append(content)
-
-    db_conn.close()
-    db_session.close()
-    db_eng.dispose()
-
     res = ApiSearchResult(
         hits = queries.query_hits(),
         results = results,
-        deconstructor = deconstructor,
+        deconstructor = deconstructor_variations(query_text),
     )
 
     return res
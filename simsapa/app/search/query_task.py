@@ -1,24 +1,27 @@
 import re
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
 
 import tantivy
 
-from sqlalchemy import and_, or_, not_
+from sqlalchemy import func, or_, not_
+from sqlalchemy.engine import Row
 
 from simsapa import logger, SearchResult
-from simsapa.app.db_session import get_db_engine_connection_session
+from simsapa.app.db_session import db_read_session
 from simsapa.app.helpers import consistent_niggahita
 from simsapa.app.db import appdata_models as Am
 from simsapa.app.db import userdata_models as Um
 from simsapa.app.db import dpd_models as Dpd
-from simsapa.app.types import SearchArea, SearchParams, SearchMode, UDictWord, USutta
-from simsapa.app.search.helpers import dict_word_to_search_result, dpd_lookup, sutta_to_search_result, unique_search_results
-from simsapa.app.search.tantivy_index import TantivySearchQuery
+from simsapa.app.types import DpdFilters, SearchArea, SearchParams, SearchMode, UDictWord, USutta
+from simsapa.app.search.helpers import DICT_WORD_RESULT_COLUMNS, SUTTA_RESULT_COLUMNS, dict_word_row_to_search_result, dict_word_to_search_result, dpd_lookup, sutta_row_to_search_result, unique_search_results
+from simsapa.app.search.result_store import SearchResultStore
+from simsapa.app.search.tantivy_index import TantivySearchIndexes, TantivySearchQuery
+from simsapa.app.search.union_queries import SlicedPart, parts_slice, union_count, union_page, union_rows, union_slice
 
 class SearchQueryTask:
-    _highlighted_result_pages: Dict[int, List[SearchResult]] = dict()
-    _db_all_results: List[SearchResult] = []
+    _highlighted_result_pages: Dict[int, SearchResultStore] = dict()
+    _db_all_results: SearchResultStore = SearchResultStore()
     _db_query_hits_count = 0
 
     def __init__(self,
@@ -27,7 +30,8 @@ class SearchQueryTask:
                  query_text_orig: str,
                  query_started_time: datetime,
                  params: SearchParams,
-                 area: SearchArea):
+                 area: SearchArea,
+                 dpd_filters: Optional[DpdFilters] = None):
 
         self.ix = ix
         self.query_text = consistent_niggahita(query_text_orig)
@@ -45,10 +49,14 @@ class SearchQueryTask:
         self.source = None if s is None else s.lower()
         self.source_include = params['source_include']
         self._highlighted_result_pages = dict()
+        self._db_all_results = SearchResultStore()
 
         self.enable_regex = params['enable_regex']
         self.fuzzy_distance = params['fuzzy_distance']
 
+        # Term filters on the structured DPD fields of the dict_words index.
+        self.dpd_filters = dpd_filters if area == SearchArea.DictWords else None
+
         self.search_query = TantivySearchQuery(self.ix, params)
 
     def query_hits(self) -> Optional[int]:
@@ -76,9 +84,9 @@ class SearchQueryTask:
         else:
             return len(self._db_all_results)
 
-    def all_results(self) -> List[SearchResult]:
+    def all_results(self) -> SearchResultStore:
         if self.search_mode == SearchMode.Combined:
-            res = []
+            res = SearchResultStore()
             res.extend(self._db_all_results)
             res.extend(self.search_query.get_all_results())
             return res
@@ -89,6 +97,49 @@ class SearchQueryTask:
         else:
             return self._db_all_results
 
+    def pinned_results(self) -> List[SearchResult]:
+        """Results which are always shown on the first results page, regardless
+        of the page length, i.e. the boosted DPD Lookup results in Combined mode."""
+
+        if self.search_mode == SearchMode.Combined:
+            return self._db_all_results.to_list()
+        else:
+            return []
+
+    def ranked_results_page(self, page_num: int) -> List[SearchResult]:
+        """Results page of the score ranked results, without the pinned results.
+
+        Returns an empty list when there are no more pages, so that the pages can
+        be consumed as a stream when merging the results of several tasks."""
+
+        if self.search_mode == SearchMode.Combined:
+            # The highlighted pages of Combined mode are the fulltext results
+            # pages, the DPD Lookup results are kept in _db_all_results.
+            if page_num not in self._highlighted_result_pages:
+                self._highlighted_result_pages[page_num] = SearchResultStore(self.search_query.highlighted_results_page(page_num))
+
+            return self._highlighted_result_pages[page_num].to_list()
+
+        elif self.search_mode == SearchMode.DpdIdMatch or \
+             self.search_mode == SearchMode.DpdLookup or \
+             self.search_mode == SearchMode.UidMatch:
+
+            # All results are on the first page.
+            if page_num > 0:
+                return []
+
+            return self.results_page(0)
+
+        elif self.search_mode == SearchMode.TitleMatch or \
+             self.search_mode == SearchMode.HeadwordMatch:
+
+            a = page_num * self._page_len
+            b = a + self._page_len
+            return self._db_all_results[a:b]
+
+        else:
+            return self.results_page(page_num)
+
     def _highlight_text(self, query: str, content: str) -> str:
         pat = re.compile(f"({query})")
         return pat.sub(r"<span class='match'>\1</span>", content)
@@ -105,55 +156,39 @@ class SearchQueryTask:
         return content
 
     def results_page(self, page_num: int) -> List[SearchResult]:
-        # If this results page has been calculated before, return it.
-        if page_num in self._highlighted_result_pages:
-            return self._highlighted_result_pages[page_num]
-
-        # Otherwise, run the queries and return the results page.
-
         if self.search_mode == SearchMode.Combined:
-            res: List[SearchResult] = []
-
-            # Display all DPD Lookup results (not many) on the first (0 index) results page.
+            # Display all DPD Lookup results (not many) on the first (0 index)
+            # results page, followed by the fulltext results.
+            res = self.ranked_results_page(page_num)
             if page_num == 0:
-                def _boost(i: SearchResult) -> SearchResult:
-                    if i['score'] is None:
-                        i['score'] = 10000
-                    else:
-                        i['score'] += 10000
-                    return i
-
-                # Run DPD Lookup and boost results to the top.
-                res.extend([_boost(i) for i in self._dpd_lookup()])
-                self._db_all_results = res
+                res = unique_search_results(self.pinned_results() + res)
 
-            # The Fulltext query has been executed before this, request the
-            # results with highlighted snippets.
-            res.extend(self.search_query.highlighted_results_page(page_num))
+            return res
 
-            res = unique_search_results(res)
+        # If this results page has been calculated before, return it.
+        if page_num in self._highlighted_result_pages:
+            return self._highlighted_result_pages[page_num].to_list()
 
-            self._highlighted_result_pages[page_num] = res
+        # Otherwise, run the queries and return the results page.
 
-        elif self.search_mode == SearchMode.FulltextMatch:
-            res = self.search_query.highlighted_results_page(page_num)
-            self._highlighted_result_pages[page_num] = res
+        if self.search_mode == SearchMode.FulltextMatch:
+            self._highlighted_result_pages[page_num] = SearchResultStore(self.search_query.highlighted_results_page(page_num))
 
         elif self.search_mode == SearchMode.UidMatch:
-            res = self.uid_word()
-            self._highlighted_result_pages[page_num] = res
-            self._db_all_results = res
+            store = SearchResultStore(self.uid_word())
+            self._highlighted_result_pages[page_num] = store
+            self._db_all_results = store
 
         elif self.search_mode == SearchMode.DpdIdMatch:
-            res = self.dpd_id_word()
-            self._highlighted_result_pages[page_num] = res
-            self._db_all_results = res
+            store = SearchResultStore(self.dpd_id_word())
+            self._highlighted_result_pages[page_num] = store
+            self._db_all_results = store
 
         elif self.search_mode == SearchMode.DpdLookup:
             # Display all DPD Lookup results (not many) on the first (0 index) results page.
-            res = self._dpd_lookup()
-            self._highlighted_result_pages[0] = res
-            self._db_all_results = res
+            store = SearchResultStore(self._dpd_lookup())
+            self._highlighted_result_pages[0] = store
+            self._db_all_results = store
 
         else:
             def _add_highlight(x: SearchResult) -> SearchResult:
@@ -171,9 +206,9 @@ class SearchQueryTask:
             else:
                 logger.error(f"Unknown SearchArea: {self.search_area}")
 
-            self._highlighted_result_pages[page_num] = list(map(_add_highlight, results))
+            self._highlighted_result_pages[page_num] = SearchResultStore(map(_add_highlight, results))
 
-        return self._highlighted_result_pages[page_num]
+        return self._highlighted_result_pages[page_num].to_list()
 
     def _fragment_around_text(self, query: str, content: str, chars_before = 20, chars_after = 500) -> str:
         n = content.lower().find(query.lower())
@@ -213,7 +248,7 @@ class SearchQueryTask:
 
         return fragment
 
-    def _db_sutta_to_result(self, x: USutta) -> SearchResult:
+    def _db_sutta_row_to_result(self, x: Row) -> SearchResult:
         if x.content_plain is not None and len(str(x.content_plain)) > 0:
             content = str(x.content_plain)
         else:
@@ -221,7 +256,19 @@ class SearchQueryTask:
 
         snippet = self._fragment_around_query(self.query_text, content)
 
-        return sutta_to_search_result(x, snippet)
+        return sutta_row_to_search_result(x, snippet)
+
+    def _db_word_row_to_result(self, x: Row) -> SearchResult:
+        if x.summary is not None and len(str(x.summary)) > 0:
+            content = str(x.summary)
+        elif x.definition_plain is not None and len(str(x.definition_plain)) > 0:
+            content = str(x.definition_plain)
+        else:
+            content = str(x.definition_html)
+
+        snippet = self._fragment_around_query(self.query_text, content)
+
+        return dict_word_row_to_search_result(x, snippet)
 
     def _db_word_to_result(self, x: UDictWord) -> SearchResult:
         if x.summary is not None and len(str(x.summary)) > 0:
@@ -253,7 +300,8 @@ class SearchQueryTask:
                                         self.source,
                                         self.source_include,
                                         enable_regex = self.enable_regex,
-                                        fuzzy_distance = self.fuzzy_distance)
+                                        fuzzy_distance = self.fuzzy_distance,
+                                        dpd_filters = self.dpd_filters)
 
         except ValueError as e:
             # E.g. invalid query syntax error from tantivy
@@ -263,172 +311,158 @@ class SearchQueryTask:
             logger.error(f"SearchQueryTask::_fulltext_search(): {e}")
             raise e
 
-    def suttas_contains_or_regex_match_page(self, page_num: int) -> List[SearchResult]:
-        db_eng, db_conn, db_session = get_db_engine_connection_session()
+    def _source_filter(self, column) -> List[Any]:
+        if self.source is None:
+            return []
 
-        res: List[USutta] = []
+        if self.source_include:
+            return [column == self.source.lower()]
+        else:
+            return [or_(column.is_(None), column != self.source.lower())]
 
-        am_query = db_session.query(Am.Sutta)
-        um_query = db_session.query(Um.Sutta)
+    def _query_terms(self) -> List[str]:
+        if 'AND' in self.query_text:
+            return list(map(lambda x: x.strip(), self.query_text.split('AND')))
+        else:
+            return [self.query_text]
 
-        if self.source is not None:
-            if self.source_include:
-                am_query = am_query.filter(Am.Sutta.uid.like(f'%/{self.source}'))
-                um_query = um_query.filter(Um.Sutta.uid.like(f'%/{self.source}'))
-            else:
-                am_query = am_query.filter(Am.Sutta.uid.not_like(f'%/{self.source}'))
-                um_query = um_query.filter(Um.Sutta.uid.not_like(f'%/{self.source}'))
+    def suttas_contains_or_regex_match_page(self, page_num: int) -> List[SearchResult]:
+        if self.search_mode not in [SearchMode.ContainsMatch, SearchMode.RegExMatch]:
+            logger.error(f"Invalid search mode in suttas_contains_or_regex_match_page(): {self.search_mode}")
+            return []
 
-        try:
-            query_total = 0
+        terms = self._query_terms()
 
-            if 'AND' in self.query_text:
-                terms = list(map(lambda x: x.strip(), self.query_text.split('AND')))
-            else:
-                terms = [self.query_text]
+        def where(m) -> List[Any]:
+            clauses = self._source_filter(m.Sutta.source_uid)
 
             for i in terms:
                 if self.search_mode == SearchMode.ContainsMatch:
-                    am_query = am_query.filter(Am.Sutta.content_plain.contains(i))
-                    um_query = um_query.filter(Um.Sutta.content_plain.contains(i))
-
-                elif self.search_mode == SearchMode.RegExMatch:
-                    am_query = am_query.filter(Am.Sutta.content_plain.regexp_match(i))
-                    um_query = um_query.filter(Um.Sutta.content_plain.regexp_match(i))
-
+                    clauses.append(m.Sutta.content_plain.contains(i))
                 else:
-                    logger.error(f"Invalid search mode in suttas_contains_or_regex_match_page(): {self.search_mode}")
-                    return []
+                    clauses.append(m.Sutta.content_plain.regexp_match(i))
 
-            query_total += am_query.count()
-            query_total += um_query.count()
+            return clauses
 
-            am_query = am_query.offset(page_num * self._page_len).limit(self._page_len)
-            um_query = um_query.offset(page_num * self._page_len).limit(self._page_len)
+        with db_read_session() as db_session:
+            try:
+                # appdata and userdata in one query, so that the page is
+                # counted across both.
+                self._db_query_hits_count = union_count(db_session, 'Sutta', where)
 
-            res.extend(am_query.all())
-            res.extend(um_query.all())
+                rows = union_page(db_session,
+                                  'Sutta',
+                                  SUTTA_RESULT_COLUMNS,
+                                  where,
+                                  ['schema_name', 'id'],
+                                  page_num,
+                                  self._page_len)
 
-            self._db_query_hits_count = query_total
+            except Exception as e:
+                logger.error(f"SearchQueryTask::suttas_contains_or_regex_match_page(): {e}")
+                return []
 
-        except Exception as e:
-            logger.error(f"SearchQueryTask::suttas_contains_or_regex_match_page(): {e}")
-            return []
-
-        db_conn.close()
-        db_session.close()
-        db_eng.dispose()
-
-        return list(map(self._db_sutta_to_result, res))
+        return list(map(self._db_sutta_row_to_result, rows))
 
     def dict_words_contains_or_regex_match_page(self, page_num: int) -> List[SearchResult]:
-        db_eng, db_conn, db_session = get_db_engine_connection_session()
-
-        res: List[UDictWord] = []
+        if self.search_mode not in [SearchMode.ContainsMatch, SearchMode.RegExMatch]:
+            logger.error(f"Invalid search mode in dict_words_contains_or_regex_match_page(): {self.search_mode}")
+            return []
 
-        am_query = db_session.query(Am.DictWord)
-        um_query = db_session.query(Um.DictWord)
-        dpd_head_query = db_session.query(Dpd.DpdHeadwords)
-        dpd_root_query = db_session.query(Dpd.DpdRoots)
+        # With source 'dpd', include only or exclude only the DPD tables.
+        use_dict_words = True
+        use_dpd = True
 
         if self.source is not None:
             if self.source_include:
                 if self.source == "dpd":
-                    # Only DPD
-                    am_query = None
-                    um_query = None
+                    use_dict_words = False
                 else:
-                    # Exclude DPD
-                    am_query = am_query.filter(Am.DictWord.uid.like(f'%/{self.source}'))
-                    um_query = um_query.filter(Um.DictWord.uid.like(f'%/{self.source}'))
-                    dpd_head_query = None
-                    dpd_root_query = None
-
+                    use_dpd = False
             else:
                 if self.source == "dpd":
-                    # Exclude DPD
-                    am_query = am_query.filter(Am.DictWord.uid.not_like(f'%/{self.source}'))
-                    um_query = um_query.filter(Um.DictWord.uid.not_like(f'%/{self.source}'))
-                    dpd_head_query = None
-                    dpd_root_query = None
+                    use_dpd = False
                 else:
-                    # Only DPD
-                    am_query = None
-                    um_query = None
+                    use_dict_words = False
 
-        try:
-            query_total = 0
+        terms = self._query_terms()
 
-            if 'AND' in self.query_text:
-                terms = list(map(lambda x: x.strip(), self.query_text.split('AND')))
-            else:
-                terms = [self.query_text]
+        def where(m) -> List[Any]:
+            clauses = self._source_filter(m.DictWord.source_uid)
 
             for i in terms:
                 if self.search_mode == SearchMode.ContainsMatch:
+                    clauses.append(m.DictWord.definition_plain.contains(i))
+                else:
+                    clauses.append(m.DictWord.definition_plain.regexp_match(i))
 
-                    if am_query is not None:
-                        am_query = am_query.filter(Am.DictWord.definition_plain.contains(i))
+            return clauses
 
-                    if um_query is not None:
-                        um_query = um_query.filter(Um.DictWord.definition_plain.contains(i))
+        with db_read_session() as db_session:
+            results: List[SearchResult] = []
 
-                    if dpd_head_query is not None:
-                        dpd_head_query = dpd_head_query.filter(
-                            or_(Dpd.DpdHeadwords.lemma_clean.contains(i),
-                                Dpd.DpdHeadwords.word_ascii.contains(i),
-                                Dpd.DpdHeadwords.meaning_1.contains(i)))
+            # The results are the dict_words, followed by the DPD headwords and
+            # roots, and the page is sliced once from these.
+            parts: List[SlicedPart[SearchResult]] = []
 
-                    if dpd_root_query is not None:
-                        dpd_root_query = dpd_root_query.filter(
-                            or_(Dpd.DpdRoots.root_clean.contains(i),
-                                Dpd.DpdRoots.word_ascii.contains(i),
-                                Dpd.DpdRoots.root_meaning.contains(i)))
+            try:
+                if use_dict_words:
+                    def _dict_words_slice(offset: int, limit: int) -> List[SearchResult]:
+                        rows = union_slice(db_session,
+                                           'DictWord',
+                                           DICT_WORD_RESULT_COLUMNS,
+                                           where,
+                                           ['schema_name', 'id'],
+                                           offset,
+                                           limit)
 
-                elif self.search_mode == SearchMode.RegExMatch:
+                        return list(map(self._db_word_row_to_result, rows))
 
-                    if am_query is not None:
-                        am_query = am_query.filter(Am.DictWord.definition_plain.regexp_match(i))
+                    parts.append((union_count(db_session, 'DictWord', where), _dict_words_slice))
 
-                    if um_query is not None:
-                        um_query = um_query.filter(Um.DictWord.definition_plain.regexp_match(i))
+                if use_dpd:
+                    dpd_head_query = db_session.query(Dpd.DpdHeadwords)
+                    dpd_root_query = db_session.query(Dpd.DpdRoots)
 
-                    if dpd_head_query is not None:
-                        dpd_head_query = dpd_head_query.filter(
-                            or_(Dpd.DpdHeadwords.lemma_clean.regexp_match(i),
-                                Dpd.DpdHeadwords.word_ascii.regexp_match(i),
-                                Dpd.DpdHeadwords.meaning_1.regexp_match(i)))
+                    for i in terms:
+                        if self.search_mode == SearchMode.ContainsMatch:
+                            dpd_head_query = dpd_head_query.filter(
+                                or_(Dpd.DpdHeadwords.lemma_clean.contains(i),
+                                    Dpd.DpdHeadwords.word_ascii.contains(i),
+                                    Dpd.DpdHeadwords.meaning_1.contains(i)))
 
-                    if dpd_root_query is not None:
-                        dpd_root_query = dpd_root_query.filter(
-                            or_(Dpd.DpdRoots.root_clean.regexp_match(i),
-                                Dpd.DpdRoots.word_ascii.regexp_match(i),
-                                Dpd.DpdRoots.root_meaning.regexp_match(i)))
+                            dpd_root_query = dpd_root_query.filter(
+                                or_(Dpd.DpdRoots.root_clean.contains(i),
+                                    Dpd.DpdRoots.word_ascii.contains(i),
+                                    Dpd.DpdRoots.root_meaning.contains(i)))
 
-                else:
-                    logger.error(f"Invalid search mode in dict_words_contains_or_regex_match_page(): {self.search_mode}")
-                    return []
+                        else:
+                            dpd_head_query = dpd_head_query.filter(
+                                or_(Dpd.DpdHeadwords.lemma_clean.regexp_match(i),
+                                    Dpd.DpdHeadwords.word_ascii.regexp_match(i),
+                                    Dpd.DpdHeadwords.meaning_1.regexp_match(i)))
 
-            for q in [am_query,
-                      um_query,
-                      dpd_head_query,
-                      dpd_root_query]:
+                            dpd_root_query = dpd_root_query.filter(
+                                or_(Dpd.DpdRoots.root_clean.regexp_match(i),
+                                    Dpd.DpdRoots.word_ascii.regexp_match(i),
+                                    Dpd.DpdRoots.root_meaning.regexp_match(i)))
 
-                if q is not None:
-                    query_total += q.count()
-                    q = q.offset(page_num * self._page_len).limit(self._page_len)
-                    res.extend(q.all())
+                    for q in [dpd_head_query.order_by(Dpd.DpdHeadwords.id),
+                              dpd_root_query.order_by(Dpd.DpdRoots.root)]:
 
-            self._db_query_hits_count = query_total
+                        def _dpd_slice(offset: int, limit: int, q = q) -> List[SearchResult]:
+                            return list(map(self._db_word_to_result, q.offset(offset).limit(limit).all()))
 
-        except Exception as e:
-            logger.error(f"SearchQueryTask::dict_words_contains_or_regex_match_page(): {e}")
+                        parts.append((q.count(), _dpd_slice))
 
-        db_conn.close()
-        db_session.close()
-        db_eng.dispose()
+                self._db_query_hits_count = sum([i[0] for i in parts])
 
-        return list(map(self._db_word_to_result, res))
+                results = parts_slice(parts, page_num * self._page_len, self._page_len)
+
+            except Exception as e:
+                logger.error(f"SearchQueryTask::dict_words_contains_or_regex_match_page(): {e}")
+
+        return results
 
     def uid_word(self) -> List[SearchResult]:
         uid = self.query_text.lower() \
@@ -436,41 +470,36 @@ class SearchQueryTask:
 
         logger.info(f"uid_word() {uid}")
 
-        db_eng, db_conn, db_session = get_db_engine_connection_session()
-
-        if uid.endswith("/dpd"):
-            word = db_session.query(Dpd.DpdHeadwords) \
-                            .filter(Dpd.DpdHeadwords.uid == uid) \
-                            .first()
-
-            if word is None:
-                word = db_session.query(Dpd.DpdRoots) \
-                                .filter(Dpd.DpdRoots.uid == uid) \
+        with db_read_session() as db_session:
+            if uid.endswith("/dpd"):
+                word = db_session.query(Dpd.DpdHeadwords) \
+                                .filter(Dpd.DpdHeadwords.uid == uid) \
                                 .first()
 
-        else:
-            word = db_session.query(Am.DictWord) \
-                            .filter(Am.DictWord.uid == uid) \
-                            .first()
+                if word is None:
+                    word = db_session.query(Dpd.DpdRoots) \
+                                    .filter(Dpd.DpdRoots.uid == uid) \
+                                    .first()
 
-            if word is None:
-                word = db_session.query(Um.DictWord) \
-                                .filter(Um.DictWord.uid == uid) \
+            else:
+                word = db_session.query(Am.DictWord) \
+                                .filter(Am.DictWord.uid == uid) \
                                 .first()
 
-        res_page = []
+                if word is None:
+                    word = db_session.query(Um.DictWord) \
+                                    .filter(Um.DictWord.uid == uid) \
+                                    .first()
 
-        if word is not None:
-            snippet = str(word.definition_plain)
-            if len(snippet) > 100:
-                snippet = snippet[0:100] + " ..."
+            res_page = []
 
-            res = dict_word_to_search_result(word, snippet)
-            res_page.append(res)
+            if word is not None:
+                snippet = str(word.definition_plain)
+                if len(snippet) > 100:
+                    snippet = snippet[0:100] + " ..."
 
-        db_conn.close()
-        db_session.close()
-        db_eng.dispose()
+                res = dict_word_to_search_result(word, snippet)
+                res_page.append(res)
 
         return res_page
 
@@ -480,25 +509,31 @@ class SearchQueryTask:
 
         dpd_id = int(self.query_text)
 
-        db_eng, db_conn, db_session = get_db_engine_connection_session()
+        with db_read_session() as db_session:
+            dpd_word = db_session.query(Dpd.DpdHeadwords) \
+                                 .filter(Dpd.DpdHeadwords.id == dpd_id) \
+                                 .first()
 
-        dpd_word = db_session.query(Dpd.DpdHeadwords) \
-                             .filter(Dpd.DpdHeadwords.id == dpd_id) \
-                             .first()
+            res_page = []
 
-        res_page = []
+            if dpd_word is not None:
+                snippet = dpd_word.meaning_1 if dpd_word.meaning_1 != "" else dpd_word.meaning_2
 
-        if dpd_word is not None:
-            snippet = dpd_word.meaning_1 if dpd_word.meaning_1 != "" else dpd_word.meaning_2
+                res = dict_word_to_search_result(dpd_word, snippet)
+                res_page.append(res)
 
-            res = dict_word_to_search_result(dpd_word, snippet)
-            res_page.append(res)
+        return res_page
 
-        db_conn.close()
-        db_session.close()
-        db_eng.dispose()
+    def _combined_dpd_lookup(self):
+        """Run DPD Lookup and boost the results to the top of the first page."""
+        def _boost(i: SearchResult) -> SearchResult:
+            if i['score'] is None:
+                i['score'] = 10000
+            else:
+                i['score'] += 10000
+            return i
 
-        return res_page
+        self._db_all_results = SearchResultStore([_boost(i) for i in self._dpd_lookup()])
 
     def _dpd_lookup(self) -> List[SearchResult]:
         logger.info("_dpd_lookup()")
@@ -507,67 +542,29 @@ class SearchQueryTask:
         if self.lang != "en":
             return []
 
-        db_eng, db_conn, db_session = get_db_engine_connection_session()
-
-        res_page = dpd_lookup(db_session, self.query_text)
-        # FIXME implement paging in DPD lookup results.
-        res_page = res_page[0:100]
-
-        db_conn.close()
-        db_session.close()
-        db_eng.dispose()
+        with db_read_session() as db_session:
+            res_page = dpd_lookup(db_session, self.query_text)
+            # FIXME implement paging in DPD lookup results.
+            res_page = res_page[0:100]
 
         return res_page
 
     def _suttas_title_match(self):
         # SearchMode.TitleMatch only applies to suttas.
         try:
-            db_eng, db_conn, db_session = get_db_engine_connection_session()
+            with db_read_session() as db_session:
+                def where(m) -> List[Any]:
+                    return self._source_filter(m.Sutta.source_uid) + \
+                        [m.Sutta.title.like(f"%{self.query_text}%")]
 
-            res_suttas: List[USutta] = []
+                rows = union_rows(db_session, 'Sutta', SUTTA_RESULT_COLUMNS, where)
 
-            am_query = db_session.query(Am.Sutta)
-            um_query = db_session.query(Um.Sutta)
+                # Titles starting with the query first.
+                q = self.query_text.lower()
+                starts = [i for i in rows if str(i.title).lower().startswith(q)]
+                contains = [i for i in rows if not str(i.title).lower().startswith(q)]
 
-            if self.source is not None:
-                if self.source_include:
-                    am_query = am_query.filter(Am.Sutta.uid.like(f'%/{self.source}'))
-                    um_query = um_query.filter(Um.Sutta.uid.like(f'%/{self.source}'))
-                else:
-                    am_query = am_query.filter(Am.Sutta.uid.not_like(f'%/{self.source}'))
-                    um_query = um_query.filter(Um.Sutta.uid.not_like(f'%/{self.source}'))
-
-            am_query = am_query.filter(Am.Sutta.title.like(f"{self.query_text}%"))
-            um_query = um_query.filter(Um.Sutta.title.like(f"{self.query_text}%"))
-
-            res_suttas.extend(am_query.all())
-            res_suttas.extend(um_query.all())
-
-            ids = list(map(lambda x: x.id, res_suttas))
-
-            r = db_session \
-                .query(Am.Sutta) \
-                .filter(and_(
-                    Am.Sutta.title.like(f"%{self.query_text}%"),
-                    not_(Am.Sutta.id.in_(ids)),
-                )) \
-                .all()
-            res_suttas.extend(r)
-
-            r = db_session \
-                .query(Um.Sutta) \
-                .filter(and_(
-                    Um.Sutta.title.like(f"%{self.query_text}%"),
-                    not_(Um.Sutta.id.in_(ids)),
-                )) \
-                .all()
-            res_suttas.extend(r)
-
-            self._db_all_results = list(map(self._db_sutta_to_result, res_suttas))
-
-            db_conn.close()
-            db_session.close()
-            db_eng.dispose()
+                self._db_all_results = SearchResultStore(map(self._db_sutta_row_to_result, starts + contains))
 
         except Exception as e:
             logger.error(f"SearchQueryTask::_suttas_title_match(): {e}")
@@ -575,86 +572,39 @@ class SearchQueryTask:
     def _dict_words_headword_match(self):
         # SearchMode.HeadwordMatch only applies to dictionary words.
         try:
-            db_eng, db_conn, db_session = get_db_engine_connection_session()
+            with db_read_session() as db_session:
+                rows = union_rows(db_session,
+                                  'DictWord',
+                                  DICT_WORD_RESULT_COLUMNS,
+                                  lambda m: self._source_filter(m.DictWord.source_uid) + [dict_word_starts_with(m, self.query_text)])
 
-            res: List[UDictWord] = []
+                # Sort 'dhamma 01' etc. without the numbers.
+                rows = sorted(rows, key=lambda x: re.sub(r"[ 0-9]+$", "", str(x.word).lower()))
 
-            am_query = db_session.query(Am.DictWord)
-            um_query = db_session.query(Um.DictWord)
+                rows.extend(union_rows(db_session,
+                                       'DictWord',
+                                       DICT_WORD_RESULT_COLUMNS,
+                                       lambda m: [m.DictWord.word.like(f"%{self.query_text}%"),
+                                                  not_(dict_word_starts_with(m, self.query_text))]))
 
-            if self.source is not None:
-                if self.source_include:
-                    am_query = am_query.filter(Am.DictWord.uid.like(f'%/{self.source}'))
-                    um_query = um_query.filter(Um.DictWord.uid.like(f'%/{self.source}'))
-                else:
-                    am_query = am_query.filter(Am.DictWord.uid.not_like(f'%/{self.source}'))
-                    um_query = um_query.filter(Um.DictWord.uid.not_like(f'%/{self.source}'))
-
-            am_query = am_query.filter(or_(
-                Am.DictWord.word.like(f"{self.query_text}%"),
-                Am.DictWord.word_nom_sg.like(f"{self.query_text}%"),
-                Am.DictWord.inflections.like(f"{self.query_text}%"),
-                Am.DictWord.phonetic.like(f"{self.query_text}%"),
-                Am.DictWord.transliteration.like(f"{self.query_text}%"),
-                Am.DictWord.also_written_as.like(f"{self.query_text}%"),
-            ))
-
-            um_query = um_query.filter(or_(
-                Um.DictWord.word.like(f"{self.query_text}%"),
-                Um.DictWord.word_nom_sg.like(f"{self.query_text}%"),
-                Um.DictWord.inflections.like(f"{self.query_text}%"),
-                Um.DictWord.phonetic.like(f"{self.query_text}%"),
-                Um.DictWord.transliteration.like(f"{self.query_text}%"),
-                Um.DictWord.also_written_as.like(f"{self.query_text}%"),
-            ))
-
-            res.extend(am_query.all())
-            res.extend(um_query.all())
-
-            # Sort 'dhamma 01' etc. without the numbers.
-
-            a = list(map(lambda x: (re.sub(r"[ 0-9]+$", "", str(x.word).lower()), x), res))
-            b = sorted(a, key=lambda x: x[0])
-            res = list(map(lambda x: x[1], b))
-
-            ids = list(map(lambda x: x.id, res))
-
-            r = db_session \
-                .query(Am.DictWord) \
-                .filter(and_(
-                    Am.DictWord.word.like(f"%{self.query_text}%"),
-                    not_(Am.DictWord.id.in_(ids)),
-                )) \
-                .all()
-            res.extend(r)
-
-            r = db_session \
-                .query(Um.DictWord) \
-                .filter(and_(
-                    Um.DictWord.word.like(f"%{self.query_text}%"),
-                    not_(Um.DictWord.id.in_(ids)),
-                )) \
-                .all()
-            res.extend(r)
-
-            self._db_all_results = list(map(self._db_word_to_result, res))
-
-            db_conn.close()
-            db_session.close()
-            db_eng.dispose()
+                self._db_all_results = SearchResultStore(map(self._db_word_row_to_result, rows))
 
         except Exception as e:
             logger.error(f"SearchQueryTask::_dict_words_headword_match(): {e}")
 
     def run(self):
         logger.info("SearchQueryTask::run()")
-        self._db_all_results = []
+        self._db_all_results = SearchResultStore()
         self._highlighted_result_pages = dict()
 
         if self.search_mode == SearchMode.Combined or \
            self.search_mode == SearchMode.FulltextMatch:
 
             self._run_fulltext_query()
+
+            if self.search_mode == SearchMode.Combined:
+                self._combined_dpd_lookup()
+
             self.results_page(0)
 
         elif self.search_mode == SearchMode.DpdIdMatch or \
@@ -676,3 +626,64 @@ class SearchQueryTask:
 
         self.query_finished_time = datetime.now()
 
+def dict_word_starts_with(m: Any, query_text: str) -> Any:
+    """The headword or one of its forms starts with the query text. The
+    optional columns are compared as '' when NULL, so that not_() of this is
+    true and not NULL for words without them."""
+    columns = [m.DictWord.word,
+               m.DictWord.word_nom_sg,
+               m.DictWord.inflections,
+               m.DictWord.phonetic,
+               m.DictWord.transliteration,
+               m.DictWord.also_written_as]
+
+    return or_(*[func.coalesce(c, '').like(f"{query_text}%") for c in columns])
+
+def new_search_tasks(search_indexes: TantivySearchIndexes,
+                     query_text_orig: str,
+                     query_started_time: datetime,
+                     params: SearchParams,
+                     area: SearchArea,
+                     dpd_filters: Optional[DpdFilters] = None) -> List[SearchQueryTask]:
+    """One task for each language index selected by the params."""
+
+    if area == SearchArea.Suttas:
+        lang_indexes = search_indexes.suttas_lang_index
+    else:
+        lang_indexes = search_indexes.dict_words_lang_index
+
+        if query_text_orig.isdigit():
+            # If the query_text is an integer, it is a DPD ID.
+            params['mode'] = SearchMode.DpdIdMatch
+
+        elif re.search(r"/[a-z0-9-]+$", query_text_orig.lower()):
+            # If the query_text ends with sth like /pts, /sbs-ru, then the
+            # user is looking for specific word with a uid.
+            params['mode'] = SearchMode.UidMatch
+
+    lang_keys = list(lang_indexes.keys())
+
+    if params['lang'] is not None:
+        if params['lang_include']:
+            languages =  [params['lang']]
+        else:
+            languages = [i for i in lang_keys if i != params['lang']]
+    else:
+        languages = lang_keys
+
+    tasks: List[SearchQueryTask] = []
+
+    for lang in languages:
+        # This can happen when the Language dropdown has empty value.
+        if lang == "":
+            continue
+
+        tasks.append(SearchQueryTask(lang,
+                                     lang_indexes[lang],
+                                     query_text_orig,
+                                     query_started_time,
+                                     params,
+                                     area,
+                                     dpd_filters))
+
+    return tasks
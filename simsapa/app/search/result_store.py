@@ -0,0 +1,145 @@
+import sys
+from array import array
+from typing import Iterable, Iterator, List, Optional, Union, overload
+
+from simsapa import SearchResult
+
+# Sentinel values for None in the numeric columns.
+NONE_FLOAT = float('nan')
+NONE_INT = -(2**63)
+
+def _intern(s: Optional[str]) -> Optional[str]:
+    if s is None:
+        return None
+    return sys.intern(s)
+
+def _float_or_none(x: float) -> Optional[float]:
+    # NaN is the only value not equal to itself.
+    if x != x:
+        return None
+    return x
+
+def _int_or_none(x: int) -> Optional[int]:
+    if x == NONE_INT:
+        return None
+    return x
+
+class SearchResultStore:
+    """Column-oriented storage for a list of search results.
+
+    Queries matching many items (all results of a broad query, cached
+    highlighted pages) would otherwise keep one dict with a dozen keys per hit.
+    The store keeps the fields in parallel lists and arrays, with the
+    frequently repeated values (schema, table, source, nikaya) interned, and
+    creates the SearchResult dict only when an item is accessed, e.g. when a
+    results page is rendered.
+    """
+
+    __slots__ = ('uid', 'schema_name', 'table_name', 'source_uid', 'title', 'ref',
+                 'nikaya', 'author', 'snippet', 'page_number', 'score', 'rank')
+
+    def __init__(self, results: Optional[Iterable[SearchResult]] = None):
+        self.uid: List[str] = []
+        self.schema_name: List[str] = []
+        self.table_name: List[str] = []
+        self.source_uid: List[Optional[str]] = []
+        self.title: List[str] = []
+        self.ref: List[Optional[str]] = []
+        self.nikaya: List[Optional[str]] = []
+        self.author: List[Optional[str]] = []
+        self.snippet: List[str] = []
+        self.page_number = array('q')
+        self.score = array('d')
+        self.rank = array('q')
+
+        if results is not None:
+            self.extend(results)
+
+    def append(self, x: SearchResult):
+        self.uid.append(x['uid'])
+        self.schema_name.append(sys.intern(x['schema_name']))
+        self.table_name.append(sys.intern(x['table_name']))
+        self.source_uid.append(_intern(x['source_uid']))
+        self.title.append(x['title'])
+        self.ref.append(x['ref'])
+        self.nikaya.append(_intern(x['nikaya']))
+        self.author.append(_intern(x['author']))
+        self.snippet.append(x['snippet'])
+        self.page_number.append(NONE_INT if x['page_number'] is None else x['page_number'])
+        self.score.append(NONE_FLOAT if x['score'] is None else x['score'])
+        self.rank.append(NONE_INT if x['rank'] is None else x['rank'])
+
+    def extend(self, results: Iterable[SearchResult]):
+        if isinstance(results, SearchResultStore):
+            for k in self.__slots__:
+                getattr(self, k).extend(getattr(results, k))
+        else:
+            for x in results:
+                self.append(x)
+
+    def result(self, idx: int) -> SearchResult:
+        return SearchResult(
+            uid = self.uid[idx],
+            schema_name = self.schema_name[idx],
+            table_name = self.table_name[idx],
+            source_uid = self.source_uid[idx],
+            title = self.title[idx],
+            ref = self.ref[idx],
+            nikaya = self.nikaya[idx],
+            author = self.author[idx],
+            snippet = self.snippet[idx],
+            page_number = _int_or_none(self.page_number[idx]),
+            score = _float_or_none(self.score[idx]),
+            rank = _int_or_none(self.rank[idx]),
+        )
+
+    def score_at(self, idx: int) -> float:
+        """Score for ordering, None counts as 0."""
+        s = self.score[idx]
+        if s != s:
+            return 0.0
+        return s
+
+    def take(self, indexes: Iterable[int]) -> 'SearchResultStore':
+        """A new store with the items at the given indexes, in that order."""
+        indexes = list(indexes)
+        res = SearchResultStore()
+        for k in self.__slots__:
+            src = getattr(self, k)
+            getattr(res, k).extend(src[i] for i in indexes)
+        return res
+
+    def sorted_by_score(self, reverse: bool = True) -> 'SearchResultStore':
+        """Sort by score without creating the result dicts. The sort is stable."""
+        order = sorted(range(len(self)), key=self.score_at, reverse=reverse)
+        return self.take(order)
+
+    def to_list(self) -> List[SearchResult]:
+        return [self.result(i) for i in range(len(self))]
+
+    def __len__(self) -> int:
+        return len(self.uid)
+
+    def __bool__(self) -> bool:
+        return len(self.uid) > 0
+
+    @overload
+    def __getitem__(self, idx: int) -> SearchResult: ...
+
+    @overload
+    def __getitem__(self, idx: slice) -> List[SearchResult]: ...
+
+    def __getitem__(self, idx: Union[int, slice]) -> Union[SearchResult, List[SearchResult]]:
+        if isinstance(idx, slice):
+            return [self.result(i) for i in range(*idx.indices(len(self)))]
+
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError("SearchResultStore index out of range")
+
+        return self.result(idx)
+
+    def __iter__(self) -> Iterator[SearchResult]:
+        for i in range(len(self)):
+            yield self.result(i)
@@ -0,0 +1,123 @@
+import heapq
+from typing import Callable, List, Optional, Tuple
+
+from simsapa import SearchResult
+from simsapa.app.search.result_store import SearchResultStore
+
+# Returns the results page with the given page number, or an empty list when
+# there are no more pages.
+ResultsPageFn = Callable[[int], List[SearchResult]]
+
+# (negative score, stream index, position in stream, result)
+HeapItem = Tuple[float, int, int, SearchResult]
+
+def result_score(x: SearchResult) -> float:
+    return x['score'] or 0.0
+
+class ResultsStream:
+    """Iterates over the results of one query task (e.g. one language index),
+    requesting the next results page only when the previous one is used up."""
+
+    def __init__(self, page_fn: ResultsPageFn, max_pages: Optional[int] = None):
+        self._page_fn = page_fn
+        self._max_pages = max_pages
+        self._next_page_num = 0
+        self._page: List[SearchResult] = []
+        self._idx = 0
+        self._pos = 0
+        self.exhausted = False
+
+    def next(self) -> Optional[Tuple[int, SearchResult]]:
+        while self._idx >= len(self._page):
+            if self.exhausted:
+                return None
+
+            if self._max_pages is not None and self._next_page_num >= self._max_pages:
+                self.exhausted = True
+                return None
+
+            page = self._page_fn(self._next_page_num)
+            self._next_page_num += 1
+
+            if len(page) == 0:
+                self.exhausted = True
+                return None
+
+            # Tantivy returns the hits of a page by score, but the dictionary
+            # headword boosting can re-order items within the page.
+            self._page = sorted(page, key=result_score, reverse=True)
+            self._idx = 0
+
+        item = self._page[self._idx]
+        self._idx += 1
+        self._pos += 1
+
+        return (self._pos, item)
+
+    def pages_fetched(self) -> int:
+        return self._next_page_num
+
+class ResultsMerge:
+    """k-way merge of score-ordered results streams.
+
+    The streams are merged with a heap, so that a results page is collected
+    with O(page_len * log streams) steps, and each stream is only asked for as
+    many pages as are needed to fill the requested merged page.
+
+    Merged results are kept, so requesting an earlier page again, or the next
+    page, continues from where the merge has already got to.
+    """
+
+    def __init__(self, streams: List[ResultsStream], page_len: int = 20):
+        self._streams = streams
+        self._page_len = page_len
+        self._merged = SearchResultStore()
+        self._heap: List[HeapItem] = []
+        self._started = False
+
+    def _push_next(self, stream_idx: int):
+        r = self._streams[stream_idx].next()
+        if r is None:
+            return
+        (pos, item) = r
+        heapq.heappush(self._heap, (-result_score(item), stream_idx, pos, item))
+
+    def _start(self):
+        self._started = True
+        for idx in range(len(self._streams)):
+            self._push_next(idx)
+
+    def _fill_to(self, n: int):
+        if not self._started:
+            self._start()
+
+        while len(self._merged) < n and len(self._heap) > 0:
+            (_, stream_idx, _, item) = heapq.heappop(self._heap)
+            self._merged.append(item)
+            self._push_next(stream_idx)
+
+    def page(self, page_num: int) -> List[SearchResult]:
+        if page_num < 0:
+            page_num = 0
+
+        start = page_num * self._page_len
+
+        return self.results(start, start + self._page_len)
+
+    def results(self, start: int, end: int) -> List[SearchResult]:
+        """Merged results from start to end, for pages of any length."""
+        self._fill_to(end)
+
+        return self._merged[start:end]
+
+    def all_results(self) -> SearchResultStore:
+        while True:
+            n = len(self._merged)
+            self._fill_to(n + self._page_len)
+            if len(self._merged) == n:
+                break
+
+        return self._merged
+
+    def merged_count(self) -> int:
+        return len(self._merged)
@@ -2,22 +2,30 @@ import re
 from urllib.parse import parse_qs
 from typing import List, Optional
 
+import tantivy
+
 from PyQt6.QtCore import QUrl
 
 from sqlalchemy.orm.session import Session
 
-from simsapa import logger, QueryType, SuttaQuote, QuoteScope, QuoteScopeValues
+from simsapa import logger, DbSchemaName, QueryType, SuttaQuote, QuoteScope, QuoteScopeValues
 from simsapa.app.db import appdata_models as Am
 from simsapa.app.db import userdata_models as Um
+from simsapa.app.db.uid_helpers import starts_with
 from simsapa.app.helpers import consistent_niggahita, dhp_verse_to_chapter, expand_quote_to_pattern, is_complete_sutta_uid, normalize_sutta_ref, normalize_sutta_uid, remove_punct, snp_verse_to_uid, thag_verse_to_uid, thig_verse_to_uid
-from simsapa.app.types import SuttaQueriesInterface, USutta
+from simsapa.app.search.helpers import get_multi_ref_by_pts_ref
+from simsapa.app.search.tantivy_index import open_sutta_segments_index, sutta_segments_by_quote
+from simsapa.app.types import SuttaQueriesInterface, SuttaSegmentMatch, USutta
 
 from simsapa.layouts.gui_types import sutta_quote_from_url
 
+QUOTE_SUTTAS_BATCH_SIZE = 500
+
 class SuttaQueries(SuttaQueriesInterface):
     db_session: Session
     api_url: Optional[str] = None
     completion_cache: List[str] = []
+    _segments_index: Optional[tantivy.Index] = None
 
     def __init__(self, db_session: Session):
         self.db_session = db_session
@@ -129,13 +137,13 @@ class SuttaQueries(SuttaQueriesInterface):
 
                 res = self.db_session \
                     .query(Am.Sutta) \
-                    .filter(Am.Sutta.uid.like(f"{nikaya_uid}%")) \
+                    .filter(starts_with(Am.Sutta.uid_stem, nikaya_uid.lower())) \
                     .all()
                 results.extend(res)
 
                 res = self.db_session \
                     .query(Um.Sutta) \
-                    .filter(Um.Sutta.uid.like(f"{nikaya_uid}%")) \
+                    .filter(starts_with(Um.Sutta.uid_stem, nikaya_uid.lower())) \
                     .all()
                 results.extend(res)
 
@@ -162,15 +170,12 @@ class SuttaQueries(SuttaQueriesInterface):
         ref = normalize_sutta_ref(ref)
         ref = re.sub(r'pts *', '', ref)
 
-        multi_refs = self.db_session \
-            .query(Am.MultiRef) \
-            .filter(Am.MultiRef.ref.like(f"%{ref}%")) \
-            .all()
+        multi_ref = get_multi_ref_by_pts_ref(self.db_session, ref)
 
-        if len(multi_refs) == 0:
+        if multi_ref is None or len(multi_ref.suttas) == 0:
             return None
 
-        return multi_refs[0].suttas[0]
+        return multi_ref.suttas[0]
 
 
     def get_sutta_by_partial_uid(self,
@@ -216,13 +221,13 @@ class SuttaQueries(SuttaQueriesInterface):
 
         res = self.db_session \
             .query(Am.Sutta) \
-            .filter(Am.Sutta.uid.like(f"{sutta_ref}/%")) \
+            .filter(Am.Sutta.uid_stem == sutta_ref.lower()) \
             .all()
         results.extend(res)
 
         res = self.db_session \
             .query(Um.Sutta) \
-            .filter(Um.Sutta.uid.like(f"{sutta_ref}/%")) \
+            .filter(Um.Sutta.uid_stem == sutta_ref.lower()) \
             .all()
         results.extend(res)
 
@@ -236,13 +241,13 @@ class SuttaQueries(SuttaQueriesInterface):
 
                 res = self.db_session \
                     .query(Am.Sutta) \
-                    .filter(Am.Sutta.uid.like(f"{nikaya_uid}%")) \
+                    .filter(starts_with(Am.Sutta.uid_stem, nikaya_uid.lower())) \
                     .all()
                 results.extend(res)
 
                 res = self.db_session \
                     .query(Um.Sutta) \
-                    .filter(Um.Sutta.uid.like(f"{nikaya_uid}%")) \
+                    .filter(starts_with(Um.Sutta.uid_stem, nikaya_uid.lower())) \
                     .all()
                 results.extend(res)
 
@@ -262,11 +267,75 @@ class SuttaQueries(SuttaQueriesInterface):
         return res_sutta
 
 
+    def get_segments_by_quote(self, quote: Optional[str] = None, sutta: Optional[USutta] = None) -> List[SuttaSegmentMatch]:
+        """Bilara segments containing the quote, looked up in the segments index,
+        all of them or the ones of the sutta."""
+        if quote is None or len(quote) == 0:
+            return []
+
+        if self._segments_index is None:
+            self._segments_index = open_sutta_segments_index()
+
+        if self._segments_index is None:
+            return []
+
+        if sutta is None:
+            sutta_key = None
+        else:
+            sutta_key = f"{sutta.metadata.schema}:{sutta.uid}"
+
+        return sutta_segments_by_quote(self._segments_index, quote, sutta_key)
+
+    def get_quote_segment_id(self, sutta: USutta, quote: Optional[str] = None) -> Optional[str]:
+        """The first segment of the sutta containing the quote, to scroll to."""
+        res = self.get_segments_by_quote(quote, sutta)
+        if len(res) == 0:
+            return None
+
+        return res[0]['segment_id']
+
+    def _suttas_for_segments(self, matches: List[SuttaSegmentMatch]) -> List[USutta]:
+        am_uids = list(set([i['sutta_uid'] for i in matches if i['schema_name'] == DbSchemaName.AppData.value]))
+        um_uids = list(set([i['sutta_uid'] for i in matches if i['schema_name'] == DbSchemaName.UserData.value]))
+
+        # In the order of the full text query before the segments index, so
+        # that a quote link opens the same sutta.
+        results: List[USutta] = []
+
+        for n in range(0, len(am_uids), QUOTE_SUTTAS_BATCH_SIZE):
+            chunk = am_uids[n:n+QUOTE_SUTTAS_BATCH_SIZE]
+            res = self.db_session \
+                .query(Am.Sutta) \
+                .filter(Am.Sutta.uid.in_(chunk)) \
+                .all()
+            results.extend(res)
+
+        for n in range(0, len(um_uids), QUOTE_SUTTAS_BATCH_SIZE):
+            chunk = um_uids[n:n+QUOTE_SUTTAS_BATCH_SIZE]
+            res = self.db_session \
+                .query(Um.Sutta) \
+                .filter(Um.Sutta.uid.in_(chunk)) \
+                .all()
+            results.extend(res)
+
+        results.sort(key=lambda x: (x.metadata.schema != DbSchemaName.AppData.value, x.id))
+
+        return results
+
     def get_suttas_by_quote(self, highlight_text: Optional[str] = None) -> List[USutta]:
         logger.info(f"get_suttas_by_quote(): {highlight_text}")
         if highlight_text is None or len(highlight_text) == 0:
             return []
 
+        matches = self.get_segments_by_quote(highlight_text)
+        if len(matches) > 0:
+            segment_suttas = self._suttas_for_segments(matches)
+            if len(segment_suttas) > 0:
+                return segment_suttas
+
+        # Not found in a single segment, e.g. the quote spans segments, or the
+        # sutta has no bilara segments. Search in the complete sutta text.
+
         results: List[USutta] = []
 
         res = self.db_session \
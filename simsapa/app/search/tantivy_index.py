@@ -1,5 +1,8 @@
+import json
+import re
 import shutil
-from typing import Dict, List, Optional, Union, Tuple
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Union, Tuple
 import math
 
 import tantivy
@@ -7,13 +10,14 @@ import tantivy
 from sqlalchemy.sql import func
 from sqlalchemy.orm.session import Session
 
-from simsapa import DICT_WORDS_INDEX_DIR, INDEX_WRITER_MEMORY_MB, LOG_PERCENT_PROGRESS, SUTTAS_INDEX_DIR, DbSchemaName, SearchResult, logger
+from simsapa import DICT_WORDS_INDEX_DIR, INDEX_WRITER_MEMORY_MB, LOG_PERCENT_PROGRESS, SUTTA_SEGMENTS_INDEX_DIR, SUTTAS_INDEX_DIR, DbSchemaName, SearchResult, logger
 from simsapa.app.helpers import compact_rich_text, compact_plain_text, consistent_niggahita, query_text_to_uid_field_query
 from simsapa.app.db import appdata_models as Am
 from simsapa.app.db import userdata_models as Um
 from simsapa.app.db import dpd_models as Dpd
+from simsapa.app.search.result_store import SearchResultStore
 from simsapa.app.search.helpers import get_dict_word_languages, get_sutta_languages, is_index_empty, search_compact_plain_snippet, search_oneline, unique_search_results
-from simsapa.app.types import SearchArea, SearchParams
+from simsapa.app.types import DpdFilters, SearchArea, SearchParams, SuttaSegmentMatch
 
 from simsapa.app.dpd_render import pali_root_index_plaintext, pali_word_index_plaintext
 
@@ -120,11 +124,224 @@ def dict_words_index_schema(content_tokenizer_name: str = "en_stem_fold") -> tan
     builder.add_text_field("word",        stored=True, tokenizer_name="simple_fold")
     builder.add_text_field("synonyms",    stored=True, tokenizer_name="simple_fold")
     builder.add_text_field("content",     stored=True, tokenizer_name=tk)
+    # Structured DPD headword attributes, indexed as exact terms for filtering.
+    builder.add_text_field("pos",         stored=False, tokenizer_name="raw")
+    builder.add_text_field("root_key",    stored=False, tokenizer_name="raw")
+    builder.add_text_field("family_keys", stored=False, tokenizer_name="raw")
+    builder.add_text_field("pattern",     stored=False, tokenizer_name="raw")
 
     schema = builder.build()
 
     return schema
 
+def sutta_segments_index_schema() -> tantivy.Schema:
+    builder = tantivy.SchemaBuilder()
+    builder.add_text_field("index_key",   stored=True, tokenizer_name="raw")
+    builder.add_text_field("schema_name", stored=True, tokenizer_name="raw")
+    builder.add_text_field("sutta_uid",   stored=True, tokenizer_name="raw")
+    builder.add_text_field("segment_id",  stored=True, tokenizer_name="raw")
+    # schema_name:sutta_uid, to delete the segments of a sutta before re-indexing it.
+    builder.add_text_field("sutta_key",   stored=False, tokenizer_name="raw")
+    # Segment text normalized with sutta_segment_text(), for phrase queries.
+    builder.add_text_field("content",     stored=False, tokenizer_name="simple_fold")
+
+    schema = builder.build()
+
+    return schema
+
+def sutta_segment_text(text: str) -> str:
+    """The normalized text of a segment, or of a quote to find in the segments."""
+    return compact_rich_text(text)
+
+def open_sutta_segments_index() -> Optional[tantivy.Index]:
+    """Open the segments index for reading, if it has been created."""
+    if not SUTTA_SEGMENTS_INDEX_DIR.joinpath("meta.json").exists():
+        return None
+
+    try:
+        return tantivy.Index(sutta_segments_index_schema(),
+                             path=str(SUTTA_SEGMENTS_INDEX_DIR),
+                             reuse=True)
+
+    except Exception as e:
+        logger.error(f"Can't open sutta segments index: {e}")
+        return None
+
+def sutta_segments_by_quote(ix: tantivy.Index,
+                            quote: str,
+                            sutta_key: Optional[str] = None,
+                            limit: Optional[int] = None) -> List[SuttaSegmentMatch]:
+    """Bilara segments which contain the quote, with a phrase query. sutta_key (schema_name:sutta_uid) restricts them
+    to one sutta. Without a limit, all the matching segments are returned."""
+    # Normalized the same way as the indexed segment text.
+    q = sutta_segment_text(quote).replace('"', '')
+    if len(q) == 0:
+        return []
+
+    query_text = f'content:"{q}"'
+    if sutta_key is not None:
+        query_text = f'+sutta_key:"{sutta_key}" +{query_text}'
+
+    try:
+        query = ix.parse_query(query_text, ['content'])
+    except ValueError as e:
+        logger.error(f"sutta_segments_by_quote(): {e}")
+        return []
+
+    searcher = ix.searcher()
+    if limit is None:
+        limit = max(1, searcher.num_docs)
+
+    res = searcher.search(query, limit)
+
+    results: List[SuttaSegmentMatch] = []
+    for (_, doc_address) in res.hits:
+        doc = searcher.doc(doc_address)
+        results.append(SuttaSegmentMatch(
+            schema_name = doc['schema_name'][0],
+            sutta_uid = doc['sutta_uid'][0],
+            segment_id = doc['segment_id'][0],
+        ))
+
+    # The segments of a sutta in the order of the text, the first one is the
+    # scroll target.
+    results.sort(key=lambda x: (x['schema_name'], x['sutta_uid'], segment_id_sort_key(x['segment_id'])))
+
+    return results
+
+def segment_id_sort_key(segment_id: str) -> str:
+    """Sorts bilara segment ids in the text order, e.g. mn1:1.2 before mn1:1.10"""
+    return re.sub(r'[0-9]+', lambda m: m.group(0).zfill(8), segment_id)
+
+def dpd_headword_filter_values(w: Dpd.DpdHeadwords) -> Dict[str, List[str]]:
+    """Values of the DPD filter fields in dict_words_index_schema() for a headword."""
+    family_keys = [w.family_root, w.family_word]
+    family_keys.extend(w.family_compound_list)
+    family_keys.extend(w.family_idioms_list)
+    family_keys.extend(w.family_set_list)
+
+    return {
+        'pos': [w.pos] if w.pos else [],
+        'root_key': [w.root_key] if w.root_key else [],
+        'family_keys': [i for i in family_keys if i],
+        'pattern': [w.pattern] if w.pattern else [],
+    }
+
+def dpd_filters_query(filters: DpdFilters) -> str:
+    """Query expression with a must term clause for each DPD filter value.
+
+    E.g. +pos:"masc" +root_key:"√kar 1"
+    """
+    fields = [('pos', filters['pos']),
+              ('root_key', filters['root_key']),
+              ('family_keys', filters['family_key']),
+              ('pattern', filters['pattern'])]
+
+    clauses = []
+    for field, value in fields:
+        if value is None or value.strip() == "":
+            continue
+        # Quoted, so that values with spaces are matched as one raw term.
+        value = value.strip().replace('"', '\\"')
+        clauses.append(f'+{field}:"{value}"')
+
+    return " ".join(clauses)
+
+def with_dpd_filters_query(query_string: str,
+                           query_text: str,
+                           source_query: str,
+                           filters: Optional[DpdFilters],
+                           is_regex_or_fuzzy = False) -> str:
+    """Add the must clauses of the DPD filters to a dict_words query. With an
+    empty query text, the query is the filters and the source filter only, e.g.
+    all masc nouns of a root in a dictionary."""
+    if filters is None:
+        return query_string
+
+    filters_query = dpd_filters_query(filters)
+
+    if len(filters_query) == 0:
+        return query_string
+
+    if is_regex_or_fuzzy:
+        logger.warn("DPD filters are not applied to regex or fuzzy queries")
+        return query_string
+
+    if len(query_text) == 0:
+        return filters_query + source_query
+
+    return f"{query_string} {filters_query}"
+
+def is_outdated_index_schema(index_path: Path, field_names: List[str]) -> bool:
+    """True if the index at the path was created with different fields, e.g.
+    a dict_words index from before the DPD filter fields."""
+    meta_path = index_path.joinpath("meta.json")
+    if not meta_path.exists():
+        return False
+
+    with open(meta_path, 'r') as f:
+        meta = json.load(f)
+
+    return sorted([i['name'] for i in meta.get('schema', [])]) != sorted(field_names)
+
+def index_sutta_segments(ix: tantivy.Index,
+                         db_schema_name: str,
+                         suttas: Iterable[Tuple[str, Optional[str]]]):
+    """Add one document per bilara segment, from (uid, content_json) items.
+    The earlier segments of the suttas are replaced."""
+    logger.info(f"index_sutta_segments() schema: {db_schema_name}")
+
+    try:
+        writer = ix.writer(INDEX_WRITER_MEMORY_MB*1024*1024)
+
+        for (uid, content_json) in suttas:
+            sutta_key = f"{db_schema_name}:{uid}"
+            writer.delete_documents("sutta_key", sutta_key)
+
+            if content_json is None or content_json == '':
+                continue
+
+            segments: Dict[str, str] = json.loads(content_json)
+
+            for segment_id, text in segments.items():
+                content = sutta_segment_text(text)
+                if len(content) == 0:
+                    continue
+
+                writer.add_document(tantivy.Document(
+                    index_key = f"{sutta_key}:{segment_id}",
+                    schema_name = db_schema_name,
+                    sutta_uid = uid,
+                    segment_id = segment_id,
+                    sutta_key = sutta_key,
+                    content = content,
+                ))
+
+        logger.info("writer.commit()")
+        writer.commit()
+
+    except Exception as e:
+        logger.error(f"Can't index sutta segments: {e}")
+
+def open_or_replace_index(schema: tantivy.Schema, index_path: Path) -> tantivy.Index:
+    """Open the index at the path. An index created with an earlier schema,
+    e.g. a dict_words index without the DPD filter fields, is replaced with an
+    empty index, which has_empty_index() reports for re-indexing. Any other
+    error is raised, and the index files are not removed."""
+    try:
+        return tantivy.Index(schema, path=str(index_path), reuse=True)
+
+    except ValueError as e:
+        if not is_outdated_index_schema(index_path, tantivy.Index(schema).schema.field_names()):
+            logger.error(f"Can't open the index at {index_path}: {e}")
+            raise e
+
+        logger.warn(f"Removing the index with an earlier schema at {index_path}: {e}")
+        shutil.rmtree(index_path)
+        index_path.mkdir()
+
+        return tantivy.Index(schema, path=str(index_path), reuse=True)
+
 class TantivySearchQuery:
     ix: tantivy.Index
     searcher: tantivy.Searcher
@@ -360,7 +577,8 @@ class TantivySearchQuery:
                   source: Optional[str] = None,
                   source_include = True,
                   enable_regex = False,
-                  fuzzy_distance = 0):
+                  fuzzy_distance = 0,
+                  dpd_filters: Optional[DpdFilters] = None):
         logger.info("TantivySearchQuery::new_query()")
 
         self.ix.reload()
@@ -388,13 +606,15 @@ class TantivySearchQuery:
         # expression. It is much faster, and easier to paginate, when tantivy
         # returns the already filtered top-n results, then filtering a longer
         # list in Python.
+        source_query = ""
         if source is not None \
            and not enable_regex \
            and not fuzzy_distance > 0 \
            and (source != "Sources" or source != "Dictionaries"):
 
             sign = '+' if source_include else '-'
-            query_string += f" {sign}source_uid:{source.lower()}"
+            source_query = f" {sign}source_uid:{source.lower()}"
+            query_string += source_query
 
         if self.is_sutta_index():
             # Only search in content. Title search skews results, i.e. 'buddha'
@@ -437,6 +657,12 @@ class TantivySearchQuery:
             # A single word query with a dictionary filter now looks like:
             # +vitakkaya +source_uid:dpd word:vitakkaya
 
+            query_string = with_dpd_filters_query(query_string,
+                                                  self.query_text_orig,
+                                                  source_query,
+                                                  dpd_filters,
+                                                  enable_regex or fuzzy_distance > 0)
+
             logger.info(f"query_string: {query_string}")
 
             try:
@@ -474,18 +700,18 @@ class TantivySearchQuery:
         self.highlighted_results_page(0)
         return self.hits_count
 
-    def get_all_results(self) -> List[SearchResult]:
+    def get_all_results(self) -> SearchResultStore:
         # If we already queried, and there were no hits.
         hits_count = self.get_hits_count()
         if hits_count is not None and hits_count == 0:
-            return []
+            return SearchResultStore()
 
         # hits_count None does not mean no results. In the case of filtered
         # regex results, we may not know the total hits count.
 
         if self.hits_count is None:
             page_num = 0
-            res = []
+            res = SearchResultStore()
 
             while True:
                 r = self.highlighted_results_page(page_num)
@@ -498,7 +724,7 @@ class TantivySearchQuery:
             page_num = 0
             total_pages = math.ceil(self.hits_count / self.page_len)
 
-            res = []
+            res = SearchResultStore()
 
             # Example: for a 108 results with page_len 20, there will be 6
             # total_pages, indexed as page_num 0 to 5.
@@ -511,6 +737,7 @@ class TantivySearchQuery:
 class TantivySearchIndexes:
     suttas_lang_index: Dict[str, tantivy.Index] = dict()
     dict_words_lang_index: Dict[str, tantivy.Index] = dict()
+    sutta_segments_index: Optional[tantivy.Index] = None
 
     def __init__(self, db_session: Session, remove_if_exists: bool = False):
         self.db_session = db_session
@@ -561,10 +788,11 @@ class TantivySearchIndexes:
 
     def has_empty_index(self) -> bool:
         """
-        The general suttas and dict_words index must exist. Additional lang
-        indexes don't exist if the user hasn't added them.
+        The general suttas and dict_words index and the sutta segments index
+        must exist. Additional lang indexes don't exist if the user hasn't added them.
 
-        If they exist, they must have greater than 0 documents.
+        If they exist, they must have greater than 0 documents. A dict_words
+        index replaced by open_or_replace_index() is empty until re-indexed.
         """
 
         for i in ['en', 'pli']:
@@ -575,7 +803,12 @@ class TantivySearchIndexes:
 
         if 'en' not in self.dict_words_lang_index.keys():
             return True
-        if is_index_empty(self.dict_words_lang_index['en']):
+        for ix in self.dict_words_lang_index.values():
+            if is_index_empty(ix):
+                return True
+
+        # Created empty when it didn't exist yet, e.g. after an upgrade.
+        if self.sutta_segments_index is None or is_index_empty(self.sutta_segments_index):
             return True
 
         # If an index exists, it must have greater than 0 documents.
@@ -585,10 +818,6 @@ class TantivySearchIndexes:
         #     if ix.searcher().num_docs == 0:
         #         return True
 
-        # for ix in [i for i in self.dict_words_lang_index.values() if i.exists()]:
-        #     if ix.searcher().num_docs == 0:
-        #         return True
-
         return False
 
     def index_all(self, only_if_empty: bool = False):
@@ -600,6 +829,8 @@ class TantivySearchIndexes:
         for lang in self.dict_words_lang_index.keys():
             self.index_all_dict_words_lang(lang, only_if_empty)
 
+        self.index_all_sutta_segments(only_if_empty)
+
     def index_all_suttas_lang(self, lang: str, only_if_empty: bool = False):
         logger.info(f"index_all_suttas_lang(): {lang}")
         if lang not in self.suttas_lang_index.keys():
@@ -658,8 +889,30 @@ class TantivySearchIndexes:
 
                 self.index_dict_words(ix, DbSchemaName.Dpd.value, words)
 
+    def index_all_sutta_segments(self, only_if_empty: bool = False):
+        logger.info("index_all_sutta_segments()")
+        ix = self.sutta_segments_index
+        if ix is None:
+            return
+
+        if (not only_if_empty) or (only_if_empty and is_index_empty(ix)):
+            logger.info("Indexing sutta segments ...")
+
+            # Only the columns needed, not the complete sutta records.
+            res = self.db_session \
+                .query(Am.Sutta.uid, Am.Sutta.content_json) \
+                .filter(Am.Sutta.content_json != '') \
+                .all()
+            index_sutta_segments(ix, DbSchemaName.AppData.value, [(r.uid, r.content_json) for r in res])
+
+            res = self.db_session \
+                .query(Um.Sutta.uid, Um.Sutta.content_json) \
+                .filter(Um.Sutta.content_json != '') \
+                .all()
+            index_sutta_segments(ix, DbSchemaName.UserData.value, [(r.uid, r.content_json) for r in res])
+
     def open_all(self, remove_if_exists: bool = False):
-        for p in [SUTTAS_INDEX_DIR, DICT_WORDS_INDEX_DIR]:
+        for p in [SUTTAS_INDEX_DIR, DICT_WORDS_INDEX_DIR, SUTTA_SEGMENTS_INDEX_DIR]:
             if remove_if_exists and p.exists():
                 shutil.rmtree(p)
 
@@ -694,11 +947,9 @@ class TantivySearchIndexes:
                 lang_index_path.mkdir()
 
             # Always index dictionaries with Pali stemmer, because Pali queries are the most likely.
-            self.dict_words_lang_index[lang] = tantivy.Index(
-                dict_words_index_schema("pli_stem_fold"),
-                path=str(lang_index_path),
-                reuse=True,
-            )
+            self.dict_words_lang_index[lang] = open_or_replace_index(dict_words_index_schema("pli_stem_fold"), lang_index_path)
+
+        self.sutta_segments_index = open_or_replace_index(sutta_segments_index_schema(), SUTTA_SEGMENTS_INDEX_DIR)
 
     def clear_all(self):
         # FIXME
@@ -806,6 +1057,11 @@ class TantivySearchIndexes:
         else:
             logger.warn(f"Index is not in suttas_lang_index: {lang}")
 
+        if self.sutta_segments_index is not None:
+            index_sutta_segments(self.sutta_segments_index,
+                                 db_schema_name,
+                                 [(str(i.uid), i.content_json) for i in suttas])
+
     def index_dict_words(self, ix: tantivy.Index, db_schema_name: str, words: List[UDictWord]):
         logger.info(f"index_dict_words() len: {len(words)}")
 
@@ -863,7 +1119,7 @@ class TantivySearchIndexes:
                     synonyms = i.synonyms
                     content = f"{content} {i.synonyms}"
 
-                writer.add_document(tantivy.Document(
+                doc = tantivy.Document(
                     index_key = f"{db_schema_name}:{i.__tablename__}:{i.uid}",
                     schema_name = db_schema_name,
                     table_name = i.__tablename__,
@@ -874,7 +1130,14 @@ class TantivySearchIndexes:
                     word = i.word,
                     synonyms = synonyms,
                     content = content,
-                ))
+                )
+
+                if isinstance(i, Dpd.DpdHeadwords):
+                    for field, values in dpd_headword_filter_values(i).items():
+                        for v in values:
+                            doc.add_text(field, v)
+
+                writer.add_document(doc)
                 i.indexed_at = func.now() # type: ignore
 
             self.db_session.commit()
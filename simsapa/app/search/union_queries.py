@@ -0,0 +1,118 @@
+"""Queries over a table which exists in both appdata and userdata, as one
+relation (UNION ALL) with a schema_name column.
+
+The rows are selected with one query, and a results page with one ORDER BY,
+LIMIT and OFFSET over both databases, instead of querying Am and Um separately
+and merging the results in Python.
+
+Returns Row objects with the selected columns, not ORM instances.
+"""
+
+from typing import Any, Callable, List, Optional, Tuple, TypeVar
+
+from sqlalchemy import func, literal, select, union_all
+from sqlalchemy.engine import Row
+from sqlalchemy.orm.session import Session
+from sqlalchemy.sql.expression import CompoundSelect
+
+from simsapa import DbSchemaName
+from simsapa.app.db import appdata_models as Am
+from simsapa.app.db import userdata_models as Um
+
+# Returns the filter clauses for the models module of one schema, e.g.
+# lambda m: [m.Sutta.source_uid == 'ms']
+WhereFn = Callable[[Any], List[Any]]
+
+T = TypeVar('T')
+
+# The number of items in a part of a results list, and a function which
+# returns the items of the part from offset, up to limit.
+SlicedPart = Tuple[int, Callable[[int, int], List[T]]]
+
+SCHEMA_MODELS = [
+    (DbSchemaName.AppData.value, Am),
+    (DbSchemaName.UserData.value, Um),
+]
+
+def union_select(model_name: str, columns: List[str], where: Optional[WhereFn] = None) -> CompoundSelect:
+    """
+    SELECT 'appdata' AS schema_name, <columns> FROM appdata.<table> WHERE ...
+    UNION ALL
+    SELECT 'userdata' AS schema_name, <columns> FROM userdata.<table> WHERE ...
+    """
+    selects = []
+
+    for (schema_name, m) in SCHEMA_MODELS:
+        model = getattr(m, model_name)
+        cols = [literal(schema_name).label('schema_name')] + [getattr(model, c).label(c) for c in columns]
+
+        q = select(*cols)
+        if where is not None:
+            q = q.where(*where(m))
+
+        selects.append(q)
+
+    return union_all(*selects)
+
+def union_rows(db_session: Session,
+               model_name: str,
+               columns: List[str],
+               where: Optional[WhereFn] = None,
+               order_by: Optional[List[str]] = None) -> List[Row]:
+    u = union_select(model_name, columns, where).subquery()
+
+    q = select(u)
+    if order_by is not None:
+        q = q.order_by(*[u.c[c] for c in order_by])
+
+    return list(db_session.execute(q).all())
+
+def union_count(db_session: Session, model_name: str, where: Optional[WhereFn] = None) -> int:
+    u = union_select(model_name, ['id'], where).subquery()
+    return db_session.execute(select(func.count()).select_from(u)).scalar_one()
+
+def union_page(db_session: Session,
+               model_name: str,
+               columns: List[str],
+               where: Optional[WhereFn],
+               order_by: List[str],
+               page_num: int,
+               page_len: int) -> List[Row]:
+    """One page of rows from both schemas. order_by should identify the rows
+    uniquely (e.g. end with schema_name and id), so that pages don't overlap."""
+    return union_slice(db_session, model_name, columns, where, order_by, page_num * page_len, page_len)
+
+def union_slice(db_session: Session,
+                model_name: str,
+                columns: List[str],
+                where: Optional[WhereFn],
+                order_by: List[str],
+                offset: int,
+                limit: int) -> List[Row]:
+    u = union_select(model_name, columns, where).subquery()
+
+    q = select(u) \
+        .order_by(*[u.c[c] for c in order_by]) \
+        .offset(offset) \
+        .limit(limit)
+
+    return list(db_session.execute(q).all())
+
+def parts_slice(parts: List[SlicedPart[T]], offset: int, limit: int) -> List[T]:
+    """Items from offset up to limit of the parts as one list, e.g. a results
+    page of dict_words, followed by DPD headwords and roots. Only the parts
+    which overlap the slice are queried."""
+    res: List[T] = []
+
+    for (count, items_fn) in parts:
+        if len(res) >= limit:
+            break
+
+        if offset >= count:
+            offset -= count
+            continue
+
+        res.extend(items_fn(offset, limit - len(res)))
+        offset = 0
+
+    return res
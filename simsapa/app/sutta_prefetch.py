@@ -0,0 +1,99 @@
+"""Prefetch of the suttas next to the one being read.
+
+After a sutta is opened, the previous and next suttas in reading order and
+the Pali sutta of a translation are rendered on a worker thread into the
+sutta render cache, see sutta_render_cache.py. Opening them is then a cache
+read. The memory used is bounded by the size of the render cache.
+"""
+
+from typing import Callable, List, Optional
+import re
+
+from sqlalchemy.orm.session import Session
+
+from simsapa import DbSchemaName, logger
+from simsapa.app.db import appdata_models as Am
+from simsapa.app.db import userdata_models as Um
+from simsapa.app.db_session import db_read_session
+from simsapa.app.export_helpers import render_sutta_body
+from simsapa.app.types import USutta
+from simsapa.app.app_data import AppData
+
+def adjacent_uid_stems(uid_stem: str) -> List[str]:
+    """The uid stems before and after, by the last number of the stem.
+
+    'mn12' -> ['mn11', 'mn13'], 'sn30.7-16' -> ['sn30.6', 'sn30.17']
+    """
+    m = re.match(r'^(.*?)(\d+)(?:-(\d+))?$', uid_stem)
+    if m is None:
+        return []
+
+    prefix = m.group(1)
+    start = int(m.group(2))
+    end = int(m.group(3)) if m.group(3) is not None else start
+
+    res = []
+    if start > 1:
+        res.append(f"{prefix}{start - 1}")
+    res.append(f"{prefix}{end + 1}")
+
+    return res
+
+def adjacent_suttas(db_session: Session, sutta: USutta) -> List[USutta]:
+    """The previous and next suttas of the same language and source, by
+    order_index when the db has it, otherwise by the uid numbering."""
+    if sutta.metadata.schema == DbSchemaName.AppData.value:
+        model = Am.Sutta
+    else:
+        model = Um.Sutta
+
+    res: List[USutta] = []
+
+    if sutta.order_index is not None:
+        q = db_session \
+            .query(model) \
+            .filter(model.language == sutta.language) \
+            .filter(model.source_uid == sutta.source_uid)
+
+        for r in [q.filter(model.order_index < sutta.order_index).order_by(model.order_index.desc()).first(),
+                  q.filter(model.order_index > sutta.order_index).order_by(model.order_index.asc()).first()]:
+            if r is not None:
+                res.append(r)
+
+    elif sutta.uid_stem is not None:
+        uids = [f"{stem}/{sutta.language}/{sutta.source_uid}" for stem in adjacent_uid_stems(sutta.uid_stem)]
+
+        r = db_session \
+            .query(model) \
+            .filter(model.uid.in_(uids)) \
+            .all()
+        res.extend(r)
+
+    return res
+
+def prefetch_suttas(app_data: AppData, schema: str, uid: str, is_cancelled: Callable[[], bool]):
+    """Render the suttas next to the sutta into the render cache. Called from a worker thread."""
+    if schema == DbSchemaName.AppData.value:
+        model = Am.Sutta
+    else:
+        model = Um.Sutta
+
+    with db_read_session() as db_session:
+        sutta: Optional[USutta] = db_session.query(model).filter(model.uid == uid).first()
+        if sutta is None:
+            return
+
+        items = adjacent_suttas(db_session, sutta)
+
+        pali_sutta = app_data.get_pali_for_translated(sutta, db_session)
+        if pali_sutta is not None:
+            items.append(pali_sutta)
+
+        for i in items:
+            if is_cancelled():
+                return
+
+            try:
+                render_sutta_body(app_data, i, db_session)
+            except Exception as e:
+                logger.error(f"prefetch_suttas(): {i.uid}: {e}")
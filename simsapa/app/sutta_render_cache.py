@@ -0,0 +1,79 @@
+"""Cache of the rendered sutta bodies, see render_sutta_content().
+
+The cached body is the sutta content html, before it is wrapped in the page.
+The page settings (font size, max width, bookmarks, quote highlight) are added
+after it is read from the cache.
+
+The entries are keyed by the sutta, a checksum of its content, and the
+settings which change the body. The store is versioned by the app and appdata
+database versions. Importing or removing suttas clears the cache, because a
+new Pali sutta changes the line by line rendering of its translations.
+
+The segments of the Pali suttas are kept in memory for the line by line view,
+and shared by the translations of the same sutta. The link previews are kept
+in memory by URL, see preview_render.py. They are also cleared when
+dictionary words or the DPD change.
+"""
+
+from typing import Optional
+from binascii import crc32
+import threading
+
+from simsapa import APP_DB_PATH, PALI_SEGMENTS_CACHE_SIZE, PREVIEW_CACHE_SIZE, SIMSAPA_APP_VERSION, SUTTA_RENDER_CACHE_PATH, SUTTA_RENDER_CACHE_SIZE, logger
+from simsapa.app.render_cache import RenderCache
+from simsapa.app.types import USutta
+
+def sutta_content_version(sutta: USutta) -> str:
+    """Changes when the sutta's content is changed."""
+    content = f"{sutta.content_json or ''}{sutta.content_json_tmpl or ''}{sutta.content_html or ''}{sutta.content_plain or ''}"
+    return f"{sutta.updated_at or sutta.created_at}-{crc32(content.encode('utf-8')):08x}"
+
+def sutta_render_cache_key(sutta: USutta, line_by_line: bool, show_variants: bool, show_glosses: bool) -> str:
+    """'appdata/mn2/en/sujato/<version>/lbl,var,gloss'"""
+    flags = ",".join([k for k, v in [('lbl', line_by_line), ('var', show_variants), ('gloss', show_glosses)] if v])
+    return f"{sutta.metadata.schema}/{sutta.uid}/{sutta_content_version(sutta)}/{flags}"
+
+_SUTTA_RENDER_CACHE: Optional[RenderCache] = None
+_SUTTA_RENDER_CACHE_LOCK = threading.Lock()
+
+def sutta_render_cache() -> RenderCache:
+    global _SUTTA_RENDER_CACHE
+    with _SUTTA_RENDER_CACHE_LOCK:
+        if _SUTTA_RENDER_CACHE is None:
+            from simsapa.app.db_session import get_db_version
+
+            version = f"{SIMSAPA_APP_VERSION}/{get_db_version(APP_DB_PATH)}"
+            logger.info(f"sutta_render_cache(): {version}")
+
+            _SUTTA_RENDER_CACHE = RenderCache(version, SUTTA_RENDER_CACHE_PATH, SUTTA_RENDER_CACHE_SIZE)
+
+        return _SUTTA_RENDER_CACHE
+
+_PALI_SEGMENTS_CACHE: Optional[RenderCache] = None
+
+def pali_segments_cache() -> RenderCache:
+    """In memory only, keyed with sutta_render_cache_key()."""
+    global _PALI_SEGMENTS_CACHE
+    with _SUTTA_RENDER_CACHE_LOCK:
+        if _PALI_SEGMENTS_CACHE is None:
+            _PALI_SEGMENTS_CACHE = RenderCache(SIMSAPA_APP_VERSION, None, PALI_SEGMENTS_CACHE_SIZE)
+
+        return _PALI_SEGMENTS_CACHE
+
+_PREVIEW_CACHE: Optional[RenderCache] = None
+
+def preview_cache() -> RenderCache:
+    """In memory only, keyed with preview_render.preview_cache_key()."""
+    global _PREVIEW_CACHE
+    with _SUTTA_RENDER_CACHE_LOCK:
+        if _PREVIEW_CACHE is None:
+            _PREVIEW_CACHE = RenderCache(SIMSAPA_APP_VERSION, None, PREVIEW_CACHE_SIZE)
+
+        return _PREVIEW_CACHE
+
+def clear_sutta_render_caches():
+    """After suttas are imported or removed. A new Pali sutta changes the line
+    by line rendering of its translations, and the previews of the links."""
+    sutta_render_cache().clear()
+    pali_segments_cache().clear()
+    preview_cache().clear()
@@ -81,6 +81,20 @@ class SearchParams(TypedDict):
     enable_regex: bool
     fuzzy_distance: int
 
+class DpdFilters(TypedDict):
+    """Structured DPD headword attributes to filter dictionary results with.
+    None means no filter on that attribute."""
+    pos: Optional[str]
+    root_key: Optional[str]
+    family_key: Optional[str]
+    pattern: Optional[str]
+
+class SuttaSegmentMatch(TypedDict):
+    schema_name: str
+    sutta_uid: str
+    # Bilara segment id, e.g. sn56.11:1.3
+    segment_id: str
+
 class SuttaPanelParams(TypedDict):
     sutta_uid: str
     query_text: str
@@ -115,6 +129,7 @@ class DictionaryQueriesInterface:
     words_to_html_page: Callable
     render_html_page: Callable
     get_word_html: Callable
+    get_words_html: Callable
     dict_word_from_result: Callable[[SearchResult], Optional[UDictWord]]
 
 class GraphRequest(TypedDict):
@@ -312,8 +312,9 @@ class AppWindows:
 
         view.open_new.connect(partial(self._new_sutta_from_preview))
 
-        if view.render_hover_data():
-            view._do_show(check_settings=False)
+        show_fn = partial(view._do_show, check_settings=False)
+        if view.render_hover_data(show_fn=show_fn):
+            show_fn()
 
     def _new_sutta_from_preview(self, href: Optional[str] = None):
         if href is None and self._preview_window._hover_data is not None:
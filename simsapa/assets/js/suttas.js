@@ -202,7 +202,7 @@ function get_bookmarks_and_highlight() {
     }
 }
 
-function highlight_and_scroll_to (highlight_text) {
+function highlight_and_scroll_to (highlight_text, segment_id = null) {
     /*
       This doesn't work on text which spans across HTML tags, such as:
 
@@ -215,16 +215,31 @@ function highlight_and_scroll_to (highlight_text) {
 
      The browser's Find function can find these text, so when the HTML didn't
      match, send a signal to trigger Find.
+
+     segment_id is the bilara segment which contains the quote. The highlight
+     is added in that segment, and it is scrolled to even when the HTML didn't
+     match.
     */
 
     let s = expand_quote_to_pattern(highlight_text);
     const regex = new RegExp(s, 'gi');
 
+    let segment = null;
+    if (segment_id !== null) {
+        segment = document.querySelector('#ssp_main [data-tmpl-key="' + segment_id + '"]');
+    }
+
     let main = document.querySelector('#ssp_main');
+    if (segment !== null && segment.innerHTML.match(regex) !== null) {
+        main = segment;
+    }
     let main_html = main.innerHTML;
 
     const m = main_html.match(regex);
     if (m == null) {
+        if (segment !== null) {
+            segment.scrollIntoView({behavior: "auto", block: "center", inline: "nearest"});
+        }
         // When the HTML didn't match, send a signal to trigger the Find Panel.
         if (document.qt_channel !== null) {
             document.qt_channel.objects.helper.emit_show_find_panel(highlight_text);
@@ -1,9 +1,9 @@
-import sys, shutil
+import os, sys, shutil
 from pathlib import Path
 from typing import Optional
 import typer
 
-from simsapa import DPD_DB_PATH, SIMSAPA_API_DEFAULT_PORT, logger, QueryType
+from simsapa import API_SERVER_WORKERS, DPD_DB_PATH, SIMSAPA_API_DEFAULT_PORT, logger, QueryType
 from simsapa.app.types import SearchMode, SearchParams
 
 app = typer.Typer()
@@ -22,6 +22,12 @@ def gui(url: Optional[str] = None,
     from simsapa.gui import start
     start(port=port, url=url, window_type_name=window_type, show_window=show_window, enable_tray_icon=tray_icon)
 
+@app.command()
+def serve(port: int = SIMSAPA_API_DEFAULT_PORT, workers: int = API_SERVER_WORKERS):
+    """Start the API server without the GUI."""
+    from simsapa.app.api import start_headless_server
+    start_headless_server(port, workers)
+
 @app.command()
 def query(query_type: QueryType, query: str, print_titles: bool = True, print_count: bool = False):
     """Query the database."""
@@ -145,6 +151,15 @@ def index_suttas_lang(lang: str):
     search_indexes = TantivySearchIndexes(db_session)
     search_indexes.index_all_suttas_lang(lang)
 
+@index_app.command("sutta-segments")
+def index_sutta_segments():
+    """Index bilara segments of suttas, used for finding quotes."""
+    from simsapa.app.search.tantivy_index import TantivySearchIndexes
+    from simsapa.app.db_session import get_db_engine_connection_session
+    _, _, db_session = get_db_engine_connection_session()
+    search_indexes = TantivySearchIndexes(db_session)
+    search_indexes.index_all_sutta_segments()
+
 @index_app.command("dict-words-lang")
 def index_dict_words_lang(lang: str):
     """Index dict_words from appdata of the given language."""
@@ -154,6 +169,41 @@ def index_dict_words_lang(lang: str):
     search_indexes = TantivySearchIndexes(db_session)
     search_indexes.index_all_dict_words_lang(lang)
 
+@app.command("query-plans")
+def query_plans(show_all: bool = False):
+    """Run EXPLAIN QUERY PLAN on the app's frequent queries and report full table scans."""
+    from simsapa.app.db_session import get_db_engine_connection_session
+    from simsapa.app.query_plans import audit_query_plans
+
+    db_eng, db_conn, db_session = get_db_engine_connection_session()
+
+    reports = audit_query_plans(db_session)
+
+    for r in reports:
+        if len(r['full_scans']) == 0 and not show_all:
+            continue
+
+        status = "FULL SCAN" if len(r['full_scans']) > 0 else "ok"
+        print(f"{status}: {r['name']}")
+        print(f"  {r['sql']}".replace("\n", " "))
+        for i in r['plan']:
+            print(f"  -> {i}")
+
+    n = len([r for r in reports if len(r['full_scans']) > 0])
+    print(f"{n} of {len(reports)} queries use a full table scan.")
+
+    db_conn.close()
+    db_session.close()
+    db_eng.dispose()
+
+@app.command("dpd-render-cache")
+def dpd_render_cache(workers: Optional[int] = None):
+    """Render all DPD headwords and roots into the render cache, so that they display without rendering."""
+    from simsapa.app.dpd_render_cache import prewarm_dpd_render_cache
+
+    n = prewarm_dpd_render_cache(workers or os.cpu_count() or 1)
+    print(f"Rendered {n} DPD entries.")
+
 @app.command("import-bookmarks")
 def import_bookmarks(path_to_csv: str):
     """Import bookmarks from a CSV file (such as an earlier export)"""
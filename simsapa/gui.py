@@ -10,7 +10,7 @@ from PyQt6.QtWebEngineWidgets import QWebEngineView
 from simsapa import ASSETS_DIR, DESKTOP_FILE_PATH, DPD_DB_PATH, NO_TRAY_ICON_PATH, SIMSAPA_API_DEFAULT_PORT, SIMSAPA_API_PORT_PATH, START_LOW_MEM, USER_DB_PATH, set_is_gui, logger, IS_MAC, SERVER_QUEUE, APP_DB_PATH, ApiSearchResult
 
 from simsapa.app.actions_manager import ActionsManager
-from simsapa.app.db_session import get_db_version
+from simsapa.app.db_session import get_db_version, pending_db_migrations
 from simsapa.app.helpers import find_available_port
 from simsapa.app.dir_helpers import create_or_update_linux_desktop_icon_file, create_app_dirs, check_delete_files, ensure_empty_graphs_cache
 from simsapa import QueryType
@@ -198,6 +198,17 @@ def start(port: int = SIMSAPA_API_DEFAULT_PORT,
     #     from .app.hotkeys_manager_windows_mac import HotkeysManagerWindowsMac
     #     hotkeys_manager = HotkeysManagerWindowsMac(actions_manager)
 
+    # Update the derived tables and indexes of an earlier install before
+    # AppData() opens the dbs, showing the progress. AppData() then finds
+    # them up to date.
+    if len(pending_db_migrations()) > 0:
+        from simsapa.layouts.db_migrations import DbMigrationsWindow
+        w = DbMigrationsWindow()
+        if not w.run():
+            w.show_error()
+            logger.info("gui::start() Exiting with status 1.")
+            sys.exit(1)
+
     app_data = AppData(actions_manager=actions_manager, app_clipboard=app.clipboard(), api_port=port)
 
     if len(app.screens()) > 0:
@@ -262,7 +273,8 @@ def start(port: int = SIMSAPA_API_DEFAULT_PORT,
                      _run_sutta_study,
                      _run_dictionary_search,
                      _run_suttas_fulltext_search,
-                     _run_dict_combined_search)
+                     _run_dict_combined_search,
+                     app_data.get_search_indexes)
 
     daemon = threading.Thread(name='daemon_server', target=_start_daemon_server)
     daemon.setDaemon(True)
@@ -19,10 +19,14 @@ from sqlalchemy.orm import sessionmaker
 from sqlalchemy.orm.session import make_transient
 
 from simsapa import DPD_RELEASES_REPO_URL, SIMSAPA_RELEASES_BASE_URL, DbSchemaName, logger, ASSETS_DIR, APP_DB_PATH, USER_DB_PATH
-from simsapa.app.db_helpers import find_or_create_dpd_dictionary, migrate_dpd
+from simsapa.app.db_helpers import find_or_create_dpd_dictionary, migrate_dpd, update_sutta_pali_parallels
+from simsapa.app.helpers import bilara_segments_data
 
 from simsapa.app.lookup import LANG_CODE_TO_NAME
+from simsapa.app.types import SearchArea
 from simsapa.app.app_data import AppData
+from simsapa.app.completion_lists import clear_flat_completion_lists, delete_saved_completions
+from simsapa.app.sutta_render_cache import clear_sutta_render_caches, preview_cache
 
 from simsapa.app.db import appdata_models as Am
 from simsapa.app.db import userdata_models as Um
@@ -566,6 +570,10 @@ class AssetManagement(QMainWindow):
 
         self._app_data.db_session.commit()
 
+        delete_saved_completions(self._app_data.db_session, SearchArea.Suttas)
+        clear_flat_completion_lists()
+        clear_sutta_render_caches()
+
         self._language_remove_finished()
 
     def _language_remove_finished(self):
@@ -999,6 +1007,9 @@ class AssetsWorker(QRunnable):
 
         shutil.move(dpd_path, self.assets_dir.joinpath('dpd.sqlite3'))
 
+        # The previews of the DPD word links.
+        preview_cache().clear()
+
     def reindex_en_dict(self):
         self.signals.msg_update.emit("Re-generating dictionary fulltext index ...")
 
@@ -1009,6 +1020,9 @@ class AssetsWorker(QRunnable):
         search_indexes = TantivySearchIndexes(db_session)
         search_indexes.index_all_dict_words_lang('en')
 
+        delete_saved_completions(db_session, SearchArea.DictWords)
+        clear_flat_completion_lists()
+
         db_conn.close()
         db_session.close()
         db_eng.dispose()
@@ -1055,6 +1069,8 @@ class AssetsWorker(QRunnable):
 
             # https://stackoverflow.com/questions/28871406/how-to-clone-a-sqlalchemy-object-with-new-primary-key
 
+            uid_stems: List[str] = []
+
             for i in res:
                 try:
                     import_db_session.expunge(i)
@@ -1072,11 +1088,30 @@ class AssetsWorker(QRunnable):
                     if old_sutta is not None:
                         target_db_session.delete(old_sutta)
 
+                    data = bilara_segments_data(i.content_json, i.content_json_tmpl)
+                    if data is not None:
+                        if schema == DbSchemaName.AppData:
+                            i.segments = Am.SuttaSegments(data = data)
+                        else:
+                            i.segments = Um.SuttaSegments(data = data)
+
                     target_db_session.add(i)
                     target_db_session.commit()
+
+                    uid_stems.append(str(i.uid_stem))
                 except Exception as e:
                     logger.error(f"Import problem: {e}")
 
+            # The imported translations, and the translations of the imported
+            # Pali suttas, get their Pali sutta for the line by line view.
+            if schema == DbSchemaName.AppData:
+                update_sutta_pali_parallels(target_db_session, uid_stems)
+
+            if schema == DbSchemaName.UserData:
+                delete_saved_completions(target_db_session, SearchArea.Suttas)
+            clear_flat_completion_lists()
+            clear_sutta_render_caches()
+
             target_db_conn.close()
             target_db_session.close()
             target_db_eng.dispose()
@@ -7,6 +7,7 @@ from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLa
 from PyQt6.QtGui import QMovie
 
 from simsapa.app.db_session import get_db_engine_connection_session
+from simsapa.app.search.tantivy_index import TantivySearchIndexes
 
 from simsapa import logger
 
@@ -129,10 +130,9 @@ class Worker(QRunnable):
     @pyqtSlot()
     def run(self):
         try:
-            # FIXME
-            search_indexed = SearchIndexes()
             db_eng, db_conn, db_session = get_db_engine_connection_session()
-            search_indexed.index_all(db_session, only_if_empty=True)
+            search_indexes = TantivySearchIndexes(db_session)
+            search_indexes.index_all(only_if_empty=True)
 
             db_conn.close()
             db_session.close()
@@ -0,0 +1,136 @@
+import traceback
+from pathlib import Path
+from typing import Optional
+
+from PyQt6 import QtWidgets
+
+from PyQt6.QtCore import QEventLoop, QRunnable, QThreadPool, Qt, pyqtSlot
+from PyQt6.QtCore import QObject, pyqtSignal
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QLabel, QMainWindow, QMessageBox)
+from PyQt6.QtGui import QMovie
+
+from simsapa.app.db_session import check_db_migrations
+
+from simsapa import logger
+
+
+class DbMigrationsWindow(QMainWindow):
+    """Shows the progress while check_db_migrations() updates the derived
+    tables and indexes of an earlier install, before the app starts."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.setWindowTitle("Updating the Database")
+        self.setFixedSize(350, 350)
+        self.setWindowFlags(Qt.WindowType.WindowStaysOnTopHint)
+
+        self.thread_pool = QThreadPool()
+
+        self.error_msg: Optional[str] = None
+        self._setup_ui()
+
+
+    def _setup_ui(self):
+        self._central_widget = QWidget(self)
+        self.setCentralWidget(self._central_widget)
+
+        self._layout = QVBoxLayout()
+        self._central_widget.setLayout(self._layout)
+
+        spacerItem = QtWidgets.QSpacerItem(20, 0, QtWidgets.QSizePolicy.Policy.Minimum, QtWidgets.QSizePolicy.Policy.Expanding)
+        self._layout.addItem(spacerItem)
+
+        self._msg = QLabel("<p>Updating the database for this version of Simsapa.</p><p>This may take a few minutes.</p>")
+        self._msg.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self._layout.addWidget(self._msg)
+
+        self._progress_msg = QLabel("")
+        self._progress_msg.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self._layout.addWidget(self._progress_msg)
+
+        self._animation = QLabel(self)
+        self._animation.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self._layout.addWidget(self._animation)
+
+        self._movie = QMovie(':simsapa-loading')
+        self._animation.setMovie(self._movie)
+
+        spacerItem = QtWidgets.QSpacerItem(20, 0, QtWidgets.QSizePolicy.Policy.Minimum, QtWidgets.QSizePolicy.Policy.Expanding)
+        self._layout.addItem(spacerItem)
+
+
+    def run(self) -> bool:
+        """Runs the migrations in a worker thread and waits for them, while
+        the window is responsive. Returns False if they failed."""
+        self.show()
+        self._movie.start()
+
+        loop = QEventLoop()
+
+        worker = Worker()
+        worker.signals.progress.connect(self._show_progress)
+        worker.signals.failed.connect(self._set_error)
+        worker.signals.finished.connect(loop.quit)
+
+        self.thread_pool.start(worker)
+        loop.exec()
+
+        self._movie.stop()
+        self.close()
+
+        return (self.error_msg is None)
+
+
+    def _show_progress(self, msg: str):
+        self._progress_msg.setText(msg)
+
+
+    def _set_error(self, msg: str):
+        self.error_msg = msg
+
+
+    def show_error(self):
+        box = QMessageBox()
+        box.setIcon(QMessageBox.Icon.Critical)
+        box.setWindowTitle("Database Update Error")
+
+        msg = """
+        <p>Updating the database failed, Simsapa can't start without it.</p>
+        <p>Try to start the application again. If the error repeats, please submit an issue report at:<br>
+        <a href="https://github.com/simsapa/simsapa/issues">https://github.com/simsapa/simsapa/issues</a></p>
+        """
+
+        box.setText(msg)
+        if self.error_msg is not None:
+            box.setDetailedText(self.error_msg)
+        box.setStandardButtons(QMessageBox.StandardButton.Close)
+
+        box.exec()
+
+
+class WorkerSignals(QObject):
+    progress = pyqtSignal(str)
+    failed = pyqtSignal(str)
+    finished = pyqtSignal()
+
+
+class Worker(QRunnable):
+    def __init__(self):
+        super(Worker, self).__init__()
+
+        self.signals = WorkerSignals()
+
+    def _progress(self, db_path: Path):
+        self.signals.progress.emit(f"Updating {db_path.name} ...")
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            check_db_migrations(progress_fn=self._progress)
+
+        except Exception as e:
+            logger.error(f"Database migration problem: {e}")
+            self.signals.failed.emit(traceback.format_exc())
+
+        finally:
+            self.signals.finished.emit()
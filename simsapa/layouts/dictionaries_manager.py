@@ -21,6 +21,7 @@ from simsapa import ASSETS_DIR
 from ..app.db_models import DictionarySource
 from ..app.types import AppData, DictWord
 from ..app.helpers import download_file
+from ..app.sutta_render_cache import preview_cache
 from ..assets.ui.dictionaries_manager_window_ui import Ui_DictionariesManagerWindow
 
 Glossary.init()
@@ -95,6 +96,9 @@ class DictionariesManagerWindow(QMainWindow, Ui_DictionariesManagerWindow):
         self._app_data.user_db_session.delete(db_item)
         self._app_data.user_db_session.commit()
 
+        # The previews of the word links of the removed dictionary.
+        preview_cache().clear()
+
     def _handle_dictionary_source_select(self):
         doc = self.get_selected_dictionary_source()
         if doc:
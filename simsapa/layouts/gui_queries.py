@@ -1,7 +1,6 @@
 from datetime import datetime
 from math import ceil
 from typing import List, Optional, Callable
-import re
 
 from sqlalchemy.orm.session import Session
 
@@ -10,10 +9,13 @@ from PyQt6.QtCore import QThreadPool
 from simsapa import logger, SearchResult
 
 from simsapa.app.search.dictionary_queries import DictionaryQueries, ExactQueryWorker
-from simsapa.app.search.query_task import SearchQueryTask
+from simsapa.app.search.helpers import unique_search_results
+from simsapa.app.search.query_task import new_search_tasks
+from simsapa.app.search.result_store import SearchResultStore
+from simsapa.app.search.results_merge import ResultsMerge, ResultsStream, result_score
 from simsapa.app.search.sutta_queries import SuttaQueries
 from simsapa.app.search.tantivy_index import TantivySearchIndexes
-from simsapa.app.types import SearchArea, SearchMode, SearchParams
+from simsapa.app.types import DpdFilters, SearchArea, SearchParams
 
 from simsapa.layouts.gui_types import GuiSearchQueriesInterface
 from simsapa.layouts.query_worker import SearchQueryWorker
@@ -23,6 +25,7 @@ class GuiSearchQueries(GuiSearchQueriesInterface):
     api_url: Optional[str] = None
     search_query_workers: List[SearchQueryWorker] = []
     exact_query_worker: Optional[ExactQueryWorker] = None
+    _results_merge: Optional[ResultsMerge] = None
 
     sutta_queries: SuttaQueries
     dictionary_queries: DictionaryQueries
@@ -83,7 +86,8 @@ class GuiSearchQueries(GuiSearchQueriesInterface):
                                    area: SearchArea,
                                    query_started_time: datetime,
                                    finished_fn: Callable,
-                                   params: SearchParams):
+                                   params: SearchParams,
+                                   dpd_filters: Optional[DpdFilters] = None):
         self.set_search_indexes()
         if self._search_indexes is None:
             logger.error("self._search_indexes is None")
@@ -100,47 +104,21 @@ class GuiSearchQueries(GuiSearchQueriesInterface):
         # .append(w) would add to a list of workers which start with already
         # deleted threads, and self.thread_pool.start(i) will error.
         self.search_query_workers = []
+        self._results_merge = None
 
-        if area == SearchArea.Suttas:
-            lang_keys = list(self._search_indexes.suttas_lang_index.keys())
-            lang_indexes = self._search_indexes.suttas_lang_index
-        else:
-            lang_keys = list(self._search_indexes.dict_words_lang_index.keys())
-            lang_indexes = self._search_indexes.dict_words_lang_index
-
-            if query_text_orig.isdigit():
-                # If the query_text is an integer, it is a DPD ID.
-                params['mode'] = SearchMode.DpdIdMatch
-
-            elif re.search(r"/[a-z0-9-]+$", query_text_orig.lower()):
-                # If the query_text ends with sth like /pts, /sbs-ru, then the
-                # user is looking for specific word with a uid.
-                params['mode'] = SearchMode.UidMatch
-
-        if params['lang'] is not None:
-            if params['lang_include']:
-                languages =  [params['lang']]
-            else:
-                languages = [i for i in lang_keys if i != params['lang']]
-        else:
-            languages = lang_keys
-
-        for lang in languages:
-            # This can happen when the Language dropdown has empty value.
-            if lang == "":
-                continue
+        if params['page_len'] is not None:
+            self._page_len = params['page_len']
 
-            logger.info(f"SearchQueryWorker for {lang}")
-
-            task = SearchQueryTask(lang,
-                                   lang_indexes[lang],
-                                   query_text_orig,
-                                   query_started_time,
-                                   params,
-                                   area)
+        tasks = new_search_tasks(self._search_indexes,
+                                 query_text_orig,
+                                 query_started_time,
+                                 params,
+                                 area,
+                                 dpd_filters)
 
+        for task in tasks:
+            logger.info(f"SearchQueryWorker for {task.lang}")
             w = SearchQueryWorker(task, finished_fn)
-
             self.search_query_workers.append(w)
 
         for i in self.search_query_workers:
@@ -159,28 +137,12 @@ class GuiSearchQueries(GuiSearchQueriesInterface):
         self.thread_pool.start(self.exact_query_worker)
 
     def result_pages_count(self) -> Optional[int]:
-        # Each query worker stores its result pages, with one page containing
-        # page_len items.
-        #
-        # The total page count is not the total hits / page_len, but the longest
-        # page / page_len.
+        # The results of the query workers (e.g. one worker per language index)
+        # are merged by score into pages of page_len items. The pinned results
+        # (DPD Lookup in Combined mode) are shown on the first page in addition
+        # to the page_len items.
         #
         # Page count may be None in the case of filtered regex or fuzzy queries.
-        #
-        # When requesting the query's combined pages, the first page of each
-        # worker is the first page of the combined results page, the second page
-        # of each worker is the second combined page, etc.
-        #
-        # The query workers have different number of pages (e.g. one worker per
-        # language index), hence the first N combined pages may be longer than others.
-        #
-        # The pages might be:
-        #
-        # 0: 40 items [20 + 20]
-        # 1: 26 items [20 + 6]
-        # 2: 20 items [20 + 0]
-        # 3: 20 items [20 + 0]
-        # ...
 
         n = self.count_running_queries()
         if n != 0:
@@ -191,9 +153,24 @@ class GuiSearchQueries(GuiSearchQueriesInterface):
                 if t.enable_regex or t.fuzzy_distance > 0:
                     return None
 
-            a = list(filter(None, [i.task.query_hits() for i in self.search_query_workers]))
-            worker_max_hits = max(a)
-            return ceil(worker_max_hits / self._page_len)
+            hits = sum(filter(None, [i.task.query_hits() for i in self.search_query_workers]))
+            pinned = sum([len(i.task.pinned_results()) for i in self.search_query_workers])
+
+            return max(1, ceil((hits - pinned) / self._page_len))
+
+    def _get_results_merge(self) -> ResultsMerge:
+        if self._results_merge is None:
+            streams = [ResultsStream(i.task.ranked_results_page) for i in self.search_query_workers]
+            self._results_merge = ResultsMerge(streams, self._page_len)
+
+        return self._results_merge
+
+    def _pinned_results(self) -> List[SearchResult]:
+        a: List[SearchResult] = []
+        for i in self.search_query_workers:
+            a.extend(i.task.pinned_results())
+
+        return sorted(a, key=result_score, reverse = True)
 
     def results_page(self, page_num: int) -> List[SearchResult]:
         logger.info(f"GuiSearchQueries::results_page(): page_num = {page_num}")
@@ -202,12 +179,13 @@ class GuiSearchQueries(GuiSearchQueriesInterface):
             logger.info(f"Running queries: {n}, return empty results")
             return []
         else:
-            a: List[SearchResult] = []
-            for i in self.search_query_workers:
-                a.extend(i.task.results_page(page_num))
+            # The higher the score, the better. The merge returns the
+            # requested page of results in descending score order, across all
+            # the workers.
+            res = self._get_results_merge().page(page_num)
 
-            # The higher the score, the better. Reverse to get descending order.
-            res = sorted(a, key=lambda x: x['score'] or 0, reverse = True)
+            if page_num == 0:
+                res = unique_search_results(self._pinned_results() + res)
 
             return res
 
@@ -218,14 +196,14 @@ class GuiSearchQueries(GuiSearchQueriesInterface):
             logger.info(f"Running queries: {n}, return empty results")
             return []
         else:
-            a: List[SearchResult] = []
+            res = SearchResultStore()
+
             for i in self.search_query_workers:
-                a.extend(i.task.all_results())
+                res.extend(i.task.all_results())
 
             if sort_by_score:
-                # The higher the score, the better. Reverse to get descending order.
-                res = sorted(a, key=lambda x: x['score'] or 0, reverse = True)
-            else:
-                res = a
+                # The higher the score, the better. Sorting the store orders the
+                # score column, result dicts are only created for the return value.
+                res = res.sorted_by_score(reverse = True)
 
-            return res
+            return res.to_list()
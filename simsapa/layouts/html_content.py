@@ -2,6 +2,7 @@ from typing import Optional
 from string import Template
 
 from simsapa import PAGE_HTML, ICONS_HTML, SUTTAS_CSS, SUTTAS_JS
+from simsapa.app.page_assets import page_asset_link
 
 # open_sutta_links_js_tmpl: Optional[Template] = None
 page_tmpl = Template(PAGE_HTML)
@@ -9,7 +10,10 @@ page_tmpl = Template(PAGE_HTML)
 def html_page(content: str,
               api_url: Optional[str] = None,
               css_extra: Optional[str] = None,
-              js_extra: Optional[str] = None):
+              js_extra: Optional[str] = None,
+              inline_assets = False):
+    """The page links to suttas.css and suttas.js on the API server, or includes
+    them with inline_assets (e.g. when exporting), or without an API server."""
 
     # global open_sutta_links_js_tmpl
     # if open_sutta_links_js_tmpl is None:
@@ -19,9 +23,16 @@ def html_page(content: str,
 
     global page_tmpl
 
-    css = SUTTAS_CSS
-    if api_url is not None:
-        css = css.replace("http://localhost:8000", api_url)
+    inline_assets = inline_assets or api_url is None
+
+    if inline_assets:
+        css = SUTTAS_CSS
+        if api_url is not None:
+            css = css.replace("http://localhost:8000", api_url)
+        css_links = ""
+    else:
+        css = ""
+        css_links = page_asset_link(api_url, "suttas.css")
 
     if css_extra:
         css += "\n\n" + css_extra
@@ -41,11 +52,17 @@ def html_page(content: str,
         js += " const SHOW_QUOTE = null;"
 
     # In suttas.js we expect SHOW_BOOKMARKS to be already set.
-    js += SUTTAS_JS
+    if inline_assets:
+        js += SUTTAS_JS
+        js_links = ""
+    else:
+        js_links = page_asset_link(api_url, "suttas.js")
 
     html = str(page_tmpl.substitute(content=content,
+                                    css_links=css_links,
                                     css_head=css,
                                     js_head=js,
+                                    js_links=js_links,
                                     js_body='',
                                     icons_html=ICONS_HTML,
                                     api_url=api_url))
@@ -717,8 +717,7 @@ QWidget:focus { border: 1px solid #1092C3; }
 
         html = ""
 
-        for w in words:
-            d = self._queries.dictionary_queries.get_word_html(w)
+        for d in self._queries.dictionary_queries.get_words_html(words):
             html += d['body']
 
         js = """
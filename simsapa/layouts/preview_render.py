@@ -0,0 +1,310 @@
+"""The html of the link previews, rendered on worker threads.
+
+A hovered link is resolved and rendered by a PreviewRenderWorker with a
+pooled read session, and the PreviewWindow shows the result when it arrives.
+The previews are kept in memory by URL (see sutta_render_cache.preview_cache())
+and cleared when suttas are imported. The first sutta links of an opened page
+are rendered before they are hovered, see prefetch_link_previews().
+"""
+
+from typing import Callable, List, Optional, TypedDict
+from urllib.parse import parse_qs
+import html as html_lib
+import re
+import threading
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, QUrl, pyqtSignal, pyqtSlot
+from sqlalchemy.orm.session import Session
+
+from simsapa import PREVIEW_PREFETCH_LINKS, logger, QueryType
+from simsapa.app.app_data import AppData
+from simsapa.app.db_session import db_read_session
+from simsapa.app.helpers import bilara_content_json_to_html, bilara_text_to_segments
+from simsapa.app.search.dictionary_queries import DictionaryQueries
+from simsapa.app.search.sutta_queries import SuttaQueries
+from simsapa.app.sutta_render_cache import preview_cache
+from simsapa.app.types import UDictWord, USutta
+from simsapa.layouts.gui_types import sutta_quote_from_url
+from simsapa.layouts.html_content import html_page
+
+PREVIEW_BG_COLOR = "#FCEFCF"
+
+PREVIEW_CSS_EXTRA = f"""
+html, body {{ background-color: {PREVIEW_BG_COLOR}; }}
+html {{ font-size: 16px; }}
+body {{ padding: 0.5rem; max-width: 100%; }}
+h1 {{ font-size: 20px; margin-top: 0pt; }}
+"""
+
+class PreviewHtml(TypedDict):
+    title: str
+    html: str
+
+def preview_cache_key(href: str, frameless: bool) -> str:
+    return f"{'frameless' if frameless else 'windowed'}/{href}"
+
+def window_title_bar_html(title: str) -> str:
+    html = f"""<div id="window-title-bar">
+    <div class="flex-container">
+        <div id="left-btn-box">
+            <div class="btn" id="preview-open-new">
+                <a href="#"><svg class="icon icon-open-new"><use xlink:href="#icon-square-up-right-solid"></use></svg></a>
+            </div>
+            <div class="btn" id="preview-make-windowed">
+                <a href="#"><svg class="icon icon-make-windowed"><use xlink:href="#icon-copy-solid"></use></svg></a>
+            </div>
+        </div>
+        <div id="preview-title-text">{title}</div>
+        <div id="right-btn-box">
+            <div class="btn pull-right" id="preview-close">
+                <a href="#"><svg class="icon icon-close"><use xlink:href="#icon-circle-xmark-solid"></use></svg></a>
+            </div>
+        </div>
+    </div>
+    </div>"""
+
+    return html
+
+def not_found_preview_html(api_url: Optional[str], url: QUrl) -> PreviewHtml:
+    content = f"""
+    <h1>Content Not Found</h1>
+    <p>No content found for URL: {url.toString()}</p>
+    <p>
+    <i>Host:</i> {url.host()}<br>
+    <i>Path:</i> {url.path()}<br>
+    <i>Query:</i> {parse_qs(url.query())}<br>
+    </p>
+    """
+
+    html = html_page(content, api_url, PREVIEW_CSS_EXTRA)
+
+    return PreviewHtml(title = "Content Not Found", html = html)
+
+def words_preview_html(dictionary_queries: DictionaryQueries, words: List[UDictWord], frameless: bool) -> PreviewHtml:
+    css_extra = PREVIEW_CSS_EXTRA
+    js_extra = "const SHOW_BOOKMARKS = false;"
+
+    if frameless:
+        js_extra += """
+        document.addEventListener("DOMContentLoaded", function(event) {
+            let el = document.querySelector('#preview-close');
+            el.addEventListener("click", function() {
+                document.qt_channel.objects.helper.emit_do_close();
+            });
+        });
+        """
+
+    html_title = None
+    if frameless:
+        html_title = """
+        <div class="btn pull-right" id="preview-close">
+            <a href="#"><svg class="icon icon-close"><use xlink:href="#icon-circle-xmark-solid"></use></svg></a>
+        </div>
+        """
+
+        css_extra += """
+        #preview-close { font-size: 14.5px; line-height: 1; position: fixed; top: 6px; right: 6px; }
+        """
+
+    html = dictionary_queries.words_to_html_page(
+        words=words,
+        css_extra=css_extra,
+        js_extra=js_extra,
+        html_title=html_title)
+
+    return PreviewHtml(title = '', html = html)
+
+def sutta_preview_html(api_url: Optional[str],
+                       sutta: USutta,
+                       frameless: bool,
+                       highlight_text: Optional[str] = None) -> PreviewHtml:
+    if sutta.title_trans is not None and sutta.title_trans != '':
+        s = sutta.title_trans
+    else:
+        s = sutta.title
+    title = f"{sutta.sutta_ref} {s} ({sutta.uid})"
+
+    if sutta.content_json is not None and sutta.content_json != '':
+        segments_json = bilara_text_to_segments(str(sutta.content_json), str(sutta.content_json_tmpl))
+        content = bilara_content_json_to_html(segments_json)
+
+    elif sutta.content_html is not None and sutta.content_html != '':
+        content = str(sutta.content_html)
+
+    elif sutta.content_plain is not None and sutta.content_plain != '':
+        content = '<pre>' + str(sutta.content_plain) + '</pre>'
+
+    else:
+        content = 'No content.'
+
+    if frameless:
+        content = window_title_bar_html(title) + content
+
+    css_extra = f"""
+    html, body {{ background-color: {PREVIEW_BG_COLOR}; }}
+    html {{ font-size: 16px; }}
+    body {{ padding: 0; margin: 2rem 1rem 1rem 1rem; max-width: 100%; }}
+    h1 {{ font-size: 20px; margin-top: 0pt; }}
+    """
+
+    js_extra = f"const SUTTA_UID = '{sutta.uid}';"
+    js_extra += "const SHOW_BOOKMARKS = false;"
+
+    if highlight_text:
+        # NOTE highlight_and_scroll_to() replaces #ssp_main.innerHTML and
+        # loses eventlisteners. Add document.addEventListener() after this,
+        # or use onclick HTML attributes.
+        text = highlight_text.replace('"', '\\"')
+        js_extra += """document.addEventListener("DOMContentLoaded", function(event) { highlight_and_scroll_to("%s"); });""" % text
+
+    if frameless:
+        js_extra += """
+        document.addEventListener("DOMContentLoaded", function(event) {
+            let el = document.getElementById('preview-open-new');
+            el.addEventListener("click", function() {
+                document.qt_channel.objects.helper.emit_open_new();
+            });
+
+            el = document.getElementById('preview-make-windowed');
+            el.addEventListener("click", function() {
+                document.qt_channel.objects.helper.emit_make_windowed();
+            });
+
+            el = document.querySelector('#preview-close');
+            el.addEventListener("click", function() {
+                document.qt_channel.objects.helper.emit_do_close();
+            });
+        });
+        """
+
+    html = html_page(content=content,
+                     api_url=api_url,
+                     css_extra=css_extra,
+                     js_extra=js_extra)
+
+    return PreviewHtml(title = title, html = html)
+
+def render_preview(app_data: AppData, db_session: Session, href: str, frameless: bool) -> Optional[PreviewHtml]:
+    """The preview of a sutta or word link. None when it is not such a link,
+    or when the sutta has to be found with a fulltext search of the quote."""
+    url = QUrl(href)
+
+    if url.host() == QueryType.suttas:
+        sutta = SuttaQueries(db_session).get_sutta_by_url(url)
+
+        if sutta is None:
+            if sutta_quote_from_url(url) is not None:
+                return None
+
+            return not_found_preview_html(app_data.api_url, url)
+
+        query = parse_qs(url.query())
+        quote_text: Optional[str] = None
+        if 'quote' in query.keys():
+            quote_text = query['quote'][0]
+
+        return sutta_preview_html(app_data.api_url, sutta, frameless, quote_text)
+
+    if url.host() == QueryType.words:
+        dictionary_queries = DictionaryQueries(db_session, app_data.api_url)
+
+        words = dictionary_queries.get_words_by_uid(url.path().strip("/"))
+
+        if len(words) == 0:
+            return not_found_preview_html(app_data.api_url, url)
+
+        return words_preview_html(dictionary_queries, words, frameless)
+
+    return None
+
+def cached_preview(app_data: AppData, db_session: Session, href: str, frameless: bool) -> Optional[PreviewHtml]:
+    key = preview_cache_key(href, frameless)
+
+    res = preview_cache().get(key)
+    if res is not None:
+        return res
+
+    res = render_preview(app_data, db_session, href, frameless)
+    if res is not None:
+        preview_cache().put(key, res)
+
+    return res
+
+def page_sutta_links(html: str, max_links: int) -> List[str]:
+    """The first unique ssp://suttas/ hrefs of the page."""
+    res: List[str] = []
+    for m in re.finditer(r'href="(ssp://' + QueryType.suttas.value + r'/[^"]+)"', html):
+        href = html_lib.unescape(m.group(1))
+        if href not in res:
+            res.append(href)
+            if len(res) >= max_links:
+                break
+
+    return res
+
+class PreviewWorkerSignals(QObject):
+    # href, Optional[PreviewHtml]
+    rendered = pyqtSignal(str, object)
+
+class PreviewRenderWorker(QRunnable):
+    """Renders the previews of the links into the cache, and emits each result."""
+
+    signals: PreviewWorkerSignals
+
+    def __init__(self, app_data: AppData, hrefs: List[str], frameless: bool, rendered_fn: Optional[Callable] = None):
+        super().__init__()
+
+        self._app_data = app_data
+        self.hrefs = hrefs
+        self.frameless = frameless
+        self._cancelled = threading.Event()
+
+        self.signals = PreviewWorkerSignals()
+        if rendered_fn is not None:
+            self.signals.rendered.connect(rendered_fn)
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            with db_read_session() as db_session:
+                for href in self.hrefs:
+                    if self._cancelled.is_set():
+                        return
+
+                    res = cached_preview(self._app_data, db_session, href, self.frameless)
+                    self.signals.rendered.emit(href, res)
+
+        except Exception as e:
+            logger.error(f"PreviewRenderWorker: {e}")
+
+_PREFETCH_POOL: Optional[QThreadPool] = None
+_PREFETCH_WORKER: Optional[PreviewRenderWorker] = None
+
+def prefetch_link_previews(app_data: AppData, html: str):
+    """Render the previews of the first sutta links of a page which was just
+    opened. Cancels the prefetch of the previous page. Called on the GUI thread."""
+    global _PREFETCH_POOL, _PREFETCH_WORKER
+
+    if PREVIEW_PREFETCH_LINKS == 0 or not app_data.app_settings.get('link_preview', True):
+        return
+
+    if _PREFETCH_POOL is None:
+        _PREFETCH_POOL = QThreadPool()
+        _PREFETCH_POOL.setMaxThreadCount(1)
+
+    if _PREFETCH_WORKER is not None:
+        _PREFETCH_WORKER.cancel()
+    _PREFETCH_POOL.clear()
+
+    hrefs = [i for i in page_sutta_links(html, PREVIEW_PREFETCH_LINKS)
+             if not preview_cache().has(preview_cache_key(i, True))]
+
+    if len(hrefs) == 0:
+        _PREFETCH_WORKER = None
+        return
+
+    _PREFETCH_WORKER = PreviewRenderWorker(app_data, hrefs, frameless = True)
+    _PREFETCH_POOL.start(_PREFETCH_WORKER)
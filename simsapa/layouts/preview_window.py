@@ -1,11 +1,10 @@
 import subprocess
 
 from functools import partial
-from urllib.parse import parse_qs
 from datetime import datetime
 
-from typing import List, Optional
-from PyQt6.QtCore import QTimer, QUrl, Qt, pyqtSignal
+from typing import Callable, List, Optional
+from PyQt6.QtCore import QThreadPool, QTimer, QUrl, Qt, pyqtSignal
 from PyQt6.QtGui import QCursor, QEnterEvent
 from PyQt6.QtWebEngineCore import QWebEngineSettings
 from PyQt6.QtWebEngineWidgets import QWebEngineView
@@ -13,29 +12,23 @@ from PyQt6.QtWidgets import QDialog, QVBoxLayout
 
 from simsapa import logger, IS_MAC, IS_SWAY, SIMSAPA_PACKAGE_DIR, QueryType, SearchResult
 
-from simsapa.app.helpers import bilara_content_json_to_html, bilara_text_to_segments, is_complete_sutta_uid
-from simsapa.app.types import SearchArea, SearchMode, SearchParams, UDictWord, USutta
+from simsapa.app.helpers import is_complete_sutta_uid
+from simsapa.app.types import SearchArea, SearchMode, SearchParams, USutta
 from simsapa.app.app_data import AppData
 from simsapa.layouts.gui_queries import GuiSearchQueries
 
 from simsapa.layouts.gui_types import QExpanding, LinkHoverData, sutta_quote_from_url
-from simsapa.layouts.html_content import html_page
+from simsapa.app.sutta_render_cache import preview_cache
+from simsapa.layouts.preview_render import (PREVIEW_BG_COLOR, PreviewHtml, PreviewRenderWorker, not_found_preview_html,
+                                            preview_cache_key, sutta_preview_html)
 from simsapa.layouts.reader_web import ReaderWebEnginePage
 
 TITLE_PRE = "Simsapa Preview"
 
-PREVIEW_BG_COLOR = "#FCEFCF"
 TITLE_BG_COLOR = "#FEF8E8"
 DARK_BORDER_COLOR = "#D47400"
 LIGHT_BORDER_COLOR = TITLE_BG_COLOR
 
-PREVIEW_CSS_EXTRA = f"""
-html, body {{ background-color: {PREVIEW_BG_COLOR}; }}
-html {{ font-size: 16px; }}
-body {{ padding: 0.5rem; max-width: 100%; }}
-h1 {{ font-size: 20px; margin-top: 0pt; }}
-"""
-
 if IS_MAC:
     HOVER_DIST = 60
 else:
@@ -69,6 +62,13 @@ class PreviewWindow(QDialog):
         self._link_mouseleave = False
         self._mouseover = False
 
+        # The hovered link is rendered on a worker, and shown with _show_fn
+        # when the result arrives, unless another link was hovered meanwhile.
+        self._render_pool = QThreadPool()
+        self._render_pool.setMaxThreadCount(1)
+        self._render_worker: Optional[PreviewRenderWorker] = None
+        self._show_fn: Optional[Callable[[], None]] = None
+
         self._hide_timer = QTimer()
         self._hide_timer.timeout.connect(partial(self.hide))
         self._hide_timer.setSingleShot(True)
@@ -162,7 +162,7 @@ class PreviewWindow(QDialog):
            self._hover_data['href'] == hover_data['href']:
             return
 
-        if self.render_hover_data(hover_data):
+        if self.render_hover_data(hover_data, self._do_show):
             self._do_show()
 
     def graph_link_mouseover(self, hover_data: LinkHoverData):
@@ -171,7 +171,7 @@ class PreviewWindow(QDialog):
            self._hover_data['href'] == hover_data['href']:
             return
 
-        if self.render_hover_data(hover_data):
+        def _show():
             self._do_show()
 
             self._link_mouseleave = True
@@ -179,6 +179,9 @@ class PreviewWindow(QDialog):
 
             self._hide_timer.start(2000)
 
+        if self.render_hover_data(hover_data, _show):
+            _show()
+
     def _sutta_search_query_finished(self, __query_started_time__: Optional[datetime] = None):
         if not self._queries.all_finished():
             return
@@ -206,7 +209,11 @@ class PreviewWindow(QDialog):
         else:
             self._render_not_found(url)
 
-    def render_hover_data(self, hover_data: Optional[LinkHoverData] = None) -> bool:
+    def render_hover_data(self,
+                          hover_data: Optional[LinkHoverData] = None,
+                          show_fn: Optional[Callable[[], None]] = None) -> bool:
+        """Returns True when the preview is rendered and can be shown. When it
+        is rendered on a worker, returns False and calls show_fn when done."""
         if self._hover_data is not None and \
            hover_data is not None and \
            self._hover_data['href'] == hover_data['href']:
@@ -226,74 +233,80 @@ class PreviewWindow(QDialog):
 
         url = QUrl(self._hover_data['href'])
 
-        if url.host() == QueryType.suttas:
-
-            sutta = self._queries.sutta_queries.get_sutta_by_url(url)
-            quote = sutta_quote_from_url(url)
-
-            if sutta is None and quote is not None:
-
-                uid = url.path().strip("/")
-                if is_complete_sutta_uid(uid):
-                    # dn22/pli/ms
-                    _, lang, _ = uid.split("/")
-                else:
-                    lang = "pli"
-
-                params = SearchParams(
-                    mode = SearchMode.FulltextMatch,
-                    page_len = 10,
-                    lang = lang,
-                    lang_include = True,
-                    source = None,
-                    source_include = True,
-                    enable_regex = False,
-                    fuzzy_distance = 0,
-                )
-
-                self._query_results: List[SearchResult] = []
-
-                self._last_query_time = datetime.now()
-
-                self._queries.start_search_query_workers(
-                    quote['quote'],
-                    SearchArea.Suttas,
-                    self._last_query_time,
-                    self._sutta_search_query_finished,
-                    params,
-                )
-
-            else:
+        if url.host() != QueryType.suttas and url.host() != QueryType.words:
+            # It's not a sutta or dictionary word link.
+            return False
 
-                if sutta is None:
-                    self._render_not_found(url)
-                    return True
+        href = self._hover_data['href']
 
-                query = parse_qs(url.query())
-                quote_text: Optional[str] = None
-                if 'quote' in query.keys():
-                    quote_text = query['quote'][0]
+        res = preview_cache().get(preview_cache_key(href, self._frameless))
+        if res is not None:
+            self._set_preview(res)
+            return True
 
-                self._render_sutta(sutta, quote_text)
+        if self._render_worker is not None:
+            self._render_worker.cancel()
+        self._render_pool.clear()
 
-            return True
+        self._show_fn = show_fn
+        self._render_worker = PreviewRenderWorker(self._app_data, [href], self._frameless, self._preview_rendered)
+        self._render_pool.start(self._render_worker)
 
-        if url.host() == QueryType.words:
+        return False
 
-            word_uid = url.path().strip("/")
+    def _preview_rendered(self, href: str, res: Optional[PreviewHtml]):
+        if self._hover_data is None or self._hover_data['href'] != href:
+            return
 
-            words = self._queries.dictionary_queries.get_words_by_uid(word_uid)
+        if res is None:
+            # The sutta has to be found by the quote.
+            self._start_quote_search(QUrl(href))
+        else:
+            self._set_preview(res)
 
-            if len(words) == 0:
-                self._render_not_found(url)
-                return True
+        if self._show_fn is not None:
+            self._show_fn()
+            self._show_fn = None
 
-            self._render_words(words)
+    def _set_preview(self, res: PreviewHtml):
+        self.title = res['title']
+        self.set_qwe_html(res['html'])
 
-            return True
+    def _start_quote_search(self, url: QUrl):
+        quote = sutta_quote_from_url(url)
+        if quote is None:
+            self._render_not_found(url)
+            return
 
-        # It's not a sutta or dictionary word link.
-        return False
+        uid = url.path().strip("/")
+        if is_complete_sutta_uid(uid):
+            # dn22/pli/ms
+            _, lang, _ = uid.split("/")
+        else:
+            lang = "pli"
+
+        params = SearchParams(
+            mode = SearchMode.FulltextMatch,
+            page_len = 10,
+            lang = lang,
+            lang_include = True,
+            source = None,
+            source_include = True,
+            enable_regex = False,
+            fuzzy_distance = 0,
+        )
+
+        self._query_results: List[SearchResult] = []
+
+        self._last_query_time = datetime.now()
+
+        self._queries.start_search_query_workers(
+            quote['quote'],
+            SearchArea.Suttas,
+            self._last_query_time,
+            self._sutta_search_query_finished,
+            params,
+        )
 
     def _move_window_from_hover(self):
         preview_width = 500
@@ -350,151 +363,11 @@ class PreviewWindow(QDialog):
 
 
     def _render_not_found(self, url: QUrl):
-        self.title = "Content Not Found"
-
-        content = f"""
-        <h1>Content Not Found</h1>
-        <p>No content found for URL: {url.toString()}</p>
-        <p>
-        <i>Host:</i> {url.host()}<br>
-        <i>Path:</i> {url.path()}<br>
-        <i>Query:</i> {parse_qs(url.query())}<br>
-        </p>
-        """
-
-        css_extra = PREVIEW_CSS_EXTRA
-
-        html = html_page(content, self._app_data.api_url, css_extra)
-
-        self.set_qwe_html(html)
-
-
-    def _render_words(self, words: List[UDictWord]):
-        self.title = ''
-
-        css_extra = PREVIEW_CSS_EXTRA
-        js_extra = "const SHOW_BOOKMARKS = false;"
-
-        if self._frameless:
-            js_extra += """
-            document.addEventListener("DOMContentLoaded", function(event) {
-                let el = document.querySelector('#preview-close');
-                el.addEventListener("click", function() {
-                    document.qt_channel.objects.helper.emit_do_close();
-                });
-            });
-            """
-
-        html_title = None
-        if self._frameless:
-            html_title = """
-            <div class="btn pull-right" id="preview-close">
-                <a href="#"><svg class="icon icon-close"><use xlink:href="#icon-circle-xmark-solid"></use></svg></a>
-            </div>
-            """
-
-            css_extra += """
-            #preview-close { font-size: 14.5px; line-height: 1; position: fixed; top: 6px; right: 6px; }
-            """
-
-        html = self._queries.dictionary_queries.words_to_html_page(
-            words=words,
-            css_extra=css_extra,
-            js_extra=js_extra,
-            html_title=html_title)
-
-        self.set_qwe_html(html)
-
-
-    def _window_title_bar_html(self) -> str:
-        html = f"""<div id="window-title-bar">
-        <div class="flex-container">
-            <div id="left-btn-box">
-                <div class="btn" id="preview-open-new">
-                    <a href="#"><svg class="icon icon-open-new"><use xlink:href="#icon-square-up-right-solid"></use></svg></a>
-                </div>
-                <div class="btn" id="preview-make-windowed">
-                    <a href="#"><svg class="icon icon-make-windowed"><use xlink:href="#icon-copy-solid"></use></svg></a>
-                </div>
-            </div>
-            <div id="preview-title-text">{self.title}</div>
-            <div id="right-btn-box">
-                <div class="btn pull-right" id="preview-close">
-                    <a href="#"><svg class="icon icon-close"><use xlink:href="#icon-circle-xmark-solid"></use></svg></a>
-                </div>
-            </div>
-        </div>
-        </div>"""
-
-        return html
+        self._set_preview(not_found_preview_html(self._app_data.api_url, url))
 
 
     def _render_sutta(self, sutta: USutta, highlight_text: Optional[str] = None):
-        if sutta.title_trans is not None and sutta.title_trans != '':
-            s = sutta.title_trans
-        else:
-            s = sutta.title
-            self.title = f"{sutta.sutta_ref} {s} ({sutta.uid})"
-
-        if sutta.content_json is not None and sutta.content_json != '':
-            segments_json = bilara_text_to_segments(str(sutta.content_json), str(sutta.content_json_tmpl))
-            content = bilara_content_json_to_html(segments_json)
-
-        elif sutta.content_html is not None and sutta.content_html != '':
-            content = str(sutta.content_html)
-
-        elif sutta.content_plain is not None and sutta.content_plain != '':
-            content = '<pre>' + str(sutta.content_plain) + '</pre>'
-
-        else:
-            content = 'No content.'
-
-        if self._frameless:
-            content = self._window_title_bar_html() + content
-
-        css_extra = f"""
-        html, body {{ background-color: {PREVIEW_BG_COLOR}; }}
-        html {{ font-size: 16px; }}
-        body {{ padding: 0; margin: 2rem 1rem 1rem 1rem; max-width: 100%; }}
-        h1 {{ font-size: 20px; margin-top: 0pt; }}
-        """
-
-        js_extra = f"const SUTTA_UID = '{sutta.uid}';"
-        js_extra += "const SHOW_BOOKMARKS = false;"
-
-        if highlight_text:
-            # NOTE highlight_and_scroll_to() replaces #ssp_main.innerHTML and
-            # loses eventlisteners. Add document.addEventListener() after this,
-            # or use onclick HTML attributes.
-            text = highlight_text.replace('"', '\\"')
-            js_extra += """document.addEventListener("DOMContentLoaded", function(event) { highlight_and_scroll_to("%s"); });""" % text
-
-        if self._frameless:
-            js_extra += """
-            document.addEventListener("DOMContentLoaded", function(event) {
-                let el = document.getElementById('preview-open-new');
-                el.addEventListener("click", function() {
-                    document.qt_channel.objects.helper.emit_open_new();
-                });
-
-                el = document.getElementById('preview-make-windowed');
-                el.addEventListener("click", function() {
-                    document.qt_channel.objects.helper.emit_make_windowed();
-                });
-
-                el = document.querySelector('#preview-close');
-                el.addEventListener("click", function() {
-                    document.qt_channel.objects.helper.emit_do_close();
-                });
-            });
-            """
-
-        html = html_page(content=content,
-                         api_url=self._app_data.api_url,
-                         css_extra=css_extra,
-                         js_extra=js_extra)
-
-        self.set_qwe_html(html)
+        self._set_preview(sutta_preview_html(self._app_data.api_url, sutta, self._frameless, highlight_text))
 
     def _show_url(self, url: QUrl):
         if url.host() == QueryType.suttas:
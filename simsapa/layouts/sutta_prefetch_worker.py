@@ -0,0 +1,33 @@
+import threading
+
+from PyQt6.QtCore import QRunnable, pyqtSlot
+
+from simsapa import logger
+from simsapa.app.app_data import AppData
+from simsapa.app.sutta_prefetch import prefetch_suttas
+from simsapa.app.types import USutta
+
+class SuttaPrefetchWorker(QRunnable):
+    """Renders the suttas next to the opened sutta, see sutta_prefetch.py.
+    Cancelled when the reader opens another sutta."""
+
+    def __init__(self, app_data: AppData, sutta: USutta):
+        super().__init__()
+
+        self._app_data = app_data
+        # The sutta is loaded again on the worker's own db session.
+        self.schema = str(sutta.metadata.schema)
+        self.uid = str(sutta.uid)
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @pyqtSlot()
+    def run(self):
+        logger.info(f"SuttaPrefetchWorker::run(): {self.uid}")
+        try:
+            prefetch_suttas(self._app_data, self.schema, self.uid, self._cancelled.is_set)
+
+        except Exception as e:
+            logger.error(f"SuttaPrefetchWorker: {e}")
@@ -7,7 +7,7 @@ import re
 from urllib.parse import urlencode, quote
 
 from PyQt6 import QtCore
-from PyQt6.QtCore import QTimer, QUrl, pyqtSignal, QSize
+from PyQt6.QtCore import QThreadPool, QTimer, QUrl, pyqtSignal, QSize
 from PyQt6.QtGui import QIcon, QPixmap, QStandardItemModel, QAction
 from PyQt6.QtWidgets import (QComboBox, QFrame, QHBoxLayout, QLineEdit, QMenu, QPushButton, QTabWidget, QToolBar, QVBoxLayout)
 
@@ -32,6 +32,7 @@ from simsapa.layouts.find_panel import FindSearched, FindPanel
 from simsapa.layouts.reader_web import ReaderWebEnginePage
 from simsapa.layouts.simsapa_webengine import SimsapaWebEngine
 from simsapa.layouts.sutta_tab import SuttaTabWidget
+from simsapa.layouts.sutta_prefetch_worker import SuttaPrefetchWorker
 from simsapa.layouts.html_content import html_page
 
 from simsapa.layouts.parts.search_bar import HasSearchBar
@@ -128,6 +129,10 @@ class SuttaSearchWindowState(SuttaSearchWindowStateInterface,
 
         self._recent: List[USutta] = []
 
+        self._prefetch_worker: Optional[SuttaPrefetchWorker] = None
+        self._prefetch_pool = QThreadPool()
+        self._prefetch_pool.setMaxThreadCount(1)
+
         self._related_tabs: List[SuttaTabWidget] = []
 
         self._autocomplete_model = QStandardItemModel()
@@ -620,7 +625,12 @@ class SuttaSearchWindowState(SuttaSearchWindowStateInterface,
         logger.info(f"_show_sutta() : {sutta.uid}")
         self.showing_query_in_tab = False
         self.sutta_tab.sutta = sutta
-        self.sutta_tab.render_sutta_content(sutta_quote)
+
+        segment_id = None
+        if sutta_quote:
+            segment_id = self._queries.sutta_queries.get_quote_segment_id(sutta, sutta_quote['quote'])
+
+        self.sutta_tab.render_sutta_content(sutta_quote, segment_id)
 
         self.sutta_tabs.setTabText(0, str(sutta.uid))
 
@@ -632,6 +642,17 @@ class SuttaSearchWindowState(SuttaSearchWindowStateInterface,
             self.pw.update_memos_list_for_sutta(sutta)
             self.pw.show_network_graph(sutta)
 
+        self._prefetch_adjacent_suttas(sutta)
+
+    def _prefetch_adjacent_suttas(self, sutta: USutta):
+        # The previous prefetch is for a sutta the reader has moved away from.
+        if self._prefetch_worker is not None:
+            self._prefetch_worker.cancel()
+        self._prefetch_pool.clear()
+
+        self._prefetch_worker = SuttaPrefetchWorker(self._app_data, sutta)
+        self._prefetch_pool.start(self._prefetch_worker)
+
     def _show_next_recent(self):
         active_sutta = self._get_active_tab().sutta
         if active_sutta is None:
@@ -699,7 +720,7 @@ class SuttaSearchWindowState(SuttaSearchWindowStateInterface,
                           .query(Am.Sutta) \
                           .filter(and_(
                               Am.Sutta.uid != sutta.uid,
-                              Am.Sutta.uid.like(f"{uid_ref}/%"),
+                              Am.Sutta.uid_stem == uid_ref.lower(),
                           )) \
                           .all()
         res.extend(r)
@@ -708,7 +729,7 @@ class SuttaSearchWindowState(SuttaSearchWindowStateInterface,
                           .query(Um.Sutta) \
                           .filter(and_(
                               Um.Sutta.uid != sutta.uid,
-                              Um.Sutta.uid.like(f"{uid_ref}/%"),
+                              Um.Sutta.uid_stem == uid_ref.lower(),
                           )) \
                           .all()
         res.extend(r)
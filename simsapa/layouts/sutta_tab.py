@@ -13,6 +13,7 @@ from simsapa.app.export_helpers import render_sutta_content
 
 from simsapa.layouts.simsapa_webengine import SimsapaWebEngine
 from simsapa.layouts.html_content import html_page
+from simsapa.layouts.preview_render import prefetch_link_previews
 
 class SuttaTabWidget(QWidget):
 
@@ -51,6 +52,8 @@ class SuttaTabWidget(QWidget):
 
         self.current_html = html
 
+        prefetch_link_previews(self._app_data, html)
+
         if len(html) < size_limit:
             try:
                 self.qwe.setHtml(html, baseUrl=QUrl(str(SIMSAPA_PACKAGE_DIR)))
@@ -79,11 +82,11 @@ class SuttaTabWidget(QWidget):
     def set_qwe_html_file(self, html_path: Path):
         self.qwe.load(QUrl(str(html_path.absolute().as_uri())))
 
-    def render_sutta_content(self, sutta_quote: Optional[SuttaQuote] = None):
+    def render_sutta_content(self, sutta_quote: Optional[SuttaQuote] = None, segment_id: Optional[str] = None):
         if self.sutta is None:
             return
-        logger.info(f"render_sutta_content(): {self.sutta.uid}, sutta_quote: {sutta_quote}")
-        html = render_sutta_content(self._app_data, self.sutta, sutta_quote)
+        logger.info(f"render_sutta_content(): {self.sutta.uid}, sutta_quote: {sutta_quote}, segment_id: {segment_id}")
+        html = render_sutta_content(self._app_data, self.sutta, sutta_quote, segment_id = segment_id)
         self.set_qwe_html(html)
 
     def render_search_results(self, results: List[SearchResult]):
@@ -0,0 +1,29 @@
+"""Fixtures shared by the tests
+"""
+
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from simsapa.app.db import appdata_models as Am
+from simsapa.app.db import userdata_models as Um
+
+@pytest.fixture
+def tmp_db_session(tmp_path: Path) -> Iterator[Session]:
+    """A session on empty appdata.sqlite3 and userdata.sqlite3 dbs in tmp_path."""
+    engine = create_engine("sqlite+pysqlite://")
+    with engine.connect() as conn:
+        conn.execute(text(f"ATTACH DATABASE '{tmp_path.joinpath('appdata.sqlite3')}' AS appdata;"))
+        conn.execute(text(f"ATTACH DATABASE '{tmp_path.joinpath('userdata.sqlite3')}' AS userdata;"))
+        Am.metadata.create_all(conn)
+        Um.metadata.create_all(conn)
+        conn.commit()
+
+        db_session = Session(bind=conn)
+        yield db_session
+        db_session.close()
+
+    engine.dispose()
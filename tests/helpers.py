@@ -0,0 +1,28 @@
+"""Helpers shared by the tests
+"""
+
+from typing import Optional
+
+from simsapa import SearchResult
+
+def search_result(uid: str,
+                  score: Optional[float],
+                  page_number: Optional[int] = None,
+                  source_uid: Optional[str] = None,
+                  nikaya: Optional[str] = None,
+                  snippet: str = '') -> SearchResult:
+    """A sutta search result, the uid is also the title."""
+    return SearchResult(
+        uid = uid,
+        schema_name = 'appdata',
+        table_name = 'suttas',
+        source_uid = source_uid,
+        title = uid,
+        ref = None,
+        nikaya = nikaya,
+        author = None,
+        snippet = snippet,
+        page_number = page_number,
+        score = score,
+        rank = None,
+    )
@@ -0,0 +1,172 @@
+"""Test the API server: concurrent requests on the worker pool, closing the
+connections, the responses of the completion lists and the search parameters.
+"""
+
+import gzip
+import http.client
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from simsapa.app import api, completion_lists
+from simsapa.app.api import PooledWSGIServer, app
+from simsapa.app.search.api_queries import SearchCursor, SearchCursors
+from simsapa.app.completion_lists import FlatCompletionList, clear_flat_completion_lists, get_flat_completion_list
+from simsapa.app.types import SearchArea
+
+def _blocking_app(release: threading.Event, started: threading.Semaphore):
+    def app(environ, start_response):
+        if environ['PATH_INFO'] == '/slow':
+            started.release()
+            release.wait(timeout=10)
+
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [b'OK']
+
+    return app
+
+def _get(port: int, path: str):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    conn.request('GET', path, headers={'Connection': 'keep-alive'})
+    resp = conn.getresponse()
+    body = resp.read()
+    conn.close()
+    return (resp.version, resp.getheader('Connection'), body)
+
+def test_concurrent_requests():
+    release = threading.Event()
+    started = threading.Semaphore(0)
+
+    server = PooledWSGIServer('127.0.0.1', 0, _blocking_app(release, started), workers=3, queue_size=2)
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+    port = server.socket.getsockname()[1]
+
+    try:
+        with ThreadPoolExecutor(max_workers=4) as ex:
+            slow = [ex.submit(_get, port, '/slow') for _ in range(2)]
+            for _ in range(2):
+                assert(started.acquire(timeout=10))
+
+            # Two workers are busy, the third one answers.
+            version, connection, body = _get(port, '/')
+            assert(body == b'OK')
+            # HTTP/1.0 without keep-alive, the connection doesn't hold the worker.
+            assert(version == 10)
+            assert(connection is None or connection.lower() == 'close')
+
+            release.set()
+            assert([f.result(timeout=10)[2] for f in slow] == [b'OK', b'OK'])
+
+        # More requests than workers and queue slots are all served.
+        with ThreadPoolExecutor(max_workers=12) as ex:
+            res = list(ex.map(lambda _: _get(port, '/')[2], range(24)))
+        assert(res == [b'OK'] * 24)
+
+    finally:
+        release.set()
+        server.shutdown()
+        server.server_close()
+
+def _with_titles(titles):
+    clear_flat_completion_lists()
+    completion_lists._FLAT_COMPLETION_LISTS[SearchArea.Suttas] = FlatCompletionList(titles)
+
+def test_completion_list_etag_and_gzip():
+    _with_titles(["dhammacakka", "kāyagatāsati", "kesamutti"])
+    client = app.test_client()
+
+    res = client.get('/sutta_titles_flat_completion_list')
+    assert(res.status_code == 200)
+    assert(json.loads(res.data) == ["dhammacakka", "kāyagatāsati", "kesamutti"])
+    etag = res.headers['ETag']
+
+    res = client.get('/sutta_titles_flat_completion_list', headers={'If-None-Match': etag})
+    assert(res.status_code == 304)
+    assert(res.data == b'')
+
+    res = client.get('/sutta_titles_flat_completion_list', headers={'Accept-Encoding': 'gzip'})
+    assert(res.status_code == 200)
+    assert(res.headers['Content-Encoding'] == 'gzip')
+    assert(json.loads(gzip.decompress(res.data)) == ["dhammacakka", "kāyagatāsati", "kesamutti"])
+
+    # A new list after clearing has a new ETag.
+    _with_titles(["dhammacakka", "kesamutti"])
+    res = client.get('/sutta_titles_flat_completion_list', headers={'If-None-Match': etag})
+    assert(res.status_code == 200)
+    assert(json.loads(res.data) == ["dhammacakka", "kesamutti"])
+
+    clear_flat_completion_lists()
+    assert(SearchArea.Suttas not in completion_lists._FLAT_COMPLETION_LISTS)
+
+def test_completion_list_prefix():
+    _with_titles(["dhammacakka", "Kāyagatāsati", "kāyasati", "kesamutti"])
+    client = app.test_client()
+
+    res = client.get('/sutta_titles_flat_completion_list?prefix=kāya')
+    assert(json.loads(res.data) == ["Kāyagatāsati", "kāyasati"])
+
+    res = client.get('/sutta_titles_flat_completion_list?prefix=k&limit=2')
+    assert(json.loads(res.data) == ["Kāyagatāsati", "kāyasati"])
+
+    res = client.get('/sutta_titles_flat_completion_list?prefix=k&limit=0')
+    assert(json.loads(res.data) == [])
+
+    for limit in ["-1", "two"]:
+        res = client.get(f'/sutta_titles_flat_completion_list?prefix=k&limit={limit}')
+        assert(res.status_code == 400)
+
+    assert(get_flat_completion_list(SearchArea.Suttas).words[0] == "dhammacakka")
+    clear_flat_completion_lists()
+
+def test_search_bad_params():
+    client = app.test_client()
+
+    for limit in [0, -5, 100000, "ten", 2.5, True, None]:
+        res = client.post('/search', json={"query_text": "dhamma", "limit": limit})
+        assert(res.status_code == 400)
+
+    for data in [{"limit": 10}, {"query_text": 5}, ["dhamma"]]:
+        res = client.post('/search', json=data)
+        assert(res.status_code == 400)
+
+def test_search_invalid_query(monkeypatch: pytest.MonkeyPatch):
+    def _start_cursor(*_):
+        raise ValueError("Syntax Error: dhamma AND")
+
+    monkeypatch.setattr(api, 'api_queries', SimpleNamespace(start_cursor = _start_cursor))
+
+    res = app.test_client().post('/search', json={"query_text": "dhamma AND"})
+    assert(res.status_code == 400)
+    assert(b"Syntax Error" in res.data)
+
+def test_search_cursor_params(monkeypatch: pytest.MonkeyPatch):
+    cursors = SearchCursors()
+    cursor_id = cursors.add(SearchCursor([], 0, []))
+    monkeypatch.setattr(api, 'api_queries', SimpleNamespace(cursors = cursors))
+
+    client = app.test_client()
+
+    res = client.get(f'/search/{cursor_id}?offset=20&limit=50')
+    assert(res.status_code == 200)
+    assert(res.json is not None and res.json['offset'] == 20 and res.json['next_offset'] is None)
+
+    for args in ["offset=-1", "offset=x", "limit=0", "limit=-3", "limit=abc", "limit=100000"]:
+        res = client.get(f'/search/{cursor_id}?{args}')
+        assert(res.status_code == 400)
+
+    assert(client.get('/search/unknown').status_code == 404)
+
+def test_words_batch_bad_params(monkeypatch: pytest.MonkeyPatch):
+    client = app.test_client()
+
+    for data in [["dhamma"], "dhamma", {"words": "dhamma"}, {"text": ["dhamma"]}, {"format": "ndjson"}]:
+        res = client.post('/words_batch.json', json=data)
+        assert(res.status_code == 400)
+
+    monkeypatch.setattr(api, 'WORDS_BATCH_MAX', 3)
+    res = client.post('/words_batch.json', json={"words": ["a", "b", "c", "d"]})
+    assert(res.status_code == 400)
@@ -0,0 +1,45 @@
+"""Test DPD views
+"""
+
+import pytest
+
+from simsapa.app.db_session import get_db_engine_connection_session
+from simsapa.app.db.dpd_models import DpdHeadwords
+from simsapa.app.dpd_views import HEADWORD_HTML_FIELDS, headwords_view_parts, row_view
+from simsapa.dpd_db.tools.exporter_functions import get_family_compounds, get_family_idioms, get_family_set
+
+def test_headword_view():
+    w = DpdHeadwords(id=1, lemma_1="kamma 1", meaning_1="action;\ndeed", root_key="√kar", family_root="kamma")
+
+    v = row_view(w, HEADWORD_HTML_FIELDS)
+
+    assert v.meaning_1 == "action;<br>deed"
+    assert w.meaning_1 == "action;\ndeed"
+
+    # Model properties are evaluated on the view.
+    assert v.lemma_1_ == "kamma_1"
+    assert v.root_family_key == "√kar kamma"
+    assert v.needs_grammar_button
+
+    with pytest.raises(AttributeError):
+        v.meaning_1 = "changed"
+
+    with pytest.raises(AttributeError):
+        v.not_a_column
+
+def test_headwords_view_parts():
+    _, _, db_session = get_db_engine_connection_session()
+
+    words = db_session.query(DpdHeadwords) \
+                      .filter(DpdHeadwords.lemma_clean.in_(["kamma", "dhamma", "patta"])) \
+                      .all()
+
+    parts = headwords_view_parts(db_session, [i.id for i in words])
+
+    assert len(parts) == len(words)
+
+    for w in words:
+        p = parts[w.id]
+        assert [i.compound_family for i in p['family_compounds']] == [i.compound_family for i in get_family_compounds(w)]
+        assert [i.idiom for i in p['family_idioms']] == [i.idiom for i in get_family_idioms(w)]
+        assert [i.set for i in p['family_set']] == [i.set for i in get_family_set(w)]
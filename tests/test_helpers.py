@@ -56,3 +56,14 @@ def test_latinize():
 def test_consistent_niggahita():
     assert(h.consistent_niggahita("saṃsāra") == "saṁsāra")
     assert(h.consistent_niggahita("dhammaṁ") == "dhammaṁ")
+
+def test_bilara_segments():
+    content = '{"mn1:1.1": "Evaṁ me sutaṁ—", "mn1:1.2": "ekaṁ samayaṁ"}'
+    tmpl = '{"mn1:1.1": "<p>{}", "mn1:1.2": "{}</p>"}'
+    variant = '{"mn1:1.2": " samayaṁ → samaye "}'
+
+    rows = h.bilara_segment_rows(content, tmpl, variant)
+    assert(h.bilara_segments_unpack(h.bilara_segments_pack(rows)) == rows)
+
+    assert(h.bilara_segments_to_json(rows, show_variant_readings=True) == \
+           h.bilara_text_to_segments(content, tmpl, variant, show_variant_readings=True))
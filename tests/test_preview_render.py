@@ -0,0 +1,19 @@
+"""Test Preview Render
+"""
+
+from simsapa.layouts.preview_render import page_sutta_links
+
+def test_page_sutta_links():
+    html = """
+    <a href="ssp://suttas/mn10">MN 10</a>
+    <a href="ssp://words/dhamma">dhamma</a>
+    <a href="ssp://suttas/sn23.11?q=grows&amp;quote_scope=nikaya">SN 23.11</a>
+    <a href="ssp://suttas/mn10">MN 10</a>
+    <a href="ssp://suttas/dn1">DN 1</a>
+    """
+
+    assert(page_sutta_links(html, 5) == ["ssp://suttas/mn10",
+                                         "ssp://suttas/sn23.11?q=grows&quote_scope=nikaya",
+                                         "ssp://suttas/dn1"])
+
+    assert(page_sutta_links(html, 1) == ["ssp://suttas/mn10"])
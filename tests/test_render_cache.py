@@ -0,0 +1,73 @@
+"""Test Render Cache
+"""
+
+from simsapa import SIMSAPA_APP_VERSION, DetailsTab
+from simsapa.app.dpd_render_cache import new_dpd_render_cache, render_cache_key
+from simsapa.app import sutta_render_cache
+from simsapa.app.render_cache import RenderCache
+from simsapa.app.sutta_render_cache import clear_sutta_render_caches
+
+def test_render_cache(tmp_path):
+    db_path = tmp_path.joinpath("render_cache.sqlite3")
+
+    cache = RenderCache("v1", db_path, 2)
+    assert cache.get_or_render("a", lambda: "<p>a</p>") == "<p>a</p>"
+
+    cache.put("b", "<p>b</p>")
+    cache.put("c", "<p>c</p>")
+    # 'a' is no longer in memory, but read from the store.
+    assert cache.get("a") == "<p>a</p>"
+
+    assert RenderCache("v1", db_path, 2).get("c") == "<p>c</p>"
+    # Entries of the previous version are removed.
+    assert RenderCache("v2", db_path, 2).get("c") is None
+
+def test_render_cache_memory_only():
+    cache = RenderCache("v1", None, 1)
+    cache.put("a", "<p>a</p>")
+    cache.put("b", "<p>b</p>")
+
+    assert cache.get("a") is None
+    assert cache.get("b") == "<p>b</p>"
+
+    cache.clear()
+    assert not cache.has("b")
+
+def test_clear_sutta_render_caches(monkeypatch):
+    caches = dict()
+    for name in ['_SUTTA_RENDER_CACHE', '_PALI_SEGMENTS_CACHE', '_PREVIEW_CACHE']:
+        caches[name] = RenderCache("v1", None, 2)
+        caches[name].put("a", "<p>a</p>")
+        monkeypatch.setattr(sutta_render_cache, name, caches[name])
+
+    clear_sutta_render_caches()
+    assert not any([c.has("a") for c in caches.values()])
+
+def test_dpd_render_cache_key():
+    assert render_cache_key("dpd_headwords", "123", []) == "dpd_headwords/123/"
+    assert render_cache_key("dpd_headwords", "123", [DetailsTab.Inflections, DetailsTab.Examples]) == "dpd_headwords/123/Examples,Inflections"
+    assert render_cache_key("dpd_roots", "√kar", [DetailsTab.Examples]) == "dpd_roots/√kar/Examples"
+
+def test_dpd_render_cache_version(tmp_path):
+    db_path = tmp_path.joinpath("dpd_render_cache.sqlite3")
+
+    cache = new_dpd_render_cache("v0.0.20240101", db_path)
+    assert cache.version == f"{SIMSAPA_APP_VERSION}/v0.0.20240101"
+    cache.put("dpd_headwords/1/", "<p>1</p>")
+
+    assert new_dpd_render_cache("v0.0.20240101", db_path).get("dpd_headwords/1/") == "<p>1</p>"
+    # A new DPD release removes the entries of the previous one.
+    assert new_dpd_render_cache("v0.0.20240201", db_path).get("dpd_headwords/1/") is None
+
+    new_dpd_render_cache("v0.0.20240201", db_path).put("dpd_headwords/2/", "<p>2</p>")
+
+    # An unknown version is memory-only, and doesn't remove the stored entries.
+    cache = new_dpd_render_cache(None, db_path)
+    assert "None" not in cache.version
+    assert cache.get("dpd_headwords/2/") is None
+    cache.put("dpd_headwords/3/", "<p>3</p>")
+    assert cache.get("dpd_headwords/3/") == "<p>3</p>"
+
+    cache = new_dpd_render_cache("v0.0.20240201", db_path)
+    assert cache.get("dpd_headwords/2/") == "<p>2</p>"
+    assert cache.get("dpd_headwords/3/") is None
@@ -0,0 +1,28 @@
+"""Test Search: columnar storage of search results
+"""
+
+from typing import Optional
+
+from simsapa import SearchResult
+from simsapa.app.search.result_store import SearchResultStore
+from tests.helpers import search_result
+
+def _result(uid: str, score: Optional[float], page_number: Optional[int] = None) -> SearchResult:
+    return search_result(uid, score, page_number, source_uid = 'ms', nikaya = 'sn', snippet = f"<span class='match'>{uid}</span>")
+
+def test_store_round_trip():
+    items = [_result('sn1.1/pli/ms', 2.5, 3), _result('sn1.2/pli/ms', None)]
+    store = SearchResultStore(items)
+
+    assert len(store) == 2
+    assert store.to_list() == items
+    assert store[-1] == items[1]
+    assert store[0:1] == items[0:1]
+    assert list(store) == items
+
+def test_store_sorted_by_score():
+    store = SearchResultStore([_result('a', 1.0), _result('b', None), _result('c', 3.0)])
+    other = SearchResultStore([_result('d', 2.0)])
+    store.extend(other)
+
+    assert [i['uid'] for i in store.sorted_by_score()] == ['c', 'd', 'a', 'b']
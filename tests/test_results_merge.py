@@ -0,0 +1,55 @@
+"""Test Search: merging results pages of several query tasks
+"""
+
+from typing import Dict, List
+
+from simsapa import SearchResult
+from simsapa.app.search.results_merge import ResultsMerge, ResultsStream
+from tests.helpers import search_result
+
+class PagedTask:
+    def __init__(self, lang: str, scores: List[float], page_len: int):
+        self.results = [search_result(f"{lang}{idx}", s) for idx, s in enumerate(scores)]
+        self.page_len = page_len
+        self.requested_pages: List[int] = []
+
+    def results_page(self, page_num: int) -> List[SearchResult]:
+        self.requested_pages.append(page_num)
+        a = page_num * self.page_len
+        return self.results[a:a+self.page_len]
+
+def test_merged_pages_are_score_ordered():
+    tasks: Dict[str, PagedTask] = {
+        'en': PagedTask('en', [9.0, 7.0, 5.0, 3.0, 1.0], 2),
+        'pli': PagedTask('pli', [8.0, 6.0, 4.0], 2),
+        'de': PagedTask('de', [], 2),
+    }
+
+    merge = ResultsMerge([ResultsStream(t.results_page) for t in tasks.values()], page_len = 3)
+
+    assert [i['uid'] for i in merge.page(0)] == ['en0', 'pli0', 'en1']
+    assert [i['uid'] for i in merge.page(1)] == ['pli1', 'en2', 'pli2']
+    assert [i['uid'] for i in merge.page(2)] == ['en3', 'en4']
+    assert merge.page(3) == []
+
+    # Earlier pages are returned from the merged results.
+    assert [i['uid'] for i in merge.page(0)] == ['en0', 'pli0', 'en1']
+
+def test_merge_requests_only_needed_pages():
+    en = PagedTask('en', [float(100 - i) for i in range(100)], 10)
+    pli = PagedTask('pli', [float(50 - i) for i in range(50)], 10)
+
+    merge = ResultsMerge([ResultsStream(en.results_page), ResultsStream(pli.results_page)], page_len = 10)
+
+    merge.page(0)
+
+    assert en.requested_pages == [0, 1]
+    assert pli.requested_pages == [0]
+
+def test_merge_all_results():
+    en = PagedTask('en', [3.0, 1.0], 1)
+    pli = PagedTask('pli', [2.0], 1)
+
+    merge = ResultsMerge([ResultsStream(en.results_page), ResultsStream(pli.results_page)], page_len = 2)
+
+    assert [i['uid'] for i in merge.all_results()] == ['en0', 'pli0', 'en1']
@@ -0,0 +1,59 @@
+"""Test Search: reading the results of a search cursor
+"""
+
+from typing import List
+
+from simsapa import SearchResult
+from simsapa.app.search.api_queries import SearchCursor, SearchCursors
+from tests.helpers import search_result
+
+class FinishedTask:
+    def __init__(self, pinned: List[SearchResult], ranked: List[SearchResult], page_len: int):
+        self._pinned = pinned
+        self._ranked = ranked
+        self._page_len = page_len
+        self.requested_pages: List[int] = []
+
+    def pinned_results(self) -> List[SearchResult]:
+        return self._pinned
+
+    def ranked_results_page(self, page_num: int) -> List[SearchResult]:
+        self.requested_pages.append(page_num)
+        a = page_num * self._page_len
+        return self._ranked[a:a+self._page_len]
+
+def test_cursor_pages_of_any_length():
+    ranked = [search_result(f"r{i}", 100.0 - i) for i in range(30)]
+    # The pinned result is also in the ranked results, and is only listed once.
+    task = FinishedTask([search_result("r5", 200.0)], ranked, 10)
+
+    cursor = SearchCursor([task], 30, []) # type: ignore
+
+    first = cursor.results(0, 3)
+    assert [i['uid'] for i in first] == ["r5", "r0", "r1"]
+
+    rest = cursor.results(3, 100)
+    assert len(first) + len(rest) == 30
+    assert "r5" not in [i['uid'] for i in rest]
+
+    # Reading a page again doesn't request the task pages again.
+    n = len(task.requested_pages)
+    assert [i['uid'] for i in cursor.results(0, 3)] == ["r5", "r0", "r1"]
+    assert len(task.requested_pages) == n
+
+    assert [i['uid'] for i in cursor.iter_results(batch_len=7)] == [i['uid'] for i in first + rest]
+
+def test_cursors_expire():
+    cursors = SearchCursors(ttl = 60, max_cursors = 2)
+
+    ids = [cursors.add(SearchCursor([], 0, [])) for _ in range(3)]
+
+    # Only the last two are kept.
+    assert cursors.get(ids[0]) is None
+    assert cursors.get(ids[2]) is not None
+
+    c = cursors.get(ids[1])
+    assert c is not None
+
+    c.last_used -= 120
+    assert cursors.get(ids[1]) is None
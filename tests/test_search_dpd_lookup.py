@@ -2,7 +2,8 @@
 """
 
 from simsapa.app.db_session import get_db_engine_connection_session
-from simsapa.app.search.helpers import dpd_lookup
+from simsapa.app.search.helpers import dpd_lookup, dpd_lookup_batch
+from simsapa.dpd_db.tools.pali_sort_key import pali_sort_key
 
 # The headwords are sorted for consistent test results.
 QUERY_TEXT_TEST_CASES = {
@@ -56,3 +57,13 @@ def test_dpd_lookup_not_exact():
         headwords = [i["title"] for i in results]
 
         assert "\n".join(headwords) == "\n".join(v["words"])
+
+def test_dpd_lookup_batch():
+    _, _, db_session = get_db_engine_connection_session()
+
+    res = dpd_lookup_batch(db_session, list(QUERY_TEXT_TEST_CASES.keys()))
+
+    for query_text, v in QUERY_TEXT_TEST_CASES.items():
+        headwords = sorted(set([str(i.word) for i in res[query_text]]), key=pali_sort_key)
+
+        assert "\n".join(headwords) == "\n".join(v["words"])
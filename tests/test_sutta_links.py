@@ -0,0 +1,61 @@
+"""Test Sutta Links
+"""
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from simsapa.app.db_session import get_db_engine_connection_session
+from simsapa.app.export_helpers import add_href_sutta_links_in_text, add_sutta_links, html_tokens
+
+def test_add_href_sutta_links_in_text():
+    _, _, db_session = get_db_engine_connection_session()
+
+    html = '<p>See MN 10 and MN 1.</p><a href="ssp://suttas/dn1">DN 1</a><script>let s = "MN 3";</script>'
+
+    assert(add_href_sutta_links_in_text(db_session, html, do_mark_escape=False, do_apply_escape=False) == \
+           '<p>See <a href="ssp://suttas/mn10">MN 10</a> and <a href="ssp://suttas/mn1">MN 1</a>.</p>' + \
+           '<a href="ssp://suttas/dn1">DN 1</a><script>let s = "MN 3";</script>')
+
+def test_add_sutta_links():
+    _, _, db_session = get_db_engine_connection_session()
+
+    html = '<a href="https://suttacentral.net/sn1.1/en/sujato">x</a> <a class="ref" href="#n1">AN 4.10</a>'
+
+    assert(add_sutta_links(db_session, html) == \
+           '<a href="ssp://suttas/sn1.1/en/sujato">x</a> <a class="ref" href="ssp://suttas/an4.10">AN 4.10</a>')
+
+def test_html_tokens():
+    html = '<p class="a>b">x < y, MN 10</p><!-- <b> -->'
+    assert(html_tokens(html) == ['', '<p class="a>b">', 'x < y, MN 10', '</p>', '', '<!-- <b> -->', ''])
+
+    # The content of script and style is text up to the closing tag.
+    html = '<script>if (a<b && c>d) { s = "</p>"; }</script ><style>p > a { }</style>MN 1'
+    assert(html_tokens(html) == ['', '<script>', 'if (a<b && c>d) { s = "</p>"; }', '</script >',
+                                 '', '<style>', 'p > a { }', '</style>', 'MN 1'])
+
+    assert(html_tokens('<script>MN 1') == ['', '<script>', 'MN 1'])
+
+def _add_pts_rows(db_session: Session):
+    """MN 10 on the pages M i 55-63, with its MultiRef and page range."""
+    db_session.execute(text("""
+    INSERT INTO appdata.suttas (id, uid, sutta_ref, nikaya, language, title) VALUES (1, 'mn10/pli/ms', 'MN 10', 'mn', 'pli', 'Satipaṭṭhānasutta');
+    """))
+    db_session.execute(text("INSERT INTO appdata.multi_refs (id, collection, ref_type, ref, sutta_uid) VALUES (1, 'mn', 'pts', 'mn i 55', 'mn10');"))
+    db_session.execute(text("INSERT INTO appdata.sutta_multi_refs (sutta_id, multi_ref_id) VALUES (1, 1);"))
+    db_session.execute(text("INSERT INTO appdata.multi_ref_pages (multi_ref_id, collection, volume, page_start, page_end) VALUES (1, 'mn', 1, 55, 63);"))
+    db_session.commit()
+
+def test_sutta_links_with_lt_and_script(tmp_db_session: Session):
+    db_session = tmp_db_session
+    _add_pts_rows(db_session)
+
+    html = '<p>x < y, MN 10 and M I 56.</p><script>if (a<b) { s = "MN 3"; }</script><p>M i 100</p>'
+
+    assert(add_href_sutta_links_in_text(db_session, html, do_mark_escape=False, do_apply_escape=False) == \
+           '<p>x < y, <a href="ssp://suttas/mn10">MN 10</a> and <a href="ssp://suttas/mn10/pli/ms">M I 56</a>.</p>' + \
+           '<script>if (a<b) { s = "MN 3"; }</script><p>M i 100</p>')
+
+    html = '<style>p>a { }</style><a href="#n1">M i 56</a> <a href="#n2">M i 100</a>'
+
+    assert(add_sutta_links(db_session, html) == \
+           '<style>p>a { }</style><a href="ssp://suttas/mn10/pli/ms">M i 56</a> <a href="#n2">M i 100</a>')
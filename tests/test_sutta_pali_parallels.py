@@ -0,0 +1,50 @@
+"""Test that the sutta_pali_parallels rows follow the imported and deleted suttas
+"""
+
+from sqlalchemy.orm import Session
+
+from simsapa.app.db import appdata_models as Am
+from simsapa.app.db_helpers import update_sutta_pali_parallels
+
+def _parallels(db_session: Session):
+    res = db_session.query(Am.SuttaPaliParallel.sutta_id, Am.SuttaPaliParallel.pali_sutta_id).all()
+    return sorted([tuple(i) for i in res])
+
+def _sutta(uid: str, language: str) -> Am.Sutta:
+    return Am.Sutta(uid = uid, sutta_ref = "MN 1", nikaya = "mn", language = language, title = uid)
+
+def test_update_sutta_pali_parallels(tmp_db_session: Session):
+    db_session = tmp_db_session
+
+    en = _sutta("mn1/en/sujato", "en")
+    de = _sutta("mn1/de/sabbamitta", "de")
+    db_session.add_all([en, de])
+    db_session.commit()
+
+    # The translations were imported before the Pali sutta.
+    update_sutta_pali_parallels(db_session, ["mn1"])
+    assert(_parallels(db_session) == [])
+
+    pli = _sutta("mn1/pli/ms", "pli")
+    db_session.add(pli)
+    db_session.commit()
+
+    update_sutta_pali_parallels(db_session, ["mn1"])
+    assert(_parallels(db_session) == [(en.id, pli.id), (de.id, pli.id)])
+
+    # Deleting a translation deletes its row.
+    db_session.delete(de)
+    db_session.commit()
+    assert(_parallels(db_session) == [(en.id, pli.id)])
+
+    # Re-importing the Pali sutta deletes the rows pointing to the old one.
+    db_session.delete(pli)
+    db_session.commit()
+    assert(_parallels(db_session) == [])
+
+    pli = _sutta("mn1/pli/ms", "pli")
+    db_session.add(pli)
+    db_session.commit()
+
+    update_sutta_pali_parallels(db_session, ["mn1"])
+    assert(_parallels(db_session) == [(en.id, pli.id)])
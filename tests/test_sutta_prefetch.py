@@ -0,0 +1,11 @@
+"""Test Sutta Prefetch
+"""
+
+from simsapa.app.sutta_prefetch import adjacent_uid_stems
+
+def test_adjacent_uid_stems():
+    assert(adjacent_uid_stems("mn12") == ["mn11", "mn13"])
+    assert(adjacent_uid_stems("mn1") == ["mn2"])
+    assert(adjacent_uid_stems("an4.10") == ["an4.9", "an4.11"])
+    assert(adjacent_uid_stems("sn30.7-16") == ["sn30.6", "sn30.17"])
+    assert(adjacent_uid_stems("dhp") == [])
@@ -1,7 +1,7 @@
 """Test Sutta Reference Recognition
 """
 
-from simsapa.app.helpers import is_book_sutta_ref, is_pts_sutta_ref, query_text_to_uid_field_query
+from simsapa.app.helpers import is_book_sutta_ref, is_pts_sutta_ref, query_text_to_uid_field_query, ref_to_pages
 
 # sutta_range_from_ref
 # normalize_sutta_ref
@@ -64,3 +64,17 @@ def test_does_match_complete_uid():
     text = "mn44/en/sujato"
     is_ref = (is_book_sutta_ref(text) or is_pts_sutta_ref(text))
     assert is_ref is True
+
+REF_PAGES_TEST_CASES = [
+    # MultiRef.ref, expected (collection, volume, page_start, page_end) items
+    ["sn ii 45", [("sn", 2, 45, 45)]],
+    ["an i 77.1 - i 80.1", [("an", 1, 77, 80)]],
+    ["dn iii 123, dn iii 124", [("dn", 3, 123, 123), ("dn", 3, 124, 124)]],
+    ["dn i 1, i 5", [("dn", 1, 1, 1), ("dn", 1, 5, 5)]],
+    ["mn 1.51", []],
+]
+
+def test_ref_to_pages():
+    for case, expected in REF_PAGES_TEST_CASES:
+        pages = [(i['collection'], i['volume'], i['page_start'], i['page_end']) for i in ref_to_pages(case)]
+        assert pages == expected
@@ -0,0 +1,117 @@
+"""Test the sutta_segments rows of added and deleted suttas, and the db migrations
+"""
+
+import contextlib
+import json
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from sqlalchemy.orm import Session
+
+from simsapa.app import db_session as db_session_module
+from simsapa.app.db import userdata_models as Um
+from simsapa.app.db_session import pending_db_migrations
+from simsapa.app.db_helpers import migrate_userdata
+from simsapa.app.helpers import bilara_segment_rows, bilara_segments_data, bilara_segments_pack
+
+def _content(text: str) -> str:
+    return json.dumps({"mn1:1.1": text})
+
+def _segments_data(text: str) -> bytes:
+    return bilara_segments_pack(bilara_segment_rows(_content(text), None, None, None, None))
+
+def _sutta_ids_with_segments(db_session: Session):
+    return sorted([i[0] for i in db_session.query(Um.SuttaSegments.sutta_id).all()])
+
+def test_deleted_sutta_removes_segments(tmp_db_session: Session):
+    db_session = tmp_db_session
+
+    a = Um.Sutta(uid = "mn1/en/old", sutta_ref = "MN 1", nikaya = "mn", title = "A", content_json = _content("Old"))
+    b = Um.Sutta(uid = "mn2/en/old", sutta_ref = "MN 2", nikaya = "mn", title = "B", content_json = _content("Other"))
+    db_session.add_all([a, b])
+    db_session.commit()
+
+    db_session.add_all([Um.SuttaSegments(sutta_id = a.id, data = _segments_data("Old")),
+                        Um.SuttaSegments(sutta_id = b.id, data = _segments_data("Other"))])
+    db_session.commit()
+
+    # Re-importing a sutta deletes the old one and adds the new one, which
+    # may get the same rowid.
+    a_id = a.id
+    db_session.delete(a)
+    db_session.commit()
+
+    assert(_sutta_ids_with_segments(db_session) == [b.id])
+
+    c = Um.Sutta(id = a_id, uid = "mn1/en/old", sutta_ref = "MN 1", nikaya = "mn", title = "A", content_json = _content("New"))
+    db_session.add(c)
+    db_session.commit()
+
+    assert(db_session.query(Um.SuttaSegments).filter(Um.SuttaSegments.sutta_id == c.id).first() is None)
+
+    # Removing a language.
+    for i in db_session.query(Um.Sutta).filter(Um.Sutta.uid.like("%/en/%")).all():
+        db_session.delete(i)
+    db_session.commit()
+
+    assert(_sutta_ids_with_segments(db_session) == [])
+
+def test_added_sutta_segments(tmp_db_session: Session):
+    db_session = tmp_db_session
+
+    # As when importing suttas, the row is added with the sutta.
+    a = Um.Sutta(uid = "mn1/en/new", sutta_ref = "MN 1", nikaya = "mn", title = "A", content_json = _content("New"))
+    data = bilara_segments_data(a.content_json, a.content_json_tmpl)
+    assert(data is not None)
+    a.segments = Um.SuttaSegments(data = data)
+    db_session.add(a)
+    db_session.commit()
+
+    rows = db_session.query(Um.SuttaSegments.sutta_id, Um.SuttaSegments.data).all()
+    assert([tuple(i) for i in rows] == [(a.id, _segments_data("New"))])
+
+    assert(bilara_segments_data(None) is None)
+    assert(bilara_segments_data("") is None)
+    assert(bilara_segments_data("not json") is None)
+
+@pytest.mark.usefixtures("tmp_db_session")
+def test_migration_rebuilds_segments(tmp_path: Path):
+    # The tables were created by the tmp_db_session fixture.
+    db_path = tmp_path.joinpath("userdata.sqlite3")
+
+    with contextlib.closing(sqlite3.connect(db_path)) as connection:
+        connection.execute("INSERT INTO suttas (id, uid, sutta_ref, nikaya, language, title, content_json) VALUES (1, 'mn1/en/new', 'MN 1', 'mn', 'en', 'A', ?);", (_content("New"),))
+        # Left by an earlier build: rows of deleted suttas, one of them with
+        # the id of a newer sutta.
+        connection.executemany("INSERT INTO sutta_segments (sutta_id, data) VALUES (?, ?);",
+                               [(1, _segments_data("Old")), (2, _segments_data("Other"))])
+        connection.execute("PRAGMA user_version = 4;")
+        connection.commit()
+
+    migrate_userdata(db_path)
+
+    with contextlib.closing(sqlite3.connect(db_path)) as connection:
+        rows = connection.execute("SELECT sutta_id, data FROM sutta_segments;").fetchall()
+
+    assert(rows == [(1, _segments_data("New"))])
+
+@pytest.mark.usefixtures("tmp_db_session")
+def test_pending_db_migrations(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(db_session_module, '_DB_MIGRATIONS_CHECKED', False)
+
+    db_path = tmp_path.joinpath("userdata.sqlite3")
+    app_db_path = tmp_path.joinpath("missing", "appdata.sqlite3")
+    dpd_db_path = tmp_path.joinpath("missing", "dpd.sqlite3")
+
+    with contextlib.closing(sqlite3.connect(db_path)) as connection:
+        connection.execute("PRAGMA user_version = 4;")
+        connection.commit()
+
+    # The missing appdata and dpd files are skipped.
+    assert(pending_db_migrations(app_db_path, db_path, dpd_db_path) == [(db_path, 'migrate_userdata')])
+
+    migrate_userdata(db_path)
+
+    assert(pending_db_migrations(app_db_path, db_path, dpd_db_path) == [])
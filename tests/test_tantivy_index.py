@@ -0,0 +1,116 @@
+"""Test the DPD filters of dict_words queries, the sutta segments index, and
+opening indexes with an earlier schema.
+"""
+
+import json
+from pathlib import Path
+from types import SimpleNamespace
+
+import tantivy
+
+from simsapa.app.search.helpers import is_index_empty
+from simsapa.app.search.sutta_queries import SuttaQueries
+from simsapa.app.search.tantivy_index import TantivySearchIndexes, dpd_filters_query, index_sutta_segments, is_outdated_index_schema, segment_id_sort_key, sutta_segments_index_schema, with_dpd_filters_query
+from simsapa.app.types import DpdFilters
+
+def _filters(pos = None, root_key = None) -> DpdFilters:
+    return DpdFilters(pos = pos, root_key = root_key, family_key = None, pattern = None)
+
+def test_dpd_filters_query():
+    assert(dpd_filters_query(_filters(pos = "masc", root_key = "√kar 1")) == '+pos:"masc" +root_key:"√kar 1"')
+    assert(dpd_filters_query(_filters()) == "")
+
+def test_with_dpd_filters_query():
+    q = "+kamma +source_uid:dpd word:kamma"
+    assert(with_dpd_filters_query(q, "kamma", " +source_uid:dpd", None) == q)
+    assert(with_dpd_filters_query(q, "kamma", " +source_uid:dpd", _filters()) == q)
+    assert(with_dpd_filters_query(q, "kamma", " +source_uid:dpd", _filters(pos = "masc")) == q + ' +pos:"masc"')
+    assert(with_dpd_filters_query(q, "kamma", " +source_uid:dpd", _filters(pos = "masc"), is_regex_or_fuzzy = True) == q)
+
+def test_with_dpd_filters_query_filters_only_keeps_source():
+    q = "+ +source_uid:dpd word:"
+    assert(with_dpd_filters_query(q, "", " +source_uid:dpd", _filters(pos = "masc")) == '+pos:"masc" +source_uid:dpd')
+    assert(with_dpd_filters_query(q, "", " -source_uid:cpd", _filters(pos = "masc")) == '+pos:"masc" -source_uid:cpd')
+    assert(with_dpd_filters_query("+ word:", "", "", _filters(pos = "masc")) == '+pos:"masc"')
+
+def test_is_outdated_index_schema(tmp_path: Path):
+    # No meta.json, a new index.
+    assert(not is_outdated_index_schema(tmp_path, ['word', 'content']))
+
+    with open(tmp_path.joinpath("meta.json"), 'w') as f:
+        json.dump({"schema": [{"name": "word"}, {"name": "content"}]}, f)
+
+    assert(not is_outdated_index_schema(tmp_path, ['content', 'word']))
+    assert(is_outdated_index_schema(tmp_path, ['content', 'word', 'pos']))
+
+def test_sutta_segments_by_quote(tmp_path: Path):
+    ix = tantivy.Index(sutta_segments_index_schema(), path=str(tmp_path))
+
+    index_sutta_segments(ix, "appdata", [
+        ("sn56.11/en/sujato", json.dumps({"sn56.11:1.1": "So I have heard.",
+                                          "sn56.11:2.1": "<i>Mendicants</i>, these two extremes should not be cultivated."})),
+        ("mn1/en/sujato", json.dumps({"mn1:1.1": "So I have heard."})),
+    ])
+
+    # Indexing a sutta again replaces its segments.
+    index_sutta_segments(ix, "appdata", [
+        ("sn56.11/en/sujato", json.dumps({"sn56.11:1.1": "So I have heard.",
+                                          "sn56.11:2.1": "<i>Mendicants</i>, these two extremes should not be cultivated."})),
+    ])
+    ix.reload()
+
+    sutta_queries = SuttaQueries(None) # type: ignore
+    sutta_queries._segments_index = ix
+
+    # Capitals, punctuation and html are normalized the same way in the quote and the segments.
+    res = sutta_queries.get_segments_by_quote("mendicants, these TWO extremes")
+    assert([(i['sutta_uid'], i['segment_id']) for i in res] == [("sn56.11/en/sujato", "sn56.11:2.1")])
+
+    res = sutta_queries.get_segments_by_quote("So I have heard")
+    assert(sorted([i['segment_id'] for i in res]) == ["mn1:1.1", "sn56.11:1.1"])
+
+    # The scroll target in one sutta.
+    sutta = SimpleNamespace(metadata = SimpleNamespace(schema = "appdata"), uid = "mn1/en/sujato")
+    assert(sutta_queries.get_quote_segment_id(sutta, "So I have heard") == "mn1:1.1") # type: ignore
+    assert(sutta_queries.get_quote_segment_id(sutta, "two extremes") is None) # type: ignore
+
+    assert(sutta_queries.get_segments_by_quote("") == [])
+
+def test_segment_id_sort_key():
+    ids = ["mn1:10.1", "mn1:1.10", "mn1:0.1", "mn1:1.2"]
+    assert(sorted(ids, key=segment_id_sort_key) == ["mn1:0.1", "mn1:1.2", "mn1:1.10", "mn1:10.1"])
+
+def _text_index(path: Path, texts) -> tantivy.Index:
+    builder = tantivy.SchemaBuilder()
+    builder.add_text_field("content", stored=True)
+    ix = tantivy.Index(builder.build(), path=str(path))
+
+    writer = ix.writer()
+    for i in texts:
+        writer.add_document(tantivy.Document(content=i))
+    writer.commit()
+
+    return ix
+
+def test_has_empty_index(tmp_path: Path):
+    paths = dict()
+    for name in ["en", "pli", "dict_en", "dict_pli", "segments"]:
+        paths[name] = tmp_path.joinpath(name)
+        paths[name].mkdir()
+
+    indexes = TantivySearchIndexes.__new__(TantivySearchIndexes)
+    indexes.suttas_lang_index = {"en": _text_index(paths["en"], ["a"]), "pli": _text_index(paths["pli"], ["b"])}
+    indexes.dict_words_lang_index = {"en": _text_index(paths["dict_en"], ["c"])}
+
+    # The segments index of an earlier install is created empty.
+    indexes.sutta_segments_index = _text_index(paths["segments"], [])
+    assert(is_index_empty(indexes.sutta_segments_index))
+    assert(indexes.has_empty_index())
+
+    indexes.sutta_segments_index = _text_index(paths["segments"], ["d"])
+    assert(not is_index_empty(indexes.sutta_segments_index))
+    assert(not indexes.has_empty_index())
+
+    # A non-en dict_words index replaced for the new schema.
+    indexes.dict_words_lang_index["pli"] = _text_index(paths["dict_pli"], [])
+    assert(indexes.has_empty_index())
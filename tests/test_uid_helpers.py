@@ -0,0 +1,101 @@
+"""Test uid-derived columns and prefix ranges, and the migration which adds them
+"""
+
+import contextlib
+import sqlite3
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from simsapa.app.db import appdata_models as Am
+from simsapa.app.db.uid_helpers import dict_word_uid_source, normalize_sutta_columns, prefix_upper_bound, sqlite_lower, starts_with, sutta_uid_parts
+from simsapa.app.db_helpers import migrate_appdata
+
+def test_sutta_uid_parts():
+    assert sutta_uid_parts("dn1/pli/ms") == ("dn1", "pli", "ms")
+    assert sutta_uid_parts("SN56.11/en/Sujato") == ("sn56.11", "en", "sujato")
+    assert sutta_uid_parts("/mn1/") == ("mn1", None, None)
+    assert sutta_uid_parts("thig5.1/en") == ("thig5.1", "en", None)
+
+def test_dict_word_uid_source():
+    assert dict_word_uid_source("dhamma 1/dpd") == "dpd"
+    assert dict_word_uid_source("dhamma") is None
+
+def test_normalize_sutta_columns():
+    sutta = SimpleNamespace(uid = "mn1/en/sujato", uid_stem = None, language = "en-gb", source_uid = None, sutta_ref = "MN  1")
+    normalize_sutta_columns(sutta)
+
+    assert((sutta.uid_stem, sutta.language, sutta.source_uid) == ("mn1", "en-gb", "sujato"))
+    # Not derived from the uid, kept as it was saved.
+    assert(sutta.sutta_ref == "MN  1")
+
+def test_sqlite_lower():
+    # Only ASCII, as SQLite lower() and LIKE.
+    assert sqlite_lower("SN56.11 Āpa") == "sn56.11 Āpa"
+
+def test_prefix_upper_bound():
+    uids = ["mn1/pli/ms", "mn10/pli/ms", "mn1/en/sujato", "mn2/pli/ms", "mn/pli/ms", "dn1/pli/ms"]
+    prefix = "mn1/"
+    upper = prefix_upper_bound(prefix)
+
+    assert sorted(i for i in uids if prefix <= i < upper) == \
+        sorted(i for i in uids if i.startswith(prefix))
+
+def _migrated_appdata(tmp_path: Path):
+    """Adds rows written before the uid-derived columns to the appdata db of
+    the tmp_db_session fixture, and migrates it with migrate_appdata()."""
+    db_path = tmp_path.joinpath("appdata.sqlite3")
+
+    with contextlib.closing(sqlite3.connect(db_path)) as connection:
+        connection.execute("DROP INDEX ix_suttas_uid_stem_lower;")
+        connection.executemany("INSERT INTO suttas (uid, sutta_ref, nikaya, language, source_uid) VALUES (?, ?, ?, ?, ?);", [
+            ("mn1/pli/ms", "MN  1", "mn", "pli", "ms"),
+            # language and source_uid as in the downloaded db, different from the uid.
+            ("mn2/en/sujato", "MN 2", "mn", "en-gb", ""),
+            ("sn56.11/pli/ms", "SN 56.11", "sn", "pli", "ms"),
+        ])
+        connection.executemany("INSERT INTO dict_words (dictionary_id, uid, word, word_ascii, source_uid) VALUES (1, ?, ?, ?, ?);", [
+            ("Dhamma/pts", "dhamma", "dhamma", None),
+            ("dhammā/cpd", "dhammā", "dhamma", "CPD"),
+        ])
+        connection.execute("PRAGMA user_version = 0;")
+        connection.commit()
+
+    migrate_appdata(db_path)
+
+def test_migrated_uid_columns_and_queries(tmp_path: Path, tmp_db_session: Session):
+    _migrated_appdata(tmp_path)
+    db_session = tmp_db_session
+
+    mn2 = db_session.query(Am.Sutta).filter(Am.Sutta.uid == "mn2/en/sujato").one()
+    assert(mn2.uid_stem == "mn2")
+    # Values of the downloaded db are kept, empty ones are filled from the uid.
+    assert(mn2.language == "en-gb")
+    assert(mn2.source_uid == "sujato")
+    assert(db_session.query(Am.Sutta.sutta_ref).filter(Am.Sutta.uid == "mn1/pli/ms").scalar() == "MN  1")
+
+    # Case-insensitive as the LIKE patterns were.
+    res = db_session.query(Am.Sutta.uid).filter(starts_with(Am.Sutta.uid_stem, "MN")).all()
+    assert(sorted([r[0] for r in res]) == ["mn1/pli/ms", "mn2/en/sujato"])
+
+    res = db_session.query(Am.DictWord.uid).filter(starts_with(Am.DictWord.uid, "dhamma/")).all()
+    assert([r[0] for r in res] == ["Dhamma/pts"])
+
+    assert(db_session.query(Am.DictWord.source_uid).filter(Am.DictWord.word == "dhamma").scalar() == "pts")
+    assert(db_session.query(Am.DictWord.source_uid).filter(Am.DictWord.word == "dhammā").scalar() == "CPD")
+
+    q = db_session.query(Am.Sutta).filter(starts_with(Am.Sutta.uid_stem, "sn")).statement
+    plan = db_session.execute(text("EXPLAIN QUERY PLAN " + str(q.compile(compile_kwargs={"literal_binds": True})))).fetchall()
+    assert("ix_suttas_uid_stem_lower" in " ".join([str(r[-1]) for r in plan]))
+
+def test_failed_migration_raises(tmp_path: Path):
+    db_path = tmp_path.joinpath("appdata.sqlite3")
+    with contextlib.closing(sqlite3.connect(db_path)) as connection:
+        connection.execute("CREATE TABLE suttas (id INTEGER PRIMARY KEY);")
+        connection.commit()
+
+    with pytest.raises(sqlite3.OperationalError):
+        migrate_appdata(db_path)
@@ -0,0 +1,70 @@
+"""Test queries over appdata and userdata as one relation, and slicing results pages from several parts
+"""
+
+from typing import List
+
+from sqlalchemy import not_, text
+from sqlalchemy.orm import Session
+
+from simsapa.app.search.helpers import DICT_WORD_RESULT_COLUMNS
+from simsapa.app.search.query_task import dict_word_starts_with
+from simsapa.app.search.union_queries import SlicedPart, parts_slice, union_rows
+
+def _part(items: List[str]) -> SlicedPart[str]:
+    return (len(items), lambda offset, limit: items[offset:offset+limit])
+
+def test_parts_slice():
+    parts = [_part(["a1", "a2", "a3"]), _part([]), _part(["b1", "b2"]), _part(["c1", "c2", "c3"])]
+    all_items = ["a1", "a2", "a3", "b1", "b2", "c1", "c2", "c3"]
+
+    for page_len in [1, 2, 3, 5, 10]:
+        pages = []
+        page_num = 0
+        while True:
+            page = parts_slice(parts, page_num * page_len, page_len)
+            assert(len(page) <= page_len)
+            if len(page) == 0:
+                break
+            pages.extend(page)
+            page_num += 1
+
+        assert(pages == all_items)
+
+def test_parts_slice_queries_only_overlapping_parts():
+    queried = []
+
+    def _items_fn(name: str):
+        def _fn(offset: int, limit: int) -> List[str]:
+            queried.append(name)
+            return [name] * limit
+        return _fn
+
+    parts = [(10, _items_fn("a")), (10, _items_fn("b")), (10, _items_fn("c"))]
+
+    assert(parts_slice(parts, 12, 5) == ["b"] * 5)
+    assert(queried == ["b"])
+
+def test_dict_word_starts_with_null_columns(tmp_db_session: Session):
+    db_session = tmp_db_session
+
+    # Only the required columns, word_nom_sg, inflections, etc. are NULL.
+    db_session.execute(text("""
+    INSERT INTO appdata.dict_words (dictionary_id, uid, word, word_ascii) VALUES
+    (1, 'dhamma/pts', 'dhamma', 'dhamma'),
+    (1, 'saddhamma/pts', 'saddhamma', 'saddhamma');
+    """))
+    db_session.execute(text("""
+    INSERT INTO userdata.dict_words (dictionary_id, uid, word, word_ascii, inflections) VALUES
+    (1, 'adhamma/mine', 'adhamma', 'adhamma', 'dhammo');
+    """))
+    db_session.commit()
+
+    rows = union_rows(db_session, 'DictWord', DICT_WORD_RESULT_COLUMNS,
+                      lambda m: [dict_word_starts_with(m, "dhamm")])
+    assert(sorted([r.uid for r in rows]) == ["adhamma/mine", "dhamma/pts"])
+
+    # Contains, but doesn't start with it. The NULL columns don't exclude saddhamma.
+    rows = union_rows(db_session, 'DictWord', DICT_WORD_RESULT_COLUMNS,
+                      lambda m: [m.DictWord.word.like("%dhamm%"),
+                                 not_(dict_word_starts_with(m, "dhamm"))])
+    assert([r.uid for r in rows] == ["saddhamma/pts"])
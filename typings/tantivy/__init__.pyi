@@ -34,6 +34,8 @@ class Document:
 
     def keys(self) -> List[str]: ...
 
+    def add_text(self, field_name: str, text: str): ...
+
 class SchemaBuilder:
     fields: List[FieldEntry]
     fields_map: Dict[str, Field]
@@ -86,6 +88,8 @@ class IndexWriter:
 
     def add_document(self, doc: Document): ...
 
+    def delete_documents(self, field_name: str, field_value: str) -> int: ...
+
     def commit(self): ...
 
 class Index: